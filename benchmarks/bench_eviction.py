@@ -0,0 +1,88 @@
+# benchmarks/bench_eviction.py
+#
+# Compares sampled (pooled) eviction against the exact O(N) scan it
+# replaced, on a cache workload: GET a Zipf-distributed key and SET it on a
+# miss, with maxmemory holding only a fraction of the keys. Reports hit
+# ratio and operations per second for each policy.
+#
+#   python -m benchmarks.bench_eviction [--keys N] [--ops N] [--fraction F]
+#                                       [--samples 5,10] [--policy allkeys-lru]
+
+import argparse
+import random
+import time
+import config
+from datastore import BaseStore
+from datastore.eviction import EvictionTracker
+
+
+class ExactEvictionTracker(EvictionTracker):
+    """The previous implementation: scan every key for the minimum."""
+
+    def best_key(self):
+        data = self.keyspace.data
+        if not data:
+            return None
+        if config.EVICTION_POLICY == "allkeys-lfu":
+            return min(data.items(), key=lambda x: self.frequency(x[1]))[0]
+        return min(data.items(), key=lambda x: x[1].lru)[0]
+
+
+def _workload(keys: int, ops: int, skew: float, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    weights = [1 / (rank ** skew) for rank in range(1, keys + 1)]
+    names = [f"key:{i}" for i in range(keys)]
+    rng.shuffle(names)
+    return rng.choices(names, weights=weights, k=ops)
+
+
+def _run(tracker_cls, workload: list[str], value: str) -> tuple[float, float]:
+    store = BaseStore()
+    store.eviction = store.keyspace.eviction = tracker_cls(store.keyspace)
+    hits = 0
+    start = time.perf_counter()
+    for key in workload:
+        if store.get(key) is not None:
+            hits += 1
+        else:
+            store.set(key, value)
+    elapsed = time.perf_counter() - start
+    return hits / len(workload), len(workload) / elapsed
+
+
+def _max_memory_for(keys: int, value: str) -> int:
+    store = BaseStore()
+    for i in range(keys):
+        store.set(f"key:{i}", value)
+    return store.keyspace.used_memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=20_000)
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--fraction", type=float, default=0.1,
+                        help="share of the keyspace that fits in maxmemory")
+    parser.add_argument("--skew", type=float, default=1.0, help="Zipf exponent")
+    parser.add_argument("--samples", default="5,10")
+    parser.add_argument("--policy", default="allkeys-lru", choices=["allkeys-lru", "allkeys-lfu"])
+    args = parser.parse_args()
+
+    value = "x" * 32
+    workload = _workload(args.keys, args.ops, args.skew, seed=42)
+    config.MAX_MEMORY_BYTES = _max_memory_for(int(args.keys * args.fraction), value)
+    config.EVICTION_POLICY = args.policy
+
+    print(f"{args.policy}, {args.keys} keys, {args.ops} ops, "
+          f"maxmemory fits {args.fraction:.0%} of keys")
+    print(f"{'implementation':>16} {'hit ratio':>10} {'ops/sec':>12}")
+    hit_ratio, throughput = _run(ExactEvictionTracker, workload, value)
+    print(f"{'exact':>16} {hit_ratio:>10.3f} {throughput:>12,.0f}")
+    for samples in (int(n) for n in args.samples.split(",")):
+        config.MAXMEMORY_SAMPLES = samples
+        hit_ratio, throughput = _run(EvictionTracker, workload, value)
+        print(f"{f'sampled ({samples})':>16} {hit_ratio:>10.3f} {throughput:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# benchmarks/bench_fsync.py
+#
+# Measures SET throughput under each appendfsync policy, with several
+# clients writing at once so "always" can group their fsyncs.
+#
+#   python -m benchmarks.bench_fsync [--requests N] [--clients 1,16] [--depth 1]
+#                                    [--policies always,everysec,no]
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+
+from benchmarks.bench_pipeline import _encode, _free_port, _wait_for_server
+
+
+def _run_server(port: int, aof_path: str, policy: str):
+    import sys
+    import config
+    from server.tcp_server import run_server
+    config.APPENDFSYNC = policy
+    sys.stdout = open(os.devnull, "w")  # keep server logging out of the report
+    run_server(host="127.0.0.1", port=port, aof_path=aof_path)
+
+
+async def _client(port: int, client_id: int, depth: int, rounds: int):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    batch = b"".join(_encode(["SET", f"key:{client_id}:{i}", "value"]) for i in range(depth))
+    reply_size = len(b"+OK\r\n") * depth
+    for _ in range(rounds):
+        writer.write(batch)
+        await reader.readexactly(reply_size)
+    writer.close()
+    await writer.wait_closed()
+
+
+async def _bench(port: int, clients: int, depth: int, total: int) -> float:
+    await _wait_for_server(port)
+    rounds = max(1, total // (clients * depth))
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await asyncio.gather(*(_client(port, c, depth, rounds) for c in range(clients)))
+    elapsed = loop.time() - start
+    return rounds * clients * depth / elapsed
+
+
+def _measure(policy: str, clients: int, depth: int, total: int) -> float:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        aof_path = os.path.join(tmp, "aof.log")
+        server = multiprocessing.Process(target=_run_server, args=(port, aof_path, policy), daemon=True)
+        server.start()
+        try:
+            return asyncio.run(_bench(port, clients, depth, total))
+        finally:
+            server.terminate()
+            server.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--clients", default="1,16")
+    parser.add_argument("--depth", type=int, default=1)
+    parser.add_argument("--policies", default="always,everysec,no")
+    args = parser.parse_args()
+    client_counts = [int(c) for c in args.clients.split(",")]
+
+    print(f"{'appendfsync':>11} {'clients':>8} {'ops/sec':>12}")
+    for policy in args.policies.split(","):
+        for clients in client_counts:
+            ops = _measure(policy, clients, args.depth, args.requests)
+            print(f"{policy:>11} {clients:>8} {ops:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# benchmarks/bench_pipeline.py
+#
+# Measures SET throughput at several pipeline depths against a server
+# running in a child process.
+#
+#   python -m benchmarks.bench_pipeline [--requests N] [--depths 1,16,128]
+#                                       [--transport protocol|streams]
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _run_server(port: int, aof_path: str, transport: str | None):
+    import sys
+    from server.tcp_server import run_server
+    sys.stdout = open(os.devnull, "w")  # keep server logging out of the report
+    run_server(host="127.0.0.1", port=port, aof_path=aof_path, transport=transport)
+
+
+async def _wait_for_server(port: int, timeout: float = 5.0):
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            await writer.wait_closed()
+            return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+
+def _encode(tokens: list[str]) -> bytes:
+    out = [f"*{len(tokens)}\r\n".encode()]
+    for token in tokens:
+        data = token.encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+async def _bench_depth(port: int, depth: int, total: int) -> float:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    batch = b"".join(_encode(["SET", f"key:{i}", "value"]) for i in range(depth))
+    reply_size = len(b"+OK\r\n") * depth
+    rounds = max(1, total // depth)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        writer.write(batch)
+        await reader.readexactly(reply_size)
+    elapsed = time.perf_counter() - start
+
+    writer.close()
+    await writer.wait_closed()
+    return rounds * depth / elapsed
+
+
+async def _main(port: int, depths: list[int], total: int):
+    await _wait_for_server(port)
+    print(f"{'depth':>6} {'ops/sec':>12}")
+    for depth in depths:
+        ops = await _bench_depth(port, depth, total)
+        print(f"{depth:>6} {ops:>12,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--depths", default="1,16,128")
+    parser.add_argument("--transport", choices=["protocol", "streams"], default=None)
+    args = parser.parse_args()
+    depths = [int(d) for d in args.depths.split(",")]
+
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        aof_path = os.path.join(tmp, "aof.log")
+        server = multiprocessing.Process(target=_run_server, args=(port, aof_path, args.transport), daemon=True)
+        server.start()
+        try:
+            asyncio.run(_main(port, depths, args.requests))
+        finally:
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# benchmarks/bench_sharded.py
+#
+# Aggregate SET throughput of the sharded server as workers are added.
+# One client process per shard talks to that shard's own port and only
+# uses keys it owns, i.e. what a cluster-aware client does after learning
+# the slot map.
+#
+#   python -m benchmarks.bench_sharded [--workers 1,2,4] [--requests N] [--depth D]
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import tempfile
+import time
+
+from benchmarks.bench_pipeline import _encode, _free_port, _wait_for_server
+from server.sharding import ShardMap, key_hash_slot, shard_aof_path
+
+
+def _run_shard(shard: ShardMap, aof_path: str):
+    import sys
+    from server.tcp_server import run_server
+    sys.stdout = open(os.devnull, "w")
+    run_server(host="127.0.0.1", port=shard.port, aof_path=aof_path, shard=shard)
+
+
+def _keys_for_shard(shard: ShardMap, count: int) -> list[str]:
+    keys = []
+    i = 0
+    while len(keys) < count:
+        key = f"key:{i}"
+        if shard.owns(key_hash_slot(key)):
+            keys.append(key)
+        i += 1
+    return keys
+
+
+async def _client(shard: ShardMap, total: int, depth: int) -> float:
+    port = shard.shard_port(shard.index)
+    await _wait_for_server(port)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    keys = _keys_for_shard(shard, depth)
+    batch = b"".join(_encode(["SET", key, "value"]) for key in keys)
+    reply_size = len(b"+OK\r\n") * depth
+    rounds = max(1, total // depth)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        writer.write(batch)
+        await reader.readexactly(reply_size)
+    elapsed = time.perf_counter() - start
+    writer.close()
+    await writer.wait_closed()
+    return elapsed
+
+
+def _client_process(shard: ShardMap, total: int, depth: int, results):
+    results.put(asyncio.run(_client(shard, total, depth)))
+
+
+def _bench(workers: int, total: int, depth: int) -> float:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        shards = [ShardMap(i, workers, "127.0.0.1", port) for i in range(workers)]
+        servers = [
+            multiprocessing.Process(target=_run_shard, args=(shard, shard_aof_path(os.path.join(tmp, "aof.log"), shard.index)),
+                                    daemon=True)
+            for shard in shards
+        ]
+        for server in servers:
+            server.start()
+
+        results = multiprocessing.Queue()
+        per_client = total // workers
+        clients = [multiprocessing.Process(target=_client_process, args=(shard, per_client, depth, results))
+                   for shard in shards]
+        for client in clients:
+            client.start()
+        elapsed = max(results.get() for _ in clients)
+        for client in clients:
+            client.join()
+        for server in servers:
+            server.terminate()
+            server.join()
+    return per_client * workers / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", default=",".join(str(n) for n in (1, 2, 4) if n <= os.cpu_count()) or "1")
+    parser.add_argument("--requests", type=int, default=200_000)
+    parser.add_argument("--depth", type=int, default=64)
+    args = parser.parse_args()
+
+    print(f"{'workers':>7} {'ops/sec':>12}")
+    for workers in (int(w) for w in args.workers.split(",")):
+        ops = _bench(workers, args.requests, args.depth)
+        print(f"{workers:>7} {ops:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# benchmarks/bench_zset.py
+#
+# Sorted set operations on one large zset (1M members by default): bulk
+# ZADD, score updates of existing members, ZRANK, ZRANGEBYSCORE and ZCOUNT.
+# Score updates are also run against the sorted Python list the zset used
+# to be, whose list.remove() + insort() makes each one O(n).
+#
+#   python -m benchmarks.bench_zset [--members N] [--ops N] [--baseline-ops N]
+
+import argparse
+import bisect
+import random
+import time
+from datastore import ZSetStore
+from datastore.skiplist import ScoreRange
+
+
+def _timed(label: str, ops: int, func):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:>28} {ops / elapsed:>12,.0f} ops/sec")
+
+
+def _list_updates(members: int, ops: int, rng: random.Random):
+    """The previous implementation: a (score, member) list kept sorted."""
+    scores = {f"m{i}": rng.random() for i in range(members)}
+    items = sorted((score, member) for member, score in scores.items())
+    names = list(scores)
+
+    def run():
+        for _ in range(ops):
+            member = rng.choice(names)
+            items.remove((scores[member], member))
+            scores[member] = rng.random()
+            bisect.insort(items, (scores[member], member))
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--members", type=int, default=1_000_000)
+    parser.add_argument("--ops", type=int, default=100_000)
+    parser.add_argument("--baseline-ops", type=int, default=200,
+                        help="updates to run against the sorted-list baseline")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    store = ZSetStore()
+    names = [f"m{i}" for i in range(args.members)]
+    print(f"zset with {args.members:,} members")
+
+    def load():
+        for name in names:
+            store.zadd("z", rng.random(), name)
+    _timed("ZADD (insert)", args.members, load)
+
+    def update():
+        for _ in range(args.ops):
+            store.zadd("z", rng.random(), rng.choice(names))
+    _timed("ZADD (update, skip list)", args.ops, update)
+    _timed("ZADD (update, sorted list)", args.baseline_ops,
+           _list_updates(args.members, args.baseline_ops, rng))
+
+    def rank():
+        for _ in range(args.ops):
+            store.zrank("z", rng.choice(names))
+    _timed("ZRANK", args.ops, rank)
+
+    def range_by_score():
+        for _ in range(args.ops):
+            low = rng.random()
+            store.zrangebyscore("z", ScoreRange(low, 1.0), count=10)
+    _timed("ZRANGEBYSCORE LIMIT 0 10", args.ops, range_by_score)
+
+    def count():
+        for _ in range(args.ops):
+            low = rng.random()
+            store.zcount("z", ScoreRange(low, low + 0.1))
+    _timed("ZCOUNT", args.ops, count)
+
+
+if __name__ == "__main__":
+    main()
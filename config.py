@@ -1,2 +1,53 @@
-MAX_MEMORY_BYTES = 1024  # 10 MB for example
+MAX_MEMORY_BYTES = 10 * 1024 * 1024  # 10 MB
 EVICTION_POLICY = "allkeys-lru"     # or "noeviction", "allkeys-lfu"
+# Keys sampled per eviction, and how many of the best candidates are kept
+# between evictions. More samples get closer to exact LRU/LFU.
+MAXMEMORY_SAMPLES = 5
+EVICTION_POOL_SIZE = 16
+# allkeys-lfu counters: higher log factor = slower counter growth (a counter
+# of 255 takes ~1M hits at 10); decay time = minutes for a counter to drop
+# by one when the key is not accessed (0 = never decay).
+LFU_LOG_FACTOR = 10
+LFU_DECAY_TIME = 1
+# Lists are stored as chunks of packed entries; a chunk is closed once it
+# holds this many bytes.
+LIST_MAX_LISTPACK_SIZE = 8192
+# Small hashes and sets are kept in compact encodings and converted to a
+# hashtable (a dict plus a dense member array) once they grow past these
+# limits (entries, or the length of any one field/value/member).
+HASH_MAX_LISTPACK_ENTRIES = 128
+HASH_MAX_LISTPACK_VALUE = 64
+SET_MAX_INTSET_ENTRIES = 512
+SET_MAX_LISTPACK_ENTRIES = 128
+SET_MAX_LISTPACK_VALUE = 64
+# Release big values evicted for memory, or expired, in the background
+# (as UNLINK and FLUSHALL ASYNC always do) instead of on the spot.
+LAZYFREE_LAZY_EVICTION = False
+LAZYFREE_LAZY_EXPIRE = False
+# When the AOF is fsynced: "always" (before replying; one fsync per event
+# loop tick covers every client's writes), "everysec" (from a background
+# thread once a second) or "no" (left to the OS).
+APPENDFSYNC = "everysec"
+# AOF blocks (one per event loop tick) the writer thread may fall behind
+# by. When the queue is full, "block" stalls the event loop until the
+# disk catches up; "drop" discards the block (and counts it in INFO).
+# Under appendfsync always the loop always waits.
+AOF_QUEUE_SIZE = 1024
+AOF_QUEUE_FULL = "block"
+# Longest a single active expire cycle may run before yielding to clients.
+ACTIVE_EXPIRE_CYCLE_MS = 1
+# used_memory is tracked incrementally; every this many seconds the whole
+# dataset is re-measured to correct any drift.
+MEMORY_RECOUNT_INTERVAL = 60
+
+# "protocol" serves clients from an asyncio.Protocol; "streams" uses the
+# StreamReader/StreamWriter loop.
+SERVER_TRANSPORT = "protocol"
+# Run on uvloop when it is installed.
+USE_UVLOOP = True
+
+# Worker processes started by main.py. More than one runs the sharded mode:
+# each worker owns a range of hash slots and redirects the rest.
+WORKERS = 1
+# Host put in -MOVED redirects and CLUSTER SLOTS replies.
+SHARD_ANNOUNCE_HOST = "127.0.0.1"
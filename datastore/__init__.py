@@ -1,3 +1,4 @@
+from .keyspace import Keyspace, RedisObject, WrongTypeError
 from .base_store import BaseStore
 from .list_store import ListStore
 from .set_store import SetStore
@@ -5,4 +6,6 @@ from .hash_store import HashStore
 from .zset_store import ZSetStore
 from .expiry import ExpiryManager
 from .pubsub import PubSubManager
-from .eviction import EvictionTracker
\ No newline at end of file
+from .blocking import BlockingQueues
+from .transactions import Transactions
+from .eviction import EvictionTracker
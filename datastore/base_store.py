@@ -1,82 +1,178 @@
 # datastore/base_store.py
 
-import time
-import sys
+import math
+from decimal import Decimal
 from typing import Any, Optional
-from datastore.eviction import EvictionTracker
-import config
+from datastore.keyspace import (Keyspace, STRING, INT64_MIN, INT64_MAX, mstime, string_to_int,
+                                string_to_float, string_value, string_size, int_value)
+from datastore.listpack import encode, decode
+
+# Largest string SETRANGE may build, as Redis's proto-max-bulk-len.
+STRING_MAX_BYTES = 512 * 1024 * 1024
+
+def format_float(value: float) -> str:
+    """Render a float as INCRBYFLOAT replies: shortest digits, no exponent,
+    no trailing ".0"."""
+    text = repr(value)
+    if "e" in text:
+        text = format(Decimal(text), "f")
+    return text[:-2] if text.endswith(".0") else text
 
-class BaseStore:
-    def __init__(self):
-        self.store: dict[str, tuple[Any, Optional[float]]] = {}
-        self.eviction = EvictionTracker()
 
-    def _is_expired(self, key: str) -> bool:
-        if key not in self.store:
-            return True
-        _, expiry = self.store[key]
-        return expiry is not None and time.time() > expiry
+def _as_str(value: Any) -> str:
+    return value if isinstance(value, str) else str(value)
+
+
+class BaseStore:
+    def __init__(self, keyspace: Optional[Keyspace] = None):
+        self.keyspace = keyspace if keyspace is not None else Keyspace()
+        self.eviction = self.keyspace.eviction
 
-    def set(self, key: str, value: Any):
+    def set(self, key: str, value: Any, expire_at: Optional[int] = None, keep_ttl: bool = False):
+        """Store a string. expire_at is an absolute unix time in ms."""
         self._maybe_evict()
-        self.store[key] = (value, None)
-        self.eviction.record_access(key)
+        obj = self.keyspace.set(key, STRING, string_value(value), keep_ttl=keep_ttl)
+        if expire_at is not None:
+            self.keyspace.set_expire(key, obj, expire_at)
 
     def get(self, key: str) -> Optional[Any]:
-        if self._is_expired(key):
-            self.store.pop(key, None)
-            self.eviction.remove(key)
-            return None
-        self.eviction.record_access(key)
-        return self.store[key][0]
+        value = self.keyspace.get(key, STRING)
+        return _as_str(value) if value is not None else None
+
+    def mget(self, keys) -> list[Optional[str]]:
+        """Values of keys, with None for missing keys and keys of other types."""
+        result = []
+        lookup = self.keyspace.lookup
+        for key in keys:
+            obj = lookup(key)
+            result.append(_as_str(obj.value) if obj is not None and obj.type == STRING else None)
+        return result
+
+    def mset(self, *pairs: str):
+        """Store each key/value pair, given flattened."""
+        for i in range(0, len(pairs), 2):
+            self.set(pairs[i], pairs[i + 1])
+
+    def msetnx(self, *pairs: str) -> bool:
+        """mset(), but only if none of the keys exist."""
+        if any(self.exists(key) for key in pairs[::2]):
+            return False
+        self.mset(*pairs)
+        return True
 
     def delete(self, key: str) -> bool:
-        self.eviction.remove(key)
-        return self.store.pop(key, None) is not None
+        return self.keyspace.delete(key)
+
+    def unlink(self, key: str) -> bool:
+        """Like delete(), but a big value is released in the background."""
+        return self.keyspace.delete(key, lazy=True)
 
     def exists(self, key: str) -> bool:
-        if self._is_expired(key):
-            self.store.pop(key, None)
-            self.eviction.remove(key)
-            return False
-        return key in self.store
+        return key in self.keyspace
 
     def expire(self, key: str, ttl_seconds: int) -> bool:
-        if key not in self.store:
+        obj = self.keyspace.lookup(key)
+        if obj is None:
             return False
-        value, _ = self.store[key]
-        self.store[key] = (value, time.time() + ttl_seconds)
+        self.keyspace.set_expire(key, obj, mstime() + ttl_seconds * 1000)
         return True
 
     def ttl(self, key: str) -> int:
-        if key not in self.store:
-            return -2
-        _, expiry = self.store[key]
-        if expiry is None:
-            return -1
-        remaining = int(expiry - time.time())
-        return remaining if remaining > 0 else -2
+        return self.keyspace.ttl(key)
 
-    def _maybe_evict(self):
-        if self._memory_usage() < config.MAX_MEMORY_BYTES:
-            return
+    def memory_usage(self, key: str) -> Optional[int]:
+        obj = self.keyspace.lookup(key)
+        return obj.size if obj is not None else None
 
-        if config.EVICTION_POLICY == "noeviction":
-            raise MemoryError("OOM command not allowed when used memory > 'maxmemory'")
+    # --- Counters and in-place string edits ---
+    # These rewrite the value of an existing key in place, so its TTL and
+    # access data are kept, as in Redis.
 
-        if config.EVICTION_POLICY == "allkeys-lru":
-            key_to_evict = self.eviction.lru_key()
-        elif config.EVICTION_POLICY == "allkeys-lfu":
-            key_to_evict = self.eviction.lfu_key()
+    def incrby(self, key: str, increment: int) -> int:
+        obj = self.keyspace.lookup_typed(key, STRING)
+        if obj is None:
+            current = 0
+        elif isinstance(obj.value, int):
+            current = obj.value
         else:
-            raise ValueError(f"Unknown eviction policy: {config.EVICTION_POLICY}")
+            current = string_to_int(obj.value)
+            if current is None:
+                raise ValueError("value is not an integer or out of range")
+        result = current + increment
+        if not INT64_MIN <= result <= INT64_MAX:
+            raise ValueError("increment or decrement would overflow")
+        self._replace(key, obj, int_value(result))
+        return result
+
+    def incrbyfloat(self, key: str, increment: float) -> str:
+        obj = self.keyspace.lookup_typed(key, STRING)
+        current = 0.0
+        if obj is not None:
+            current = obj.value if isinstance(obj.value, int) else string_to_float(obj.value)
+            if current is None:
+                raise ValueError("value is not a valid float")
+        result = current + increment
+        if math.isnan(result) or math.isinf(result):
+            raise ValueError("increment would produce NaN or Infinity")
+        text = format_float(result)
+        self._replace(key, obj, string_value(text))
+        return text
+
+    def append(self, key: str, value: str) -> int:
+        """Append to the string at key (creating it); returns the new length in bytes."""
+        obj = self.keyspace.lookup_typed(key, STRING)
+        if obj is None:
+            self.keyspace.set(key, STRING, string_value(value))
+            return len(encode(value))
+        result = _as_str(obj.value) + value
+        self._replace(key, obj, result)
+        return len(encode(result))
 
-        if key_to_evict:
-            print(f"[Eviction] Evicting '{key_to_evict}' due to policy {config.EVICTION_POLICY}")
-            self.delete(key_to_evict)
+    def strlen(self, key: str) -> int:
+        value = self.keyspace.get(key, STRING)
+        return len(encode(_as_str(value))) if value is not None else 0
 
-    def _memory_usage(self) -> int:
-        total = 0
-        for key, (val, _) in self.store.items():
-            total += sys.getsizeof(key) + sys.getsizeof(val)
-        return total
+    def getrange(self, key: str, start: int, end: int) -> str:
+        """Bytes start..end inclusive; negative offsets count from the end."""
+        value = self.keyspace.get(key, STRING)
+        if value is None or (start < 0 and end < 0 and start > end):
+            return ""
+        data = encode(_as_str(value))
+        n = len(data)
+        if start < 0:
+            start = max(n + start, 0)
+        if end < 0:
+            end = max(n + end, 0)
+        end = min(end, n - 1)
+        if start > end:
+            return ""
+        return decode(data[start:end + 1])
+
+    def setrange(self, key: str, offset: int, value: str) -> int:
+        """Overwrite bytes from offset on, zero-padding a short string;
+        returns the new length in bytes."""
+        if offset < 0:
+            raise ValueError("offset is out of range")
+        payload = encode(value)
+        if payload and offset + len(payload) > STRING_MAX_BYTES:
+            raise ValueError("string exceeds maximum allowed size (proto-max-bulk-len)")
+        obj = self.keyspace.lookup_typed(key, STRING)
+        data = bytearray(encode(_as_str(obj.value))) if obj is not None else bytearray()
+        if not payload:
+            return len(data)
+        if len(data) < offset:
+            data.extend(bytes(offset - len(data)))
+        data[offset:offset + len(payload)] = payload
+        self._replace(key, obj, decode(data))
+        return len(data)
+
+    def _replace(self, key: str, obj, value: Any):
+        """Give key (whose object is obj, or None to create it) a new string value."""
+        if obj is None:
+            self.keyspace.set(key, STRING, value)
+            return
+        self.keyspace.resize(obj, string_size(value) - string_size(obj.value))
+        obj.value = value
+
+    def _maybe_evict(self):
+        self.eviction.perform_evictions()
@@ -0,0 +1,102 @@
+# datastore/blocking.py
+
+import asyncio
+from collections import deque
+from typing import Callable, Optional
+from protocol import serializer as s
+
+
+class Waiter:
+    """A client blocked on one or more keys."""
+
+    __slots__ = ("keys", "serve", "future", "timer")
+
+    def __init__(self, keys, serve, future: asyncio.Future):
+        self.keys = keys
+        # serve(key) -> reply bytes, or None if key had nothing to give.
+        self.serve: Callable[[str], Optional[bytes]] = serve
+        self.future = future
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+def _time_out(future: asyncio.Future, reply: bytes):
+    if not future.done():
+        future.set_result(reply)
+
+
+class BlockingQueues:
+    """Clients blocked on keys (BLPOP and friends), served in FIFO order.
+
+    Each key has a deque of waiters. A write that may have given a key
+    data calls signal(key); once the write is done the command handler
+    calls serve_ready(), which hands each signalled key to its waiters,
+    oldest first, until the key runs dry. A waiter blocked on several keys
+    sits in each of their queues and leaves all of them when it is
+    served, times out, or its client goes away (cancelling its future).
+    """
+
+    def __init__(self):
+        self.waiters: dict[str, deque[Waiter]] = {}
+        # Keys signalled since the last serve_ready(), in order (a dict
+        # used as an ordered set).
+        self.ready: dict[str, None] = {}
+        self.blocked_clients = 0
+
+    def block(self, keys, serve, timeout: float, timeout_reply: bytes) -> asyncio.Future:
+        """Park a client on keys until serve() produces a reply for it, or
+        timeout seconds pass (0 = forever) and it gets timeout_reply."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = Waiter(keys, serve, future)
+        for key in keys:
+            self.waiters.setdefault(key, deque()).append(waiter)
+        if timeout > 0:
+            waiter.timer = loop.call_later(timeout, _time_out, future, timeout_reply)
+        future.add_done_callback(lambda _: self._remove(waiter))
+        self.blocked_clients += 1
+        return future
+
+    def signal(self, key: str):
+        if key in self.waiters:
+            self.ready[key] = None
+
+    def serve_ready(self):
+        """Serve waiters on every signalled key. Serving may signal more keys
+        (BLMOVE pushes to its destination); those are served too."""
+        while self.ready:
+            key = next(iter(self.ready))
+            del self.ready[key]
+            queue = self.waiters.get(key)
+            while queue:
+                waiter = queue[0]
+                if waiter.future.done():
+                    queue.popleft()
+                    continue
+                try:
+                    reply = waiter.serve(key)
+                except Exception as e:
+                    # Fail this waiter alone; the write that woke it has
+                    # already been applied and replied to.
+                    reply = s.error(str(e))
+                if reply is None:
+                    break
+                waiter.future.set_result(reply)
+                self._remove(waiter)
+
+    def _remove(self, waiter: Waiter):
+        if waiter.keys is None:
+            return
+        for key in waiter.keys:
+            queue = self.waiters.get(key)
+            if queue is None:
+                continue
+            try:
+                queue.remove(waiter)
+            except ValueError:
+                pass
+            if not queue:
+                del self.waiters[key]
+        waiter.keys = None
+        if waiter.timer is not None:
+            waiter.timer.cancel()
+        self.blocked_clients -= 1
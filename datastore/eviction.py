@@ -1,21 +1,133 @@
+import bisect
+import random
 import time
+import config
+
+# Counter given to new keys under allkeys-lfu, so they aren't evicted
+# before they have had a chance to be accessed.
+LFU_INIT_VAL = 5
+LFU_COUNTER_MAX = 255
+
+def lru_clock() -> int:
+    """Milliseconds on a monotonic clock; stamped on each key when accessed."""
+    return time.monotonic_ns() // 1_000_000
+
+def lfu_minutes() -> int:
+    """Minutes on a monotonic clock, wrapped to 16 bits."""
+    return (time.monotonic_ns() // 60_000_000_000) & 0xFFFF
+
+def lfu_log_incr(counter: int) -> int:
+    """Increment an 8-bit counter with probability 1 / ((counter - init) * factor + 1).
+
+    The counter grows roughly logarithmically with the number of accesses,
+    so 8 bits cover millions of hits.
+    """
+    if counter == LFU_COUNTER_MAX:
+        return counter
+    base = counter - LFU_INIT_VAL
+    if base < 0:
+        base = 0
+    if random.random() < 1.0 / (base * config.LFU_LOG_FACTOR + 1):
+        counter += 1
+    return counter
+
+def lfu_decayed(packed: int) -> int:
+    """Return the counter in packed lru data, less one per decay period since last access."""
+    counter = packed & 0xFF
+    if config.LFU_DECAY_TIME:
+        elapsed = (lfu_minutes() - (packed >> 8)) & 0xFFFF
+        periods = elapsed // config.LFU_DECAY_TIME
+        counter = counter - periods if periods < counter else 0
+    return counter
 
 class EvictionTracker:
-    def __init__(self):
-        self.access_times = {}   # key -> timestamp
-        self.access_counts = {}  # key -> count
+    """Approximate allkeys-lru / allkeys-lfu, the way Redis does it.
+
+    Each access stamps the key's RedisObject. Its lru slot holds either the
+    LRU clock, or under allkeys-lfu the LFU data packed into one int: the
+    minute of the last decrement in the upper 16 bits and an 8-bit
+    logarithmic access counter in the lower 8.
+
+    To evict, a few random keys (config.MAXMEMORY_SAMPLES) are scored and
+    merged into a small pool of the best candidates seen so far; the best
+    one in the pool is evicted. The pool carries good candidates over
+    between evictions, so the choice gets close to exact LRU/LFU while each
+    eviction costs O(samples) instead of a scan over every key.
+    """
+
+    def __init__(self, keyspace):
+        self.keyspace = keyspace
+        self.evicted_keys = 0
+        # (score, key) sorted ascending; the last entry is evicted first.
+        self.pool: list[tuple[int, str]] = []
+
+    def init_object(self, obj):
+        if config.EVICTION_POLICY == "allkeys-lfu":
+            obj.lru = (lfu_minutes() << 8) | LFU_INIT_VAL
+        else:
+            obj.lru = lru_clock()
+
+    def record_access(self, obj):
+        if config.EVICTION_POLICY == "allkeys-lfu":
+            counter = lfu_log_incr(lfu_decayed(obj.lru))
+            obj.lru = (lfu_minutes() << 8) | counter
+        else:
+            obj.lru = lru_clock()
+
+    def frequency(self, obj) -> int:
+        """The object's LFU counter, with decay applied."""
+        return lfu_decayed(obj.lru)
+
+    def perform_evictions(self):
+        """Evict keys until used memory is back under maxmemory."""
+        keyspace = self.keyspace
+        while keyspace.used_memory >= config.MAX_MEMORY_BYTES:
+            if config.EVICTION_POLICY == "noeviction":
+                raise MemoryError("command not allowed when used memory > 'maxmemory'")
 
-    def record_access(self, key):
-        self.access_times[key] = time.time()
-        self.access_counts[key] = self.access_counts.get(key, 0) + 1
-        print(f"[LFU] {key} count = {self.access_counts[key]}")
+            key_to_evict = self.best_key()
+            if key_to_evict is None:
+                return
+            keyspace.delete(key_to_evict, lazy=config.LAZYFREE_LAZY_EVICTION)
+            self.evicted_keys += 1
 
-    def remove(self, key):
-        self.access_times.pop(key, None)
-        self.access_counts.pop(key, None)
+    def best_key(self):
+        """Sample the keyspace into the pool and pop the best candidate."""
+        data = self.keyspace.data
+        if not data:
+            return None
+        now = lru_clock()
+        self.populate_pool(now)
+        pool = self.pool
+        while pool:
+            score, key = pool.pop()
+            obj = data.get(key)
+            # Skip keys deleted since they were pooled, and keys that were
+            # touched again (their score is stale).
+            if obj is not None and self.score(obj, now) >= score:
+                return key
+        return None
 
-    def lru_key(self):
-        return min(self.access_times.items(), key=lambda x: x[1])[0]
+    def populate_pool(self, now: int):
+        keyspace = self.keyspace
+        pool = self.pool
+        pool_size = config.EVICTION_POOL_SIZE
+        for key in keyspace.sample_keys(config.MAXMEMORY_SAMPLES):
+            entry = (self.score(keyspace.data[key], now), key)
+            if len(pool) >= pool_size and entry <= pool[0]:
+                continue
+            for i, (_, pooled) in enumerate(pool):
+                if pooled == key:
+                    del pool[i]
+                    break
+            bisect.insort(pool, entry)
+            if len(pool) > pool_size:
+                del pool[0]
 
-    def lfu_key(self):
-        return min(self.access_counts.items(), key=lambda x: x[1])[0]
+    def score(self, obj, now: int) -> int:
+        """Higher means a better eviction candidate."""
+        if config.EVICTION_POLICY == "allkeys-lfu":
+            return LFU_COUNTER_MAX - lfu_decayed(obj.lru)
+        if config.EVICTION_POLICY == "allkeys-lru":
+            return now - obj.lru
+        raise ValueError(f"Unknown eviction policy: {config.EVICTION_POLICY}")
@@ -1,34 +1,121 @@
 import time
 import asyncio
+import heapq
+import config
+from datastore.keyspace import Keyspace, mstime
 
 class ExpiryManager:
-    def __init__(self):
-        # key -> expiry timestamp
-        self.expiries = {}
+    """Active expiry over the keyspace's deadline heap.
 
-    def set_expiry(self, key: str, ttl_seconds: int):
-        self.expiries[key] = time.time() + ttl_seconds
+    Keys are also expired lazily when they are looked up; the active cycle
+    reclaims the ones nobody touches. Each cycle pops due keys in deadline
+    order for at most config.ACTIVE_EXPIRE_CYCLE_MS. A cycle that runs out
+    of time leaves a backlog, and the next one starts as soon as the event
+    loop has served other work; otherwise run_gc sleeps until the next
+    deadline (at most `interval`).
+    """
+
+    def __init__(self, keyspace: Keyspace | None = None):
+        # Deadlines live on each key's RedisObject (expire_at).
+        self.keyspace = keyspace if keyspace is not None else Keyspace()
+        # Total milliseconds spent in active expire cycles.
+        self.cycle_time = 0.0
+
+    def set_expiry(self, key: str, ttl_seconds: int) -> bool:
+        return self.expire_at(key, mstime() + ttl_seconds * 1000)
+
+    def expire_at(self, key: str, when: int) -> bool:
+        """Set key to expire at unix time when (ms). A deadline already in
+        the past deletes the key straight away. Returns False if key doesn't exist."""
+        obj = self.keyspace.lookup(key)
+        if obj is None:
+            return False
+        if when <= mstime():
+            self.keyspace.delete(key)
+        else:
+            self.keyspace.set_expire(key, obj, when)
+        return True
 
     def ttl(self, key: str) -> int:
-        if key not in self.expiries:
-            return -1  # no expiry set
-        remaining = int(self.expiries[key] - time.time())
-        return remaining if remaining > 0 else -2  # expired
+        return self.keyspace.ttl(key)
+
+    def pttl(self, key: str) -> int:
+        return self.keyspace.pttl(key)
 
     def is_expired(self, key: str) -> bool:
-        return self.ttl(key) == -2
+        obj = self.keyspace.data.get(key)
+        return obj is not None and obj.expire_at is not None and obj.expire_at <= mstime()
 
-    def remove(self, key: str):
-        self.expiries.pop(key, None)
+    def persist(self, key: str) -> bool:
+        return self.keyspace.persist(key)
 
     def keys_to_delete(self) -> list[str]:
-        now = time.time()
-        return [k for k, exp in self.expiries.items() if exp <= now]
+        """Pop every due entry off the heap and return the keys that are really expired.
+
+        The caller is expected to delete them.
+        """
+        now = mstime()
+        keys = []
+        while True:
+            key = self._pop_due(now)
+            if key is None:
+                return keys
+            keys.append(key)
+
+    def _pop_due(self, now: int):
+        """Pop the next live, expired key off the heap, or None if nothing is due."""
+        heap = self.keyspace.expires
+        data = self.keyspace.data
+        while heap and heap[0][0] <= now:
+            when, key = heapq.heappop(heap)
+            obj = data.get(key)
+            if obj is not None and obj.expire_at == when:
+                return key
+        return None
+
+    def active_expire_cycle(self, store_deleter, time_limit: float) -> bool:
+        """Delete due keys for up to time_limit seconds.
+
+        Returns True if it stopped with expired keys still pending.
+        """
+        keyspace = self.keyspace
+        # Stale entries pile up when TTLs are reset often; compact the heap
+        # once they outnumber live keys.
+        if len(keyspace.expires) > 2 * len(keyspace.data) + 1024:
+            keyspace.rebuild_expires()
+
+        start = time.perf_counter()
+        deadline = start + time_limit
+        now = mstime()
+        backlog = False
+        done = 0
+        while True:
+            key = self._pop_due(now)
+            if key is None:
+                break
+            store_deleter(key)
+            keyspace.expired_keys += 1
+            done += 1
+            # Only read the clock every 16 keys.
+            if done % 16 == 0 and time.perf_counter() >= deadline:
+                backlog = True
+                break
+        self.cycle_time += (time.perf_counter() - start) * 1000
+        return backlog
+
+    def next_deadline(self):
+        heap = self.keyspace.expires
+        return heap[0][0] if heap else None
 
-    async def run_gc(self, store_deleter, interval: int = 1):
+    async def run_gc(self, store_deleter, interval: float = 1):
+        time_limit = config.ACTIVE_EXPIRE_CYCLE_MS / 1000
         while True:
-            expired_keys = self.keys_to_delete()
-            for key in expired_keys:
-                store_deleter(key)
-                self.remove(key)
-            await asyncio.sleep(interval)
+            if self.active_expire_cycle(store_deleter, time_limit):
+                # Many keys expired at once: keep going, but let clients in first.
+                await asyncio.sleep(0)
+                continue
+            delay = interval
+            deadline = self.next_deadline()
+            if deadline is not None:
+                delay = min(interval, max((deadline - mstime()) / 1000, 0))
+            await asyncio.sleep(delay)
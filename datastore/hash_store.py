@@ -1,34 +1,234 @@
 # datastore/hash_store.py
 
-class HashStore:
+import config
+from datastore.keyspace import Keyspace, HASH, INT64_MIN, INT64_MAX, string_to_int, value_size
+from datastore.listpack import Listpack, LISTPACK_OVERHEAD
+from datastore.memory import sizeof, HASH_ENTRY, EMPTY_DICT, EMPTY_LIST
+from datastore.scan import scan_slots
+
+class PackedHash:
+    """A small hash stored as a listpack of alternating fields and values."""
+
+    __slots__ = ("lp",)
+    encoding = "listpack"
+
     def __init__(self):
-        self.hashes = {}
+        self.lp = Listpack()
+
+    def __len__(self) -> int:
+        return len(self.lp) // 2
+
+    def _find(self, field: str) -> int:
+        # Only even slots hold fields; skip matches that land on a value.
+        lp = self.lp
+        i = lp.find(field)
+        while i >= 0 and i % 2:
+            i = lp.find(field, i + 1)
+        return i
+
+    def __iter__(self):
+        return (field for field, _ in self.items())
+
+    def __contains__(self, field: str) -> bool:
+        return self._find(field) >= 0
+
+    def get(self, field: str, default=None):
+        i = self._find(field)
+        return self.lp.get(i + 1) if i >= 0 else default
+
+    def set(self, field: str, value: str) -> bool:
+        """Set field to value; returns True if the field is new."""
+        i = self._find(field)
+        if i >= 0:
+            self.lp.replace(i + 1, value)
+            return False
+        self.lp.append(field)
+        self.lp.append(value)
+        return True
+
+    def pop(self, field: str, default=None):
+        i = self._find(field)
+        if i < 0:
+            return default
+        value = self.lp.get(i + 1)
+        self.lp.delete(i, 2)
+        return value
+
+    def items(self):
+        entries = iter(self.lp)
+        return zip(entries, entries)
+
+    def memory_usage(self) -> int:
+        return _PACKED_HASH_OBJECT + LISTPACK_OVERHEAD + self.lp.nbytes
+
+_PACKED_HASH_OBJECT = sizeof(PackedHash())
+
+class TableHash:
+    """A hash past the listpack limits: a dict from each field to its slot
+    in dense fields/values arrays. Deleting a field moves the last one
+    into its slot, so HSCAN can walk the arrays by position (see
+    scan_slots)."""
+
+    __slots__ = ("index", "fields", "values")
+    encoding = "hashtable"
+
+    def __init__(self, items=()):
+        self.index: dict[str, int] = {}
+        self.fields: list[str] = []
+        self.values: list[str] = []
+        for field, value in items:
+            self.set(field, value)
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def __iter__(self):
+        return iter(self.fields)
 
-    def hset(self, key: str, field: str, value: str) -> int:
-        if key not in self.hashes:
-            self.hashes[key] = {}
-        is_new = field not in self.hashes[key]
-        self.hashes[key][field] = value
-        return 1 if is_new else 0
+    def __contains__(self, field: str) -> bool:
+        return field in self.index
+
+    def get(self, field: str, default=None):
+        i = self.index.get(field)
+        return self.values[i] if i is not None else default
+
+    def set(self, field: str, value: str) -> bool:
+        """Set field to value; returns True if the field is new."""
+        i = self.index.get(field)
+        if i is not None:
+            self.values[i] = value
+            return False
+        self.index[field] = len(self.fields)
+        self.fields.append(field)
+        self.values.append(value)
+        return True
+
+    def pop(self, field: str, default=None):
+        i = self.index.pop(field, None)
+        if i is None:
+            return default
+        value = self.values[i]
+        last_field, last_value = self.fields.pop(), self.values.pop()
+        if i < len(self.fields):
+            self.fields[i], self.values[i] = last_field, last_value
+            self.index[last_field] = i
+        return value
+
+    def items(self):
+        return zip(self.fields, self.values)
+
+    def scan(self, cursor: int, count: int) -> tuple[int, list[str]]:
+        return scan_slots(self.fields, cursor, count)
+
+    def memory_usage(self) -> int:
+        return _TABLE_HASH_OBJECT + sum(sizeof(f) + sizeof(v) + HASH_ENTRY for f, v in self.items())
+
+    def free_effort(self) -> int:
+        return len(self.fields)
+
+    def dismantle(self):
+        index, fields, values = self.index, self.fields, self.values
+        while fields:
+            del index[fields.pop()]
+            values.pop()
+            yield
+
+_TABLE_HASH_OBJECT = sizeof(TableHash()) + EMPTY_DICT + 2 * EMPTY_LIST
+
+def _fits_listpack(field: str, value: str) -> bool:
+    limit = config.HASH_MAX_LISTPACK_VALUE
+    return len(field) <= limit and len(value) <= limit
+
+class HashStore:
+    def __init__(self, keyspace: Keyspace | None = None):
+        self.keyspace = keyspace if keyspace is not None else Keyspace()
+
+    def hset(self, key: str, *field_values: str) -> int:
+        """Set field/value pairs, given flattened. Returns how many fields are new."""
+        obj = self.keyspace.get_or_create(key, HASH, PackedHash)
+        added = 0
+        for i in range(0, len(field_values), 2):
+            added += self._set_field(obj, field_values[i], field_values[i + 1])
+        return added
+
+    def _set_field(self, obj, field: str, value: str) -> int:
+        h = obj.value
+        if type(h) is PackedHash:
+            if _fits_listpack(field, value) and (
+                    len(h) < config.HASH_MAX_LISTPACK_ENTRIES or field in h):
+                before = h.memory_usage()
+                is_new = h.set(field, value)
+                self.keyspace.resize(obj, h.memory_usage() - before)
+                return int(is_new)
+            h = self._convert(obj)
+        old = h.get(field)
+        h.set(field, value)
+        if old is None:
+            self.keyspace.resize(obj, sizeof(field) + sizeof(value) + HASH_ENTRY)
+            return 1
+        self.keyspace.resize(obj, sizeof(value) - sizeof(old))
+        return 0
+
+    def hincrby(self, key: str, field: str, increment: int) -> int:
+        h = self.keyspace.get(key, HASH)
+        current = h.get(field) if h is not None else None
+        if current is None:
+            n = 0
+        else:
+            n = string_to_int(current)
+            if n is None:
+                raise ValueError("hash value is not an integer")
+        result = n + increment
+        if not INT64_MIN <= result <= INT64_MAX:
+            raise ValueError("increment or decrement would overflow")
+        self.hset(key, field, str(result))
+        return result
+
+    def _convert(self, obj) -> TableHash:
+        """Move a listpack hash that has outgrown its limits to a TableHash."""
+        packed = obj.value
+        h = TableHash(packed.items())
+        obj.value = h
+        self.keyspace.resize(obj, value_size(HASH, h) - packed.memory_usage())
+        return h
 
     def hget(self, key: str, field: str) -> str | None:
-        return self.hashes.get(key, {}).get(field)
+        h = self.keyspace.get(key, HASH)
+        return h.get(field) if h is not None else None
+
+    def hmget(self, key: str, *fields: str) -> list[str | None]:
+        h = self.keyspace.get(key, HASH)
+        if h is None:
+            return [None] * len(fields)
+        return [h.get(field) for field in fields]
 
     def hgetall(self, key: str) -> list[str]:
-        h = self.hashes.get(key, {})
+        h = self.keyspace.get(key, HASH)
         result = []
-        for field, value in h.items():
-            result.extend([field, value])
+        if h is not None:
+            for field, value in h.items():
+                result.extend([field, value])
         return result
 
     def hdel(self, key: str, *fields: str) -> int:
-        if key not in self.hashes:
+        obj = self.keyspace.lookup_typed(key, HASH)
+        if obj is None:
             return 0
+        h = obj.value
         count = 0
+        packed = type(h) is PackedHash
+        before = h.memory_usage() if packed else 0
+        delta = 0
         for field in fields:
-            if field in self.hashes[key]:
-                del self.hashes[key][field]
+            if field in h:
+                value = h.pop(field)
+                if not packed:
+                    delta -= sizeof(field) + sizeof(value) + HASH_ENTRY
                 count += 1
-        if not self.hashes[key]:
-            del self.hashes[key]
+        if packed:
+            delta = h.memory_usage() - before
+        if not h:
+            self.keyspace.delete(key)
+        elif count:
+            self.keyspace.resize(obj, delta)
         return count
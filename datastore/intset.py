@@ -0,0 +1,67 @@
+# datastore/intset.py
+
+import bisect
+from array import array
+from typing import Iterator
+from datastore.keyspace import string_to_int
+from datastore.memory import sizeof
+
+
+class IntSet:
+    """A set of integers kept as a sorted array of int64, like Redis's intset.
+
+    8 bytes per member and O(log n) membership tests by bisection. Members
+    go in and come out as strings; only canonical integer strings fit.
+    """
+
+    __slots__ = ("values",)
+    encoding = "intset"
+
+    def __init__(self, members=()):
+        self.values = array("q", sorted({string_to_int(m) for m in members}))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __iter__(self) -> Iterator[str]:
+        return map(str, self.values)
+
+    def __contains__(self, member: str) -> bool:
+        n = string_to_int(member)
+        if n is None:
+            return False
+        values = self.values
+        i = bisect.bisect_left(values, n)
+        return i < len(values) and values[i] == n
+
+    def get(self, index: int) -> str:
+        return str(self.values[index])
+
+    def accepts(self, member: str, max_entries: int) -> bool:
+        return len(self.values) < max_entries and string_to_int(member) is not None
+
+    def add(self, member: str) -> bool:
+        n = string_to_int(member)
+        values = self.values
+        i = bisect.bisect_left(values, n)
+        if i < len(values) and values[i] == n:
+            return False
+        values.insert(i, n)
+        return True
+
+    def remove(self, member: str) -> bool:
+        n = string_to_int(member)
+        if n is None:
+            return False
+        values = self.values
+        i = bisect.bisect_left(values, n)
+        if i < len(values) and values[i] == n:
+            del values[i]
+            return True
+        return False
+
+    def memory_usage(self) -> int:
+        return _INTSET_OBJECT + sizeof(self.values)
+
+
+_INTSET_OBJECT = sizeof(IntSet())
@@ -0,0 +1,366 @@
+# datastore/keyspace.py
+
+import asyncio
+import heapq
+import math
+import random
+import time
+from typing import Any, Callable, Optional
+import config
+from datastore.eviction import EvictionTracker
+from datastore.lazyfree import LazyFree
+from datastore.memory import sizeof, DICT_ENTRY
+
+# Type tags, as reported by TYPE
+STRING = "string"
+LIST = "list"
+SET = "set"
+HASH = "hash"
+ZSET = "zset"
+
+
+INT64_MIN, INT64_MAX = -2**63, 2**63 - 1
+
+
+def mstime() -> int:
+    """Current unix time in milliseconds; the unit of every deadline."""
+    return time.time_ns() // 1_000_000
+
+
+def string_to_int(value: str) -> Optional[int]:
+    """The int a string spells, if it is a canonical 64-bit integer ("12",
+    not "012", "+12" or " 12"); otherwise None."""
+    if not value or len(value) > 20:
+        return None
+    try:
+        n = int(value)
+    except ValueError:
+        return None
+    if not INT64_MIN <= n <= INT64_MAX or str(n) != value:
+        return None
+    return n
+
+
+def string_to_float(value: str) -> Optional[float]:
+    """The float a string spells, as Redis reads one; otherwise None.
+    float() alone also takes surrounding whitespace, "1_0", non-ASCII
+    digits and "nan", which Redis rejects. "inf"/"-inf" are accepted."""
+    if not value or not value.isascii() or value[0].isspace() or value[-1].isspace() or "_" in value:
+        return None
+    try:
+        n = float(value)
+    except ValueError:
+        return None
+    return None if math.isnan(n) else n
+
+
+# Integers below this are stored as one shared object each, so a string
+# value holding one costs nothing beyond its key (OBJ_SHARED_INTEGERS).
+SHARED_INTEGERS_COUNT = 10000
+SHARED_INTEGERS = tuple(range(SHARED_INTEGERS_COUNT))
+
+
+def int_value(n: int) -> int:
+    return SHARED_INTEGERS[n] if 0 <= n < SHARED_INTEGERS_COUNT else n
+
+
+def string_value(value: str) -> Any:
+    """How a string is kept in the keyspace: as an int when it spells a
+    canonical 64-bit integer (the shared object if it is small), else as is."""
+    n = string_to_int(value) if isinstance(value, str) else None
+    return value if n is None else int_value(n)
+
+
+def string_size(value: Any) -> int:
+    if isinstance(value, int):
+        return 0 if 0 <= value < SHARED_INTEGERS_COUNT else sizeof(value)
+    return sizeof(value)
+
+
+class WrongTypeError(Exception):
+    def __init__(self):
+        super().__init__("Operation against a key holding the wrong kind of value")
+
+
+class RedisObject:
+    """A value in the keyspace plus everything the server tracks about it."""
+
+    __slots__ = ("type", "value", "expire_at", "lru", "size", "index")
+
+    def __init__(self, type: str, value: Any):
+        self.type = type
+        self.value = value
+        self.expire_at: Optional[int] = None  # absolute unix time in ms, None = persistent
+        self.lru = 0     # LRU clock, or packed LFU data (see EvictionTracker)
+        self.size = 0    # bytes charged to used_memory for this key
+        self.index = 0   # position in Keyspace.keys
+
+
+_OBJECT_HEADER = sizeof(RedisObject(STRING, None))
+
+
+def value_size(type: str, value: Any) -> int:
+    """Walk a whole value and estimate its size."""
+    if type == STRING:
+        return string_size(value)
+    # Every other representation measures itself.
+    return value.memory_usage()
+
+
+def encoding_of(obj: "RedisObject") -> str:
+    """The internal representation of a value, as OBJECT ENCODING reports it."""
+    value = obj.value
+    if obj.type == STRING:
+        if isinstance(value, int):
+            return "int"
+        return "embstr" if len(value) <= 44 else "raw"
+    return value.encoding
+
+
+class Keyspace:
+    """The single key -> RedisObject dict shared by every data type.
+
+    Every command resolves its key with one lookup here, which also applies
+    lazy expiry and records the access for eviction.
+
+    used_memory is kept up to date incrementally: whole values are measured
+    when they are stored, and stores report the size change of each
+    mutation through resize(). Nothing ever walks the dataset on a write.
+
+    versions holds write counters for WATCHed keys. set(), delete(),
+    resize() and the TTL setters bump the key's counter, so a key counts
+    as written exactly when a store changed it (or it expired or was
+    evicted), not whenever a write command named it.
+
+    keys holds every key densely so eviction can sample a random key in
+    O(1); each object remembers its slot and deletes swap the last key in.
+
+    A key's TTL is its object's expire_at, in unix milliseconds; nothing
+    else records it. expires is a min-heap of (deadline, key) over those
+    values for active expiry. Entries are
+    never removed when a TTL changes or a key goes away; whoever pops one
+    checks it against the object's current expire_at and drops stale ones.
+    """
+
+    def __init__(self):
+        self.data: dict[str, RedisObject] = {}
+        self.keys: list[str] = []
+        self.expires: list[tuple[int, str]] = []
+        self.expired_keys = 0
+        self.eviction = EvictionTracker(self)
+        self.lazyfree = LazyFree()
+        self.used_memory = 0
+        self.peak_memory = 0
+        # Correction applied by the last full recount pass.
+        self.recount_drift = 0
+        # Write counters for WATCHed keys (see datastore.transactions);
+        # keys nobody watches have none.
+        self.versions: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, key: str) -> bool:
+        return self.lookup(key) is not None
+
+    def lookup(self, key: str, touch: bool = True) -> Optional[RedisObject]:
+        """Return the live object at key. touch=False leaves its LRU/LFU data alone."""
+        obj = self.data.get(key)
+        if obj is None:
+            return None
+        if obj.expire_at is not None and obj.expire_at <= mstime():
+            self.delete(key, lazy=config.LAZYFREE_LAZY_EXPIRE)
+            self.expired_keys += 1
+            return None
+        if touch:
+            self.eviction.record_access(obj)
+        return obj
+
+    def lookup_typed(self, key: str, type: str) -> Optional[RedisObject]:
+        """Like lookup(), but raises WrongTypeError if key holds another type."""
+        obj = self.lookup(key)
+        if obj is not None and obj.type != type:
+            raise WrongTypeError()
+        return obj
+
+    def get(self, key: str, type: str) -> Any:
+        """Return the value stored at key, or None if there is none."""
+        obj = self.lookup_typed(key, type)
+        return obj.value if obj is not None else None
+
+    def get_or_create(self, key: str, type: str, factory: Callable[[], Any]) -> RedisObject:
+        obj = self.lookup_typed(key, type)
+        if obj is None:
+            obj = self.set(key, type, factory())
+        return obj
+
+    def set(self, key: str, type: str, value: Any, keep_ttl: bool = False) -> RedisObject:
+        """Store value at key, replacing whatever was there (and its TTL, unless keep_ttl)."""
+        obj = RedisObject(type, value)
+        obj.size = sizeof(key) + _OBJECT_HEADER + DICT_ENTRY + value_size(type, value)
+        old = self.data.get(key)
+        if old is not None:
+            self.used_memory -= old.size
+            obj.index = old.index
+            if keep_ttl and old.expire_at is not None and old.expire_at > mstime():
+                # Its heap entry still matches, so nothing to push.
+                obj.expire_at = old.expire_at
+        else:
+            obj.index = len(self.keys)
+            self.keys.append(key)
+        self.data[key] = obj
+        self.used_memory += obj.size
+        if self.used_memory > self.peak_memory:
+            self.peak_memory = self.used_memory
+        self.eviction.init_object(obj)
+        if self.versions:
+            self.touch(key)
+        return obj
+
+    def set_expire(self, key: str, obj: RedisObject, when: int):
+        """Make key (whose object is obj) expire at unix time when, in ms."""
+        obj.expire_at = when
+        heapq.heappush(self.expires, (when, key))
+        if self.versions:
+            self.touch(key)
+
+    def persist(self, key: str) -> bool:
+        """Remove key's TTL. Returns False if it had none (or doesn't exist)."""
+        obj = self.lookup(key)
+        if obj is None or obj.expire_at is None:
+            return False
+        obj.expire_at = None
+        if self.versions:
+            self.touch(key)
+        return True
+
+    def pttl(self, key: str) -> int:
+        """Milliseconds left to live; -2 if key doesn't exist, -1 if it has no TTL."""
+        obj = self.lookup(key, touch=False)
+        if obj is None:
+            return -2
+        if obj.expire_at is None:
+            return -1
+        return max(obj.expire_at - mstime(), 0)
+
+    def ttl(self, key: str) -> int:
+        """pttl() in whole seconds."""
+        ms = self.pttl(key)
+        return ms if ms < 0 else ms // 1000
+
+    def rebuild_expires(self):
+        """Rebuild the expiry heap from live TTLs, dropping stale entries."""
+        self.expires = [(obj.expire_at, key) for key, obj in self.data.items()
+                        if obj.expire_at is not None]
+        heapq.heapify(self.expires)
+
+    def resize(self, obj: RedisObject, delta: int):
+        """Account for a value that was modified in place and grew (or
+        shrank) by delta bytes. Stores call this only when something
+        really changed, as it also counts as a write for WATCH."""
+        obj.size += delta
+        self.used_memory += delta
+        if self.used_memory > self.peak_memory:
+            self.peak_memory = self.used_memory
+        if self.versions:
+            self.touch(self.keys[obj.index])
+
+    def touch(self, key: str):
+        """Record a write to key for anyone WATCHing it."""
+        if key in self.versions:
+            self.versions[key] += 1
+
+    def delete(self, key: str, lazy: bool = False) -> bool:
+        """Remove key. lazy hands a big value to the background releaser
+        instead of freeing it here; used_memory drops straight away either way."""
+        obj = self.data.pop(key, None)
+        if obj is None:
+            return False
+        if self.versions:
+            self.touch(key)
+        self.used_memory -= obj.size
+        last = self.keys.pop()
+        if last != key:
+            self.keys[obj.index] = last
+            self.data[last].index = obj.index
+        if lazy:
+            self.lazyfree.free(obj.value)
+        return True
+
+    def flush(self, lazy: bool = False):
+        """Remove every key, releasing the old contents in the background if lazy."""
+        old_data, old_keys, old_expires = self.data, self.keys, self.expires
+        self.data = {}
+        self.keys = []
+        self.expires = []
+        self.eviction.pool.clear()
+        self.used_memory = 0
+        for key in self.versions:
+            self.versions[key] += 1
+        if lazy:
+            self.lazyfree.free_keyspace(old_data)
+            self.lazyfree.free(old_keys)
+            self.lazyfree.free(old_expires)
+
+    def sample_keys(self, count: int) -> list[str]:
+        """Return count random keys, or every key if there are no more than that."""
+        keys = self.keys
+        n = len(keys)
+        if n <= count:
+            return list(keys)
+        rand = random.random
+        return [keys[int(rand() * n)] for _ in range(count)]
+
+    def scan(self, cursor: int, count: int) -> tuple[int, list[str]]:
+        """Return (next cursor, keys) for the next count slots of keys; cursor
+        0 starts a scan and a returned 0 ends it.
+
+        Slots are walked from the end down and the cursor is the number of
+        slots left. New keys are appended above the cursor, and a delete
+        only moves the last key into the freed slot, so a key that is still
+        unvisited stays below the cursor: every key present for the whole
+        scan is returned (some that move may be returned twice).
+        """
+        keys = self.keys
+        start = len(keys) if cursor == 0 else min(cursor, len(keys))
+        stop = max(start - count, 0)
+        data = self.data
+        now = mstime()
+        found = []
+        for i in range(start - 1, stop - 1, -1):
+            key = keys[i]
+            expire_at = data[key].expire_at
+            if expire_at is None or expire_at > now:
+                found.append(key)
+        return stop, found
+
+    def type_of(self, key: str) -> str:
+        obj = self.lookup(key)
+        return obj.type if obj is not None else "none"
+
+    def recount_memory(self, keys) -> int:
+        """Re-measure the given keys from scratch and fix any drift.
+
+        Returns the total correction applied.
+        """
+        drift = 0
+        for key in keys:
+            obj = self.data.get(key)
+            if obj is None:
+                continue
+            actual = sizeof(key) + _OBJECT_HEADER + DICT_ENTRY + value_size(obj.type, obj.value)
+            drift += actual - obj.size
+            obj.size = actual
+        self.used_memory += drift
+        return drift
+
+    async def run_memory_recount(self, interval: float = 60, batch_size: int = 1000):
+        """Periodically re-measure every key, a batch per loop iteration."""
+        while True:
+            await asyncio.sleep(interval)
+            keys = list(self.data)
+            drift = 0
+            for start in range(0, len(keys), batch_size):
+                drift += self.recount_memory(keys[start:start + batch_size])
+                await asyncio.sleep(0)
+            self.recount_drift = drift
@@ -0,0 +1,113 @@
+# datastore/lazyfree.py
+
+import asyncio
+from collections import deque
+from typing import Any, Iterator
+
+# Values that take more than this many frees to tear down are released in
+# the background; cheaper ones are freed on the spot (Redis's
+# LAZYFREE_THRESHOLD).
+LAZYFREE_THRESHOLD = 64
+# Frees the background releaser does per event loop iteration.
+LAZYFREE_CHUNK = 1024
+# Entries dropped per step when tearing down a plain list.
+_LIST_STEP = 64
+
+
+def free_effort(value: Any) -> int:
+    """Roughly how many objects freeing value releases. Containers that
+    hold many objects report it through a free_effort() method."""
+    if isinstance(value, (dict, set)):
+        return len(value)
+    if isinstance(value, list):
+        return len(value) // _LIST_STEP + 1
+    effort = getattr(value, "free_effort", None)
+    return effort() if effort is not None else 1
+
+
+def dismantle(value: Any) -> Iterator[None]:
+    """Tear value down a piece at a time, yielding after each piece."""
+    if isinstance(value, dict):
+        popitem = value.popitem
+        while value:
+            popitem()
+            yield
+    elif isinstance(value, set):
+        pop = value.pop
+        while value:
+            pop()
+            yield
+    elif isinstance(value, list):
+        while value:
+            del value[-_LIST_STEP:]
+            yield
+    else:
+        steps = getattr(value, "dismantle", None)
+        if steps is not None:
+            yield from steps()
+
+
+def _dismantle_keyspace(data: dict) -> Iterator[None]:
+    # Popping a key frees its RedisObject, so take big values apart first.
+    popitem = data.popitem
+    while data:
+        _, obj = popitem()
+        if free_effort(obj.value) > LAZYFREE_THRESHOLD:
+            yield from dismantle(obj.value)
+        yield
+
+
+class LazyFree:
+    """Releases big values off the request path.
+
+    Dropping the last reference to a dict with millions of entries frees
+    them all in one C call that holds the GIL, so a worker thread would
+    stall the event loop just the same. Instead a deleted value is taken
+    apart a piece at a time by a background task, LAZYFREE_CHUNK pieces
+    per loop iteration, with clients served in between.
+    """
+
+    def __init__(self):
+        self.jobs: deque[Iterator[None]] = deque()
+        self.pending_objects = 0   # values (or whole keyspaces) waiting
+        self.freed_objects = 0
+        self.wakeup = asyncio.Event()
+
+    def free(self, value: Any) -> bool:
+        """Release value, in the background if it is big. Returns True if deferred."""
+        if free_effort(value) <= LAZYFREE_THRESHOLD:
+            return False
+        self._submit(dismantle(value))
+        return True
+
+    def free_keyspace(self, data: dict):
+        """Release a whole key -> RedisObject dict in the background."""
+        self._submit(_dismantle_keyspace(data))
+
+    def _submit(self, job: Iterator[None]):
+        self.jobs.append(job)
+        self.pending_objects += 1
+        self.wakeup.set()
+
+    def release(self, budget: int = LAZYFREE_CHUNK) -> int:
+        """Do up to budget pieces of pending work; returns how many were done."""
+        done = 0
+        jobs = self.jobs
+        while jobs and done < budget:
+            for _ in jobs[0]:
+                done += 1
+                if done >= budget:
+                    break
+            else:
+                jobs.popleft()
+                self.pending_objects -= 1
+                self.freed_objects += 1
+        return done
+
+    async def run(self):
+        while True:
+            if not self.jobs:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            self.release()
+            await asyncio.sleep(0)
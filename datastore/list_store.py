@@ -1,40 +1,102 @@
 # datastore/list_store.py
 
-from collections import deque
+from datastore.keyspace import Keyspace, LIST
+from datastore.quicklist import QuickList
 
 class ListStore:
-    def __init__(self):
-        self.lists = {}  # key: deque
+    def __init__(self, keyspace: Keyspace | None = None):
+        self.keyspace = keyspace if keyspace is not None else Keyspace()
 
     def lpush(self, key, *values):
-        if key not in self.lists:
-            self.lists[key] = deque()
-        for val in values:
-            self.lists[key].appendleft(val)
-        return len(self.lists[key])
+        obj = self.keyspace.get_or_create(key, LIST, QuickList)
+        lst = obj.value
+        before = lst.memory_usage()
+        lst.push_head(*values)
+        self.keyspace.resize(obj, lst.memory_usage() - before)
+        return len(lst)
 
     def rpush(self, key, *values):
-        if key not in self.lists:
-            self.lists[key] = deque()
-        for val in values:
-            self.lists[key].append(val)
-        return len(self.lists[key])
+        obj = self.keyspace.get_or_create(key, LIST, QuickList)
+        lst = obj.value
+        before = lst.memory_usage()
+        lst.push_tail(*values)
+        self.keyspace.resize(obj, lst.memory_usage() - before)
+        return len(lst)
 
     def lpop(self, key):
-        if key in self.lists and self.lists[key]:
-            return self.lists[key].popleft()
-        return None
+        return self._edit(key, QuickList.pop_head)
 
     def rpop(self, key):
-        if key in self.lists and self.lists[key]:
-            return self.lists[key].pop()
-        return None
+        return self._edit(key, QuickList.pop_tail)
+
+    def lmove(self, source, destination, wherefrom="LEFT", whereto="RIGHT"):
+        """Pop from one end of source and push onto one end of destination.
+        Returns the element moved, or None if source is empty."""
+        # Check the destination's type before anything is popped.
+        self.keyspace.lookup_typed(destination, LIST)
+        value = self.lpop(source) if wherefrom == "LEFT" else self.rpop(source)
+        if value is not None:
+            if whereto == "LEFT":
+                self.lpush(destination, value)
+            else:
+                self.rpush(destination, value)
+        return value
 
     def lrange(self, key, start, end):
-        if key not in self.lists:
+        lst = self.keyspace.get(key, LIST)
+        if lst is None:
             return []
-        lst = self.lists[key]
-        return list(lst)[start:end+1]
+        return lst.range(start, end)
 
     def llen(self, key):
-        return len(self.lists.get(key, []))
+        lst = self.keyspace.get(key, LIST)
+        return len(lst) if lst is not None else 0
+
+    def lindex(self, key, index):
+        lst = self.keyspace.get(key, LIST)
+        return lst.index(index) if lst is not None else None
+
+    def lset(self, key, index, value):
+        obj = self.keyspace.lookup_typed(key, LIST)
+        if obj is None:
+            raise ValueError("no such key")
+        if not self._edit(key, QuickList.set, index, value):
+            raise ValueError("index out of range")
+
+    def ltrim(self, key, start, stop):
+        self._edit(key, QuickList.trim, start, stop)
+
+    def linsert(self, key, pivot, value, after=False):
+        """Returns the new length, -1 if pivot wasn't found, 0 if key doesn't exist."""
+        obj = self.keyspace.lookup_typed(key, LIST)
+        if obj is None:
+            return 0
+        if not self._edit(key, QuickList.insert, pivot, value, after):
+            return -1
+        return len(obj.value)
+
+    def lrem(self, key, count, value):
+        removed = self._edit(key, QuickList.remove, value, count)
+        return removed or 0
+
+    def lpos(self, key, value, rank=1, count=1, maxlen=0):
+        lst = self.keyspace.get(key, LIST)
+        if lst is None:
+            return []
+        return lst.positions(value, rank, count, maxlen)
+
+    def _edit(self, key, op, *args):
+        """Apply a QuickList method to the list at key, keeping memory
+        accounting current and deleting the key if the list empties."""
+        obj = self.keyspace.lookup_typed(key, LIST)
+        if obj is None:
+            return None
+        lst = obj.value
+        before, length = lst.memory_usage(), len(lst)
+        result = op(lst, *args)
+        if not lst:
+            self.keyspace.delete(key)
+        elif len(lst) != length or result is True:
+            # Entries came or went, or LSET replaced one.
+            self.keyspace.resize(obj, lst.memory_usage() - before)
+        return result
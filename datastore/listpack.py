@@ -0,0 +1,127 @@
+# datastore/listpack.py
+
+from array import array
+from typing import Iterator
+from datastore.memory import sizeof
+
+
+def encode(value: str) -> bytes:
+    # Values arrive from the parser decoded with surrogateescape, so this
+    # round-trips arbitrary bytes.
+    return value.encode("utf-8", "surrogateescape")
+
+
+def decode(data) -> str:
+    return str(data, "utf-8", "surrogateescape")
+
+
+class Listpack:
+    """A sequence of strings packed into one buffer.
+
+    Entries are stored back to back in a bytearray, with their lengths in
+    an array of 32-bit ints: about 4 bytes of overhead per entry instead
+    of a pointer plus a whole str object. Finding entry i sums the lengths
+    before it (in C), so a listpack is meant to stay small; larger
+    structures are built out of many of them.
+    """
+
+    __slots__ = ("buf", "lens")
+
+    def __init__(self, values=()):
+        self.buf = bytearray()
+        self.lens = array("I")
+        for value in values:
+            self.append(value)
+
+    def __len__(self) -> int:
+        return len(self.lens)
+
+    def __iter__(self) -> Iterator[str]:
+        buf = self.buf
+        start = 0
+        for n in self.lens:
+            yield decode(buf[start:start + n])
+            start += n
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes of payload: the entries plus their length slots."""
+        return len(self.buf) + 4 * len(self.lens)
+
+    def _offset(self, index: int) -> int:
+        return sum(self.lens[:index]) if index else 0
+
+    def get(self, index: int) -> str:
+        start = self._offset(index)
+        return decode(self.buf[start:start + self.lens[index]])
+
+    def range(self, index: int, count: int) -> list[str]:
+        """count entries starting at index."""
+        buf = self.buf
+        start = self._offset(index)
+        result = []
+        for n in self.lens[index:index + count]:
+            result.append(decode(buf[start:start + n]))
+            start += n
+        return result
+
+    def find(self, value: str, start: int = 0) -> int:
+        """Index of the first entry equal to value at or after start, or -1."""
+        target = encode(value)
+        size = len(target)
+        buf = self.buf
+        offset = self._offset(start)
+        lens = self.lens
+        for i in range(start, len(lens)):
+            n = lens[i]
+            if n == size and buf[offset:offset + n] == target:
+                return i
+            offset += n
+        return -1
+
+    def append(self, value: str) -> int:
+        """Add value at the end; returns the growth in nbytes."""
+        data = encode(value)
+        self.buf += data
+        self.lens.append(len(data))
+        return len(data) + 4
+
+    def insert(self, index: int, value: str) -> int:
+        """Insert value before entry index; returns the growth in nbytes."""
+        data = encode(value)
+        start = self._offset(index)
+        self.buf[start:start] = data
+        self.lens.insert(index, len(data))
+        return len(data) + 4
+
+    def replace(self, index: int, value: str) -> int:
+        """Overwrite entry index; returns the change in nbytes."""
+        data = encode(value)
+        start = self._offset(index)
+        old = self.lens[index]
+        self.buf[start:start + old] = data
+        self.lens[index] = len(data)
+        return len(data) - old
+
+    def delete(self, index: int, count: int = 1) -> int:
+        """Remove count entries starting at index; returns the bytes freed."""
+        start = self._offset(index)
+        size = sum(self.lens[index:index + count])
+        del self.buf[start:start + size]
+        removed = len(self.lens[index:index + count])
+        del self.lens[index:index + count]
+        return size + 4 * removed
+
+    def split(self, index: int) -> "Listpack":
+        """Move entries from index on into a new listpack and return it."""
+        start = self._offset(index)
+        tail = Listpack()
+        tail.buf = self.buf[start:]
+        tail.lens = self.lens[index:]
+        del self.buf[start:]
+        del self.lens[index:]
+        return tail
+
+
+# Fixed cost of one listpack: the object and its two (empty) containers.
+LISTPACK_OVERHEAD = sizeof(Listpack()) + sizeof(bytearray()) + sizeof(array("I"))
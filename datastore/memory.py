@@ -0,0 +1,32 @@
+# datastore/memory.py
+
+# Size estimates used for used_memory accounting.
+#
+# Stores adjust the running total with small deltas as they mutate values,
+# using the per-entry costs below. Walking a whole value (value_size() in
+# keyspace.py) only happens when a value is stored wholesale or during the
+# periodic recount. The figures approximate CPython's layout; they are not
+# exact RSS.
+
+import sys
+
+POINTER = 8
+# Average slot cost of a dict entry at typical load factors.
+DICT_ENTRY = 40
+# Hashtable-encoded sets and hashes map each member to its slot in a dense
+# array (two for a hash: fields and values), a pointer per slot.
+SET_ENTRY = DICT_ENTRY + POINTER
+HASH_ENTRY = DICT_ENTRY + 2 * POINTER
+FLOAT = sys.getsizeof(0.0)
+
+EMPTY_DICT = sys.getsizeof({})
+EMPTY_LIST = sys.getsizeof([])
+
+sizeof = sys.getsizeof
+
+
+def format_bytes(n: int) -> str:
+    for unit in ("B", "K", "M", "G"):
+        if abs(n) < 1024 or unit == "G":
+            return f"{n}{unit}" if unit == "B" else f"{n:.2f}{unit}"
+        n /= 1024
@@ -1,44 +1,64 @@
 # datastore/pubsub.py
-import asyncio
 from collections import defaultdict
+from protocol import serializer as s
+
+def _write(writer, payload: bytes):
+    writer.write(payload)
 
 class PubSubManager:
-    def __init__(self):
+    def __init__(self, send=_write):
         # channel -> set of writer objects (asyncio.StreamWriter)
         self.channels = defaultdict(set)
-        self.lock = asyncio.Lock()
+        # send(writer, payload) delivers a message; the command handler
+        # passes one that keeps it behind replies still waiting on the AOF.
+        self.send = send
+
+    # The *_nowait variants are what the command handler uses: subscriber
+    # bookkeeping is a plain dict update on the event loop thread, and
+    # writer.write() only buffers, so nothing here has to suspend.
+    def subscribe_nowait(self, writer, *channel_names):
+        for channel in channel_names:
+            self.channels[channel].add(writer)
+
+    def unsubscribe_nowait(self, writer, *channel_names):
+        for channel in channel_names:
+            subscribers = self.channels.get(channel)
+            if subscribers and writer in subscribers:
+                subscribers.remove(writer)
+                if not subscribers:
+                    del self.channels[channel]
+
+    def publish_nowait(self, channel, message) -> int:
+        subscribers = self.channels.get(channel)
+        if not subscribers:
+            return 0  # No subscribers
+        payload = self.format_pubsub_message(channel, message)
+        send = self.send
+        for writer in list(subscribers):
+            try:
+                send(writer, payload)
+            except Exception:
+                # Optionally handle broken connections
+                pass
+        return len(subscribers)
 
     async def subscribe(self, writer, *channel_names):
-        async with self.lock:
-            for channel in channel_names:
-                self.channels[channel].add(writer)
+        self.subscribe_nowait(writer, *channel_names)
         return f"Subscribed to: {', '.join(channel_names)}"
 
     async def unsubscribe(self, writer, *channel_names):
-        async with self.lock:
-            for channel in channel_names:
-                if writer in self.channels[channel]:
-                    self.channels[channel].remove(writer)
-                    if not self.channels[channel]:
-                        del self.channels[channel]
+        self.unsubscribe_nowait(writer, *channel_names)
         return f"Unsubscribed from: {', '.join(channel_names)}"
 
     async def publish(self, channel, message):
-        async with self.lock:
-            if channel not in self.channels:
-                return 0  # No subscribers
-            subscribers = list(self.channels[channel])
-        
-        # Send messages outside the lock to avoid blocking
+        subscribers = list(self.channels.get(channel, ()))
+        count = self.publish_nowait(channel, message)
         for writer in subscribers:
             try:
-                writer.write(self.format_pubsub_message(channel, message).encode())
                 await writer.drain()
-            except Exception as e:
-                # Optionally handle broken connections
+            except Exception:
                 pass
+        return count
 
-        return len(subscribers)
-
-    def format_pubsub_message(self, channel, message):
-        return f"*3\r\n$7\r\nmessage\r\n${len(channel)}\r\n{channel}\r\n${len(message)}\r\n{message}\r\n"
+    def format_pubsub_message(self, channel, message) -> bytes:
+        return s.array(["message", channel, message])
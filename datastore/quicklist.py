@@ -0,0 +1,251 @@
+# datastore/quicklist.py
+
+from typing import Iterator, Optional
+import config
+from datastore.listpack import Listpack, LISTPACK_OVERHEAD
+from datastore.memory import sizeof, POINTER
+
+
+class QuickList:
+    """A list stored as a sequence of listpack chunks, like Redis's quicklist.
+
+    Pushes and pops touch only the end chunk. A chunk is closed once it
+    reaches config.LIST_MAX_LISTPACK_SIZE bytes, and a chunk that grows
+    past that in the middle of the list is split in two. Reaching index i
+    skips whole chunks by their length, so a range read costs
+    O(i / chunk size + count).
+    """
+
+    __slots__ = ("chunks", "count", "nbytes")
+    encoding = "quicklist"
+
+    def __init__(self, values=()):
+        self.chunks: list[Listpack] = []
+        self.count = 0
+        self.nbytes = 0  # payload bytes across all chunks
+        self.push_tail(*values)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[str]:
+        for chunk in self.chunks:
+            yield from chunk
+
+    def memory_usage(self) -> int:
+        return EMPTY_QUICKLIST + self.nbytes + len(self.chunks) * (LISTPACK_OVERHEAD + POINTER)
+
+    def free_effort(self) -> int:
+        return len(self.chunks)
+
+    def dismantle(self):
+        """Drop the chunks one at a time (for lazy free)."""
+        chunks = self.chunks
+        while chunks:
+            chunks.pop()
+            yield
+        self.count = self.nbytes = 0
+
+    # --- Ends ---
+
+    def push_head(self, *values: str):
+        limit = config.LIST_MAX_LISTPACK_SIZE
+        chunks = self.chunks
+        for value in values:
+            if not chunks or chunks[0].nbytes >= limit:
+                chunks.insert(0, Listpack())
+            self.nbytes += chunks[0].insert(0, value)
+        self.count += len(values)
+
+    def push_tail(self, *values: str):
+        limit = config.LIST_MAX_LISTPACK_SIZE
+        chunks = self.chunks
+        for value in values:
+            if not chunks or chunks[-1].nbytes >= limit:
+                chunks.append(Listpack())
+            self.nbytes += chunks[-1].append(value)
+        self.count += len(values)
+
+    def pop_head(self) -> Optional[str]:
+        if not self.count:
+            return None
+        return self._pop(0, 0)
+
+    def pop_tail(self) -> Optional[str]:
+        if not self.count:
+            return None
+        return self._pop(len(self.chunks) - 1, len(self.chunks[-1]) - 1)
+
+    def _pop(self, ci: int, offset: int) -> str:
+        chunk = self.chunks[ci]
+        value = chunk.get(offset)
+        self.nbytes -= chunk.delete(offset)
+        self.count -= 1
+        if not chunk:
+            del self.chunks[ci]
+        return value
+
+    # --- Indexed access ---
+
+    def _locate(self, index: int) -> tuple[int, int]:
+        """(chunk index, offset in chunk) of a non-negative, in-range index."""
+        chunks = self.chunks
+        if index < self.count // 2:
+            for ci, chunk in enumerate(chunks):
+                n = len(chunk)
+                if index < n:
+                    return ci, index
+                index -= n
+        else:
+            index = self.count - 1 - index
+            for ci in range(len(chunks) - 1, -1, -1):
+                n = len(chunks[ci])
+                if index < n:
+                    return ci, n - 1 - index
+                index -= n
+        raise IndexError("index out of range")
+
+    def normalize(self, index: int) -> int:
+        """Resolve a negative index; returns -1 if out of range."""
+        if index < 0:
+            index += self.count
+        return index if 0 <= index < self.count else -1
+
+    def index(self, index: int) -> Optional[str]:
+        index = self.normalize(index)
+        if index < 0:
+            return None
+        ci, offset = self._locate(index)
+        return self.chunks[ci].get(offset)
+
+    def set(self, index: int, value: str) -> bool:
+        index = self.normalize(index)
+        if index < 0:
+            return False
+        ci, offset = self._locate(index)
+        self.nbytes += self.chunks[ci].replace(offset, value)
+        self._split_if_full(ci)
+        return True
+
+    def range(self, start: int, stop: int) -> list[str]:
+        """Entries start..stop inclusive; both may be negative, as in LRANGE."""
+        start, stop = self._clamp(start, stop)
+        if start > stop:
+            return []
+        ci, offset = self._locate(start)
+        remaining = stop - start + 1
+        result = []
+        chunks = self.chunks
+        while remaining:
+            chunk = chunks[ci]
+            part = chunk.range(offset, remaining)
+            result.extend(part)
+            remaining -= len(part)
+            ci += 1
+            offset = 0
+        return result
+
+    def _clamp(self, start: int, stop: int) -> tuple[int, int]:
+        count = self.count
+        if start < 0:
+            start = max(start + count, 0)
+        if stop < 0:
+            stop += count
+        return start, min(stop, count - 1)
+
+    # --- Edits ---
+
+    def delete_range(self, start: int, count: int):
+        """Remove count entries starting at a non-negative index."""
+        if count <= 0 or start >= self.count:
+            return
+        ci, offset = self._locate(start)
+        chunks = self.chunks
+        while count and ci < len(chunks):
+            chunk = chunks[ci]
+            n = min(count, len(chunk) - offset)
+            self.nbytes -= chunk.delete(offset, n)
+            self.count -= n
+            count -= n
+            if not chunk:
+                del chunks[ci]
+            else:
+                ci += 1
+            offset = 0
+
+    def trim(self, start: int, stop: int):
+        """Keep only entries start..stop inclusive, as in LTRIM."""
+        start, stop = self._clamp(start, stop)
+        if start > stop:
+            self.delete_range(0, self.count)
+            return
+        self.delete_range(stop + 1, self.count - stop - 1)
+        self.delete_range(0, start)
+
+    def insert(self, pivot: str, value: str, after: bool) -> bool:
+        """Insert value next to the first occurrence of pivot."""
+        for ci, chunk in enumerate(self.chunks):
+            offset = chunk.find(pivot)
+            if offset >= 0:
+                self.nbytes += chunk.insert(offset + 1 if after else offset, value)
+                self.count += 1
+                self._split_if_full(ci)
+                return True
+        return False
+
+    def remove(self, value: str, count: int = 0) -> int:
+        """Remove occurrences of value: the first count from the head if
+        count > 0, from the tail if count < 0, all of them if 0."""
+        limit = abs(count) or self.count
+        chunks = self.chunks
+        order = range(len(chunks) - 1, -1, -1) if count < 0 else range(len(chunks))
+        removed = 0
+        for ci in order:
+            chunk = chunks[ci]
+            matches = []
+            offset = chunk.find(value)
+            while offset >= 0:
+                matches.append(offset)
+                offset = chunk.find(value, offset + 1)
+            if count < 0:
+                matches.reverse()
+            for offset in sorted(matches[:limit - removed], reverse=True):
+                self.nbytes -= chunk.delete(offset)
+                removed += 1
+            if removed == limit:
+                break
+        self.count -= removed
+        self.chunks = [chunk for chunk in chunks if chunk]
+        return removed
+
+    def positions(self, value: str, rank: int = 1, count: int = 1, maxlen: int = 0) -> list[int]:
+        """Indexes of value, as LPOS: skip rank - 1 matches (counting from the
+        tail if rank < 0), return up to count of them (0 = all), and compare
+        at most maxlen entries (0 = no limit)."""
+        result = []
+        skip = abs(rank) - 1
+        if rank > 0:
+            indexes = range(self.count)
+            entries = iter(self)
+        else:
+            indexes = range(self.count - 1, -1, -1)
+            entries = (entry for chunk in reversed(self.chunks) for entry in reversed(list(chunk)))
+        for scanned, (index, entry) in enumerate(zip(indexes, entries)):
+            if maxlen and scanned >= maxlen:
+                break
+            if entry == value:
+                if skip:
+                    skip -= 1
+                    continue
+                result.append(index)
+                if len(result) == count:
+                    break
+        return result
+
+    def _split_if_full(self, ci: int):
+        chunk = self.chunks[ci]
+        if chunk.nbytes > 2 * config.LIST_MAX_LISTPACK_SIZE and len(chunk) > 1:
+            self.chunks.insert(ci + 1, chunk.split(len(chunk) // 2))
+
+
+EMPTY_QUICKLIST = sizeof(QuickList()) + sizeof([])
@@ -0,0 +1,87 @@
+# datastore/scan.py
+
+import re
+from functools import lru_cache
+from typing import Callable
+
+
+@lru_cache(maxsize=256)
+def compile_glob(pattern: str) -> Callable[[str], bool]:
+    """Compile a Redis glob (*, ?, [abc], [^a], [a-z], \\x) into a match function."""
+    if pattern == "*":
+        return lambda _: True
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        i += 1
+        if c == "*":
+            out.append(".*")
+        elif c == "?":
+            out.append(".")
+        elif c == "\\" and i < n:
+            out.append(re.escape(pattern[i]))
+            i += 1
+        elif c == "[":
+            end = _class_end(pattern, i)
+            if end < 0:
+                out.append(re.escape(c))
+                continue
+            out.append(_char_class(pattern[i:end]))
+            i = end + 1
+        else:
+            out.append(re.escape(c))
+    matcher = re.compile("".join(out), re.DOTALL).fullmatch
+    return lambda text: matcher(text) is not None
+
+
+def _class_end(pattern: str, start: int) -> int:
+    """Index of the ] closing a class whose body starts at start, or -1."""
+    i = start
+    while i < len(pattern):
+        if pattern[i] == "\\":
+            i += 2
+            continue
+        if pattern[i] == "]":
+            return i
+        i += 1
+    return -1
+
+
+def _char_class(body: str) -> str:
+    negate = body.startswith("^")
+    if negate:
+        body = body[1:]
+    parts = []
+    i = 0
+    while i < len(body):
+        c = body[i]
+        if c == "\\" and i + 1 < len(body):
+            c = body[i + 1]
+            i += 1
+        if i + 2 < len(body) and body[i + 1] == "-":
+            low, high = sorted((c, body[i + 2]))
+            parts.append(f"{re.escape(low)}-{re.escape(high)}")
+            i += 3
+            continue
+        parts.append(re.escape(c))
+        i += 1
+    if not parts:
+        return "[^\\s\\S]" if not negate else "[\\s\\S]"
+    return ("[^" if negate else "[") + "".join(parts) + "]"
+
+
+def scan_slots(slots: list, cursor: int, count: int) -> tuple[int, list]:
+    """Return (next cursor, entries) for the next count slots of a dense
+    array; cursor 0 starts a scan and a returned 0 ends it.
+
+    This is Keyspace.scan's cursor, for the arrays behind hashtable sets,
+    hashes and sorted sets: slots are walked from the end down and the
+    cursor is the number of slots left. Adds append and deletes move the
+    last entry into the freed slot, so every entry present for the whole
+    scan is returned (some that move may be returned twice). Each call
+    touches only count slots and nothing is kept between calls.
+    """
+    start = len(slots) if cursor == 0 else min(cursor, len(slots))
+    stop = max(start - count, 0)
+    return stop, slots[start - 1:stop - 1 if stop else None:-1]
@@ -1,31 +1,295 @@
 # datastore/set_store.py
 
+import random
+import config
+from datastore.keyspace import Keyspace, SET, string_to_int, value_size
+from datastore.intset import IntSet
+from datastore.listpack import Listpack, LISTPACK_OVERHEAD
+from datastore.memory import sizeof, SET_ENTRY, EMPTY_DICT, EMPTY_LIST
+from datastore.scan import scan_slots
+
+class PackedSet:
+    """A small set of strings stored as a listpack; membership is a linear scan."""
+
+    __slots__ = ("lp",)
+    encoding = "listpack"
+
+    def __init__(self, members=()):
+        self.lp = Listpack(members)
+
+    def __len__(self) -> int:
+        return len(self.lp)
+
+    def __iter__(self):
+        return iter(self.lp)
+
+    def __contains__(self, member: str) -> bool:
+        return self.lp.find(member) >= 0
+
+    def get(self, index: int) -> str:
+        return self.lp.get(index)
+
+    def accepts(self, member: str, max_entries: int) -> bool:
+        return len(self.lp) < max_entries and len(member) <= config.SET_MAX_LISTPACK_VALUE
+
+    def add(self, member: str) -> bool:
+        if member in self:
+            return False
+        self.lp.append(member)
+        return True
+
+    def remove(self, member: str) -> bool:
+        i = self.lp.find(member)
+        if i < 0:
+            return False
+        self.lp.delete(i)
+        return True
+
+    def memory_usage(self) -> int:
+        return _PACKED_SET_OBJECT + LISTPACK_OVERHEAD + self.lp.nbytes
+
+_PACKED_SET_OBJECT = sizeof(PackedSet())
+
+class HashSet:
+    """A set past the compact encodings' limits: a dict from each member
+    to its slot in a dense members array. Removing a member moves the
+    last one into its slot, so SSCAN can walk the array by position (see
+    scan_slots) and random picks are a single index."""
+
+    __slots__ = ("index", "members")
+    encoding = "hashtable"
+
+    def __init__(self, members=()):
+        self.index: dict[str, int] = {}
+        self.members: list[str] = []
+        for member in members:
+            self.add(member)
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __contains__(self, member: str) -> bool:
+        return member in self.index
+
+    def get(self, index: int) -> str:
+        return self.members[index]
+
+    def add(self, member: str) -> bool:
+        if member in self.index:
+            return False
+        self.index[member] = len(self.members)
+        self.members.append(member)
+        return True
+
+    def remove(self, member: str) -> bool:
+        i = self.index.pop(member, None)
+        if i is None:
+            return False
+        last = self.members.pop()
+        if i < len(self.members):
+            self.members[i] = last
+            self.index[last] = i
+        return True
+
+    def scan(self, cursor: int, count: int) -> tuple[int, list[str]]:
+        return scan_slots(self.members, cursor, count)
+
+    def memory_usage(self) -> int:
+        return _HASH_SET_OBJECT + sum(sizeof(m) for m in self.members) + SET_ENTRY * len(self.members)
+
+    def free_effort(self) -> int:
+        return len(self.members)
+
+    def dismantle(self):
+        index, members = self.index, self.members
+        while members:
+            del index[members.pop()]
+            yield
+
+_HASH_SET_OBJECT = sizeof(HashSet()) + EMPTY_DICT + EMPTY_LIST
+
+def _new_set(first_member: str):
+    """Pick the most compact encoding that can hold the first member."""
+    if string_to_int(first_member) is not None and config.SET_MAX_INTSET_ENTRIES > 0:
+        return IntSet()
+    if len(first_member) <= config.SET_MAX_LISTPACK_VALUE and config.SET_MAX_LISTPACK_ENTRIES > 0:
+        return PackedSet()
+    return HashSet()
+
 class SetStore:
-    def __init__(self):
-        self.sets = {}  # key: set
+    def __init__(self, keyspace: Keyspace | None = None):
+        self.keyspace = keyspace if keyspace is not None else Keyspace()
 
     def sadd(self, key, *values):
-        if key not in self.sets:
-            self.sets[key] = set()
+        obj = self.keyspace.get_or_create(key, SET, lambda: _new_set(values[0]))
+        s = obj.value
         added = 0
-        for val in values:
-            if val not in self.sets[key]:
-                self.sets[key].add(val)
-                added += 1
+        if type(s) is HashSet:
+            delta = 0
+            for val in values:
+                if s.add(val):
+                    added += 1
+                    delta += sizeof(val) + SET_ENTRY
+            if added:
+                self.keyspace.resize(obj, delta)
+            return added
+
+        before = s.memory_usage()
+        max_entries = config.SET_MAX_INTSET_ENTRIES if type(s) is IntSet else config.SET_MAX_LISTPACK_ENTRIES
+        for i, val in enumerate(values):
+            if val in s:
+                continue
+            if not s.accepts(val, max_entries):
+                # Too big or wrong kind for this encoding: convert, then
+                # add the rest to the new one.
+                self.keyspace.resize(obj, s.memory_usage() - before)
+                self._convert(obj, val)
+                return added + self.sadd(key, *values[i:])
+            s.add(val)
+            added += 1
+        if added:
+            self.keyspace.resize(obj, s.memory_usage() - before)
         return added
 
+    def _convert(self, obj, incoming: str):
+        """Move a compact set to the next encoding able to take incoming."""
+        s = obj.value
+        if (type(s) is IntSet and len(s) < config.SET_MAX_LISTPACK_ENTRIES
+                and len(incoming) <= config.SET_MAX_LISTPACK_VALUE):
+            converted = PackedSet(s)
+        else:
+            converted = HashSet(s)
+        obj.value = converted
+        self.keyspace.resize(obj, value_size(SET, converted) - s.memory_usage())
+
     def srem(self, key, *values):
-        if key not in self.sets:
+        obj = self.keyspace.lookup_typed(key, SET)
+        if obj is None:
             return 0
+        s = obj.value
         removed = 0
-        for val in values:
-            if val in self.sets[key]:
-                self.sets[key].remove(val)
-                removed += 1
+        if type(s) is HashSet:
+            delta = 0
+            for val in values:
+                if s.remove(val):
+                    removed += 1
+                    delta -= sizeof(val) + SET_ENTRY
+        else:
+            before = s.memory_usage()
+            for val in values:
+                removed += s.remove(val)
+            delta = s.memory_usage() - before
+        if not s:
+            self.keyspace.delete(key)
+        elif removed:
+            self.keyspace.resize(obj, delta)
         return removed
 
     def sismember(self, key, value):
-        return value in self.sets.get(key, set())
+        s = self.keyspace.get(key, SET)
+        return s is not None and value in s
 
     def smembers(self, key):
-        return list(self.sets.get(key, []))
+        s = self.keyspace.get(key, SET)
+        return list(s) if s is not None else []
+
+    def smismember(self, key, *values):
+        s = self.keyspace.get(key, SET)
+        return [int(s is not None and value in s) for value in values]
+
+    def scard(self, key):
+        s = self.keyspace.get(key, SET)
+        return len(s) if s is not None else 0
+
+    def srandmember(self, key, count=None):
+        """One random member (or None), or a list of count members: distinct
+        if count is positive, possibly repeated if it is negative. Every
+        encoding is indexed by position, so this is O(count)."""
+        s = self.keyspace.get(key, SET)
+        if count is None:
+            return s.get(random.randrange(len(s))) if s else None
+        if s is None or count == 0:
+            return []
+        size = len(s)
+        if count >= size:
+            return list(s)
+        if count < 0:
+            positions = random.choices(range(size), k=-count)
+        else:
+            positions = random.sample(range(size), count)
+        return [s.get(i) for i in positions]
+
+    def spop(self, key, count=None):
+        """Remove and return random members, as srandmember() with count >= 0."""
+        obj = self.keyspace.lookup_typed(key, SET)
+        if obj is None or count == 0:
+            return None if count is None else []
+        s = obj.value
+        wanted = 1 if count is None else count
+        if wanted >= len(s):
+            chosen = list(s)
+            self.keyspace.delete(key)
+        else:
+            chosen = [s.get(i) for i in random.sample(range(len(s)), wanted)]
+            self.srem(key, *chosen)
+        return chosen[0] if count is None else chosen
+
+    # --- Set algebra ---
+
+    def _sets(self, keys):
+        get = self.keyspace.get
+        return [get(key, SET) for key in keys]
+
+    def _intersect(self, keys, limit=0):
+        """Yield members of every set at keys, up to limit (0 = all).
+
+        Walks the smallest set and probes the others, smallest first, so
+        a member that is missing from some set is rejected as early as
+        possible.
+        """
+        sets = self._sets(keys)
+        if any(s is None for s in sets):
+            return
+        sets.sort(key=len)
+        first, rest = sets[0], sets[1:]
+        found = 0
+        for member in first:
+            if all(member in other for other in rest):
+                yield member
+                found += 1
+                if found == limit:
+                    return
+
+    def sinter(self, *keys):
+        return list(self._intersect(keys))
+
+    def sintercard(self, *keys, limit=0):
+        return sum(1 for _ in self._intersect(keys, limit))
+
+    def sunion(self, *keys):
+        result = set()
+        for s in self._sets(keys):
+            if s is not None:
+                result.update(s)
+        return list(result)
+
+    def sdiff(self, *keys):
+        sets = self._sets(keys)
+        first = sets[0]
+        if first is None:
+            return []
+        # Probe the largest sets first: they are the likeliest to contain
+        # a member and end the check.
+        others = sorted((s for s in sets[1:] if s), key=len, reverse=True)
+        return [member for member in first if not any(member in other for other in others)]
+
+    def store(self, destination, members) -> int:
+        """Replace whatever is at destination with a set of members; an empty
+        result just deletes it. Returns the size of the new set."""
+        self.keyspace.delete(destination)
+        if not members:
+            return 0
+        return self.sadd(destination, *members)
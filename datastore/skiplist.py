@@ -0,0 +1,200 @@
+# datastore/skiplist.py
+
+import random
+from typing import Iterator, NamedTuple, Optional
+from datastore.memory import sizeof, POINTER
+
+# Same shape as Redis's zskiplist: up to 32 levels, each node promoted to
+# the next level with probability 1/4.
+MAX_LEVEL = 32
+P = 0.25
+
+
+class ScoreRange(NamedTuple):
+    """A score interval as given to ZRANGEBYSCORE/ZCOUNT; either end may be exclusive."""
+    min: float
+    max: float
+    minex: bool = False
+    maxex: bool = False
+
+    def gte_min(self, score: float) -> bool:
+        return score > self.min if self.minex else score >= self.min
+
+    def lte_max(self, score: float) -> bool:
+        return score < self.max if self.maxex else score <= self.max
+
+    def is_empty(self) -> bool:
+        return self.min > self.max or (self.min == self.max and (self.minex or self.maxex))
+
+
+class Node:
+    __slots__ = ("member", "score", "backward", "forward", "span")
+
+    def __init__(self, level: int, score: float, member):
+        self.member = member
+        self.score = score
+        self.backward: Optional[Node] = None
+        # Per level: next node, and how many level-0 steps that link skips.
+        self.forward: list[Optional[Node]] = [None] * level
+        self.span = [0] * level
+
+
+# Average cost of one node (a level is 1 + 1/3 links on average).
+NODE_SIZE = sizeof(Node(1, 0.0, None)) + 2 * (sizeof([None]) + POINTER // 3)
+
+
+def _random_level() -> int:
+    level = 1
+    rand = random.random
+    while rand() < P and level < MAX_LEVEL:
+        level += 1
+    return level
+
+
+class SkipList:
+    """Nodes ordered by (score, member), with spans so rank lookups are O(log n).
+
+    A port of Redis's zskiplist. Ranks are 1-based here, as in Redis; the
+    store converts to the 0-based ranks the commands use.
+    """
+
+    def __init__(self):
+        self.header = Node(MAX_LEVEL, 0.0, None)
+        self.tail: Optional[Node] = None
+        self.length = 0
+        self.level = 1
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Node]:
+        x = self.header.forward[0]
+        while x is not None:
+            yield x
+            x = x.forward[0]
+
+    def _find_update(self, score: float, member):
+        """Return, per level, the last node before (score, member) and its rank."""
+        update = [self.header] * MAX_LEVEL
+        rank = [0] * MAX_LEVEL
+        x = self.header
+        traversed = 0
+        for i in range(self.level - 1, -1, -1):
+            while True:
+                nxt = x.forward[i]
+                if nxt is None or nxt.score > score or (nxt.score == score and nxt.member >= member):
+                    break
+                traversed += x.span[i]
+                x = nxt
+            update[i] = x
+            rank[i] = traversed
+        return update, rank
+
+    def insert(self, score: float, member) -> Node:
+        """Insert a member that is not already in the list."""
+        update, rank = self._find_update(score, member)
+        level = _random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                rank[i] = 0
+                update[i] = self.header
+                self.header.span[i] = self.length
+            self.level = level
+
+        x = Node(level, score, member)
+        for i in range(level):
+            prev = update[i]
+            x.forward[i] = prev.forward[i]
+            prev.forward[i] = x
+            x.span[i] = prev.span[i] - (rank[0] - rank[i])
+            prev.span[i] = rank[0] - rank[i] + 1
+        for i in range(level, self.level):
+            update[i].span[i] += 1
+
+        x.backward = None if update[0] is self.header else update[0]
+        if x.forward[0] is not None:
+            x.forward[0].backward = x
+        else:
+            self.tail = x
+        self.length += 1
+        return x
+
+    def _unlink(self, x: Node, update):
+        for i in range(self.level):
+            if update[i].forward[i] is x:
+                update[i].span[i] += x.span[i] - 1
+                update[i].forward[i] = x.forward[i]
+            else:
+                update[i].span[i] -= 1
+        if x.forward[0] is not None:
+            x.forward[0].backward = x.backward
+        else:
+            self.tail = x.backward
+        while self.level > 1 and self.header.forward[self.level - 1] is None:
+            self.level -= 1
+        self.length -= 1
+
+    def delete(self, score: float, member) -> bool:
+        update, _ = self._find_update(score, member)
+        x = update[0].forward[0]
+        if x is None or x.score != score or x.member != member:
+            return False
+        self._unlink(x, update)
+        return True
+
+    def update_score(self, score: float, member, new_score: float) -> Node:
+        """Move an existing member to new_score, in place when its position doesn't change."""
+        update, _ = self._find_update(score, member)
+        x = update[0].forward[0]
+        prev, nxt = x.backward, x.forward[0]
+        if ((prev is None or (prev.score, prev.member) < (new_score, member)) and
+                (nxt is None or (nxt.score, nxt.member) > (new_score, member))):
+            x.score = new_score
+            return x
+        self._unlink(x, update)
+        return self.insert(new_score, member)
+
+    def rank(self, score: float, member) -> int:
+        """1-based rank of (score, member), or 0 if it isn't in the list."""
+        update, rank = self._find_update(score, member)
+        x = update[0].forward[0]
+        if x is None or x.score != score or x.member != member:
+            return 0
+        return rank[0] + 1
+
+    def by_rank(self, rank: int) -> Optional[Node]:
+        """The node at a 1-based rank."""
+        x = self.header
+        traversed = 0
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and traversed + x.span[i] <= rank:
+                traversed += x.span[i]
+                x = x.forward[i]
+            if traversed == rank:
+                return x
+        return None
+
+    def first_in_range(self, spec: ScoreRange) -> Optional[Node]:
+        """The lowest node whose score is in spec."""
+        if spec.is_empty():
+            return None
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and not spec.gte_min(x.forward[i].score):
+                x = x.forward[i]
+        x = x.forward[0]
+        if x is None or not spec.lte_max(x.score):
+            return None
+        return x
+
+    def last_in_range(self, spec: ScoreRange) -> Optional[Node]:
+        """The highest node whose score is in spec."""
+        if spec.is_empty():
+            return None
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and spec.lte_max(x.forward[i].score):
+                x = x.forward[i]
+        if x is self.header or not spec.gte_min(x.score):
+            return None
+        return x
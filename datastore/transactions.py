@@ -0,0 +1,93 @@
+# datastore/transactions.py
+
+from typing import Any
+from datastore.keyspace import Keyspace, mstime
+
+
+class Transaction:
+    """One client's MULTI/WATCH state."""
+
+    __slots__ = ("queue", "dirty", "watched")
+
+    def __init__(self):
+        # Commands queued since MULTI; None when not inside MULTI.
+        self.queue: list[list[str]] | None = None
+        # Set when a command failed to queue; EXEC then refuses to run.
+        self.dirty = False
+        # key -> its version when WATCHed.
+        self.watched: dict[str, int] = {}
+
+
+class Transactions:
+    """MULTI/EXEC queues and WATCHed keys, per client connection.
+
+    Optimistic locking uses the keyspace's version counters. Only watched
+    keys have one: WATCH registers the key (counting its watchers) and a
+    write to a watched key bumps it. EXEC runs only if every key the
+    client watched still has the version it had when watched and hasn't
+    expired since. The counter
+    is dropped once the last watcher lets go, so unwatched writes cost a
+    single emptiness check.
+    """
+
+    def __init__(self, keyspace: Keyspace):
+        self.keyspace = keyspace
+        # Connection (writer) -> its state, for clients in MULTI or WATCHing.
+        self.clients: dict[Any, Transaction] = {}
+        # key -> number of clients watching it.
+        self.watchers: dict[str, int] = {}
+
+    def get(self, client) -> Transaction | None:
+        return self.clients.get(client)
+
+    def multi(self, client):
+        tx = self.clients.get(client)
+        if tx is None:
+            tx = self.clients[client] = Transaction()
+        if tx.queue is not None:
+            raise ValueError("MULTI calls can not be nested")
+        tx.queue = []
+
+    def watch(self, client, keys):
+        tx = self.clients.get(client)
+        if tx is None:
+            tx = self.clients[client] = Transaction()
+        keyspace = self.keyspace
+        versions = keyspace.versions
+        for key in keys:
+            if key in tx.watched:
+                continue
+            # Drop a key that has already expired, so changed() only sees
+            # deadlines that pass after the WATCH.
+            keyspace.lookup(key, touch=False)
+            tx.watched[key] = versions.setdefault(key, 0)
+            self.watchers[key] = self.watchers.get(key, 0) + 1
+
+    def changed(self, tx: Transaction) -> bool:
+        """Whether any key tx watches has been written, or has expired,
+        since it was watched. A key can expire without anything touching
+        it, so its deadline is checked too."""
+        versions = self.keyspace.versions
+        data = self.keyspace.data
+        now = mstime()
+        for key, version in tx.watched.items():
+            if versions[key] != version:
+                return True
+            obj = data.get(key)
+            if obj is not None and obj.expire_at is not None and obj.expire_at <= now:
+                return True
+        return False
+
+    def reset(self, client):
+        """Forget client's queue and watched keys (EXEC, DISCARD, UNWATCH, disconnect)."""
+        tx = self.clients.pop(client, None)
+        if tx is None:
+            return
+        versions = self.keyspace.versions
+        for key in tx.watched:
+            left = self.watchers[key] - 1
+            if left:
+                self.watchers[key] = left
+            else:
+                del self.watchers[key]
+                del versions[key]
@@ -1,29 +1,252 @@
-import bisect
+import math
+from datastore.keyspace import Keyspace, ZSET
+from datastore.memory import sizeof, DICT_ENTRY, POINTER, FLOAT, EMPTY_DICT, EMPTY_LIST
+from datastore.scan import scan_slots
+from datastore.skiplist import SkipList, ScoreRange, NODE_SIZE
+
+# A member costs its string, a dict slot and score, a skip list node, and
+# a dict slot and pointer for its place in the members array.
+_MEMBER_OVERHEAD = 2 * DICT_ENTRY + FLOAT + NODE_SIZE + POINTER
+_EMPTY_ZSET = 2 * EMPTY_DICT + EMPTY_LIST
+
+class ZSet:
+    __slots__ = ("scores", "zsl", "index", "members")
+    encoding = "skiplist"
 
-class ZSetStore:
     def __init__(self):
-        # key -> dict[member -> score]
+        # member -> score
         self.scores = {}
-        # key -> sorted list of (score, member)
-        self.sorted = {}
+        # members ordered by (score, member)
+        self.zsl = SkipList()
+        # Every member in a dense array, and member -> its slot there.
+        # Deletes move the last member into the freed slot, so ZSCAN can
+        # walk the array by position (see scan_slots).
+        self.index: dict[str, int] = {}
+        self.members: list[str] = []
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+    def __iter__(self):
+        return iter(self.scores)
+
+    def __contains__(self, member: str) -> bool:
+        return member in self.scores
+
+    def insert(self, member: str, score: float):
+        """Add a member that isn't in the set yet."""
+        self.scores[member] = score
+        self.zsl.insert(score, member)
+        self.index[member] = len(self.members)
+        self.members.append(member)
+
+    def remove(self, member: str) -> float | None:
+        """Delete member; returns its score, or None if it wasn't there."""
+        score = self.scores.pop(member, None)
+        if score is None:
+            return None
+        self.zsl.delete(score, member)
+        i = self.index.pop(member)
+        last = self.members.pop()
+        if i < len(self.members):
+            self.members[i] = last
+            self.index[last] = i
+        return score
+
+    def scan(self, cursor: int, count: int) -> tuple[int, list[str]]:
+        return scan_slots(self.members, cursor, count)
+
+    def memory_usage(self) -> int:
+        return _EMPTY_ZSET + sum(sizeof(m) + _MEMBER_OVERHEAD for m in self.scores)
+
+    def free_effort(self) -> int:
+        return len(self.scores)
 
-    def zadd(self, key: str, score: float, member: str) -> int:
-        if key not in self.scores:
-            self.scores[key] = {}
-            self.sorted[key] = []
+    def dismantle(self):
+        """Free the members a node at a time (for lazy free)."""
+        scores, index, members = self.scores, self.index, self.members
+        while members:
+            member = members.pop()
+            del scores[member], index[member]
+            yield
+        zsl = self.zsl
+        node = zsl.header.forward[0]
+        zsl.header.forward = [None] * len(zsl.header.forward)
+        zsl.tail = None
+        zsl.length = 0
+        # Cut each node's links as we pass it, so it is freed on its own
+        # rather than as part of one long chain.
+        while node is not None:
+            nxt = node.forward[0]
+            node.forward = None
+            if nxt is not None:
+                nxt.backward = None
+            node = nxt
+            yield
 
-        is_new = member not in self.scores[key]
-        if not is_new:
-            old_score = self.scores[key][member]
-            self.sorted[key].remove((old_score, member))
+def format_score(score: float) -> str:
+    return str(score)
 
-        self.scores[key][member] = score
-        bisect.insort(self.sorted[key], (score, member))
-        return int(is_new)
+def _normalize_range(start: int, stop: int, length: int):
+    """Clamp Redis-style inclusive indexes (negative counts from the end)."""
+    if start < 0:
+        start = max(length + start, 0)
+    if stop < 0:
+        stop += length
+    if stop >= length:
+        stop = length - 1
+    return start, stop
+
+class ZSetStore:
+    def __init__(self, keyspace: Keyspace | None = None):
+        self.keyspace = keyspace if keyspace is not None else Keyspace()
+
+    def zadd(self, key: str, *score_members, nx=False, xx=False, gt=False, lt=False, ch=False) -> int:
+        """Add or update (score, member) pairs, given flattened.
+
+        Returns the number of members added, or added + updated with ch.
+        """
+        if xx:
+            obj = self.keyspace.lookup_typed(key, ZSET)
+            if obj is None:
+                return 0
+        else:
+            obj = self.keyspace.get_or_create(key, ZSET, ZSet)
+        zset = obj.value
+        added = updated = 0
+        delta = 0
+        for i in range(0, len(score_members), 2):
+            score, member = score_members[i], score_members[i + 1]
+            current = zset.scores.get(member)
+            if current is None:
+                if xx:
+                    continue
+                zset.insert(member, score)
+                delta += sizeof(member) + _MEMBER_OVERHEAD
+                added += 1
+            elif not nx and current != score:
+                if (gt and score <= current) or (lt and score >= current):
+                    continue
+                zset.zsl.update_score(current, member, score)
+                zset.scores[member] = score
+                updated += 1
+        if added or updated:
+            self.keyspace.resize(obj, delta)
+        if not zset.scores:
+            self.keyspace.delete(key)
+        return added + updated if ch else added
+
+    def zincrby(self, key: str, increment: float, member: str,
+                nx=False, xx=False, gt=False, lt=False) -> float | None:
+        """Add increment to member's score (creating it at 0). Returns the
+        new score, or None if a flag stopped the update."""
+        obj = self.keyspace.lookup_typed(key, ZSET)
+        current = obj.value.scores.get(member) if obj is not None else None
+        if (current is None and xx) or (current is not None and nx):
+            return None
+        score = (current or 0.0) + increment
+        if math.isnan(score):
+            raise ValueError("resulting score is not a number (NaN)")
+        if current is not None and ((gt and score <= current) or (lt and score >= current)):
+            return None
+        self.zadd(key, score, member)
+        return score
+
+    def zrem(self, key: str, *members: str) -> int:
+        obj = self.keyspace.lookup_typed(key, ZSET)
+        if obj is None:
+            return 0
+        zset = obj.value
+        removed = 0
+        delta = 0
+        for member in members:
+            if zset.remove(member) is not None:
+                delta -= sizeof(member) + _MEMBER_OVERHEAD
+                removed += 1
+        if not zset.scores:
+            self.keyspace.delete(key)
+        elif removed:
+            self.keyspace.resize(obj, delta)
+        return removed
 
     def zscore(self, key: str, member: str) -> str | None:
-        return str(self.scores.get(key, {}).get(member))
+        zset = self.keyspace.get(key, ZSET)
+        if zset is None or member not in zset.scores:
+            return None
+        return format_score(zset.scores[member])
+
+    def zcard(self, key: str) -> int:
+        zset = self.keyspace.get(key, ZSET)
+        return len(zset) if zset is not None else 0
+
+    def zrank(self, key: str, member: str, reverse: bool = False) -> int | None:
+        zset = self.keyspace.get(key, ZSET)
+        if zset is None or member not in zset.scores:
+            return None
+        rank = zset.zsl.rank(zset.scores[member], member) - 1
+        return len(zset) - 1 - rank if reverse else rank
+
+    def zrange(self, key: str, start: int, stop: int, reverse: bool = False,
+               withscores: bool = False) -> list[str]:
+        zset = self.keyspace.get(key, ZSET)
+        if zset is None:
+            return []
+        length = len(zset)
+        start, stop = _normalize_range(start, stop, length)
+        if start > stop or start >= length:
+            return []
+        zsl = zset.zsl
+        if reverse:
+            node = zsl.by_rank(length - start)
+            step = lambda n: n.backward
+        else:
+            node = zsl.by_rank(start + 1)
+            step = lambda n: n.forward[0]
+        return _collect(node, step, stop - start + 1, withscores)
+
+    def zrangebyscore(self, key: str, spec: ScoreRange, reverse: bool = False,
+                      offset: int = 0, count: int = -1, withscores: bool = False) -> list[str]:
+        zset = self.keyspace.get(key, ZSET)
+        if zset is None or offset < 0:
+            return []
+        zsl = zset.zsl
+        if reverse:
+            node = zsl.last_in_range(spec)
+            step = lambda n: n.backward
+            in_range = spec.gte_min
+        else:
+            node = zsl.first_in_range(spec)
+            step = lambda n: n.forward[0]
+            in_range = spec.lte_max
+        while node is not None and offset:
+            node = step(node)
+            offset -= 1
+        result = []
+        while node is not None and count != 0 and in_range(node.score):
+            result.append(node.member)
+            if withscores:
+                result.append(format_score(node.score))
+            node = step(node)
+            count -= 1
+        return result
+
+    def zcount(self, key: str, spec: ScoreRange) -> int:
+        zset = self.keyspace.get(key, ZSET)
+        if zset is None:
+            return 0
+        zsl = zset.zsl
+        first = zsl.first_in_range(spec)
+        if first is None:
+            return 0
+        last = zsl.last_in_range(spec)
+        return zsl.rank(last.score, last.member) - zsl.rank(first.score, first.member) + 1
 
-    def zrange(self, key: str, start: int, stop: int) -> list[str]:
-        items = self.sorted.get(key, [])
-        return [member for _, member in items[start:stop + 1]]
+def _collect(node, step, count: int, withscores: bool) -> list[str]:
+    result = []
+    while node is not None and count:
+        result.append(node.member)
+        if withscores:
+            result.append(format_score(node.score))
+        node = step(node)
+        count -= 1
+    return result
@@ -1,7 +1,18 @@
 # main.py
 
-import asyncio
-from server.tcp_server import start_server
+import argparse
+import config
+from server.sharding import run_sharded
+from server.tcp_server import run_server
 
 if __name__ == "__main__":
-    asyncio.run(start_server())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=6379)
+    parser.add_argument("--workers", type=int, default=config.WORKERS,
+                        help="worker processes; more than one shards the keyspace")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        run_sharded(args.workers, port=args.port)
+    else:
+        run_server(port=args.port)
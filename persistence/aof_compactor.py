@@ -1,36 +1,60 @@
 # persistence/aof_compactor.py
 
-def rewrite_aof(handler, out_file="aof.log.rewrite"):
-    with open(out_file, "wb") as f:
-        def write_line(line):
-            f.write(line.encode("utf-8"))
+import os
+from datastore.keyspace import STRING, LIST, SET, HASH, ZSET, mstime
+from persistence.aof_writer import encode_command
 
-        # BaseStore (strings)
-        for key, (value, _) in handler.store.store.items():
-            write_line(_to_resp(["SET", key, value]))
+# Keys written between progress reports.
+PROGRESS_INTERVAL = 1000
+# Most elements (fields, members...) per rewritten command, as in Redis:
+# big keys become a few bounded records instead of one per element.
+ITEMS_PER_COMMAND = 64
 
-        # ListStore
-        for key, dq in handler.lists.lists.items():
-            if dq:
-                write_line(_to_resp(["RPUSH", key] + list(dq)))
 
-        # SetStore
-        for key, s in handler.sets.sets.items():
-            if s:
-                write_line(_to_resp(["SADD", key] + sorted(s)))
+def rewrite_aof(handler, out_file="aof.log.rewrite", progress=None, fsync=False):
+    """Write the smallest command log that rebuilds handler's keyspace.
+    progress(keys_done) is called every PROGRESS_INTERVAL keys and at the end."""
+    now = mstime()
+    done = 0
+    with open(out_file, "wb") as f:
+        for key, obj in handler.keyspace.data.items():
+            done += 1
+            if progress is not None and done % PROGRESS_INTERVAL == 0:
+                progress(done)
+            if obj.expire_at is not None and obj.expire_at <= now:
+                continue
+            for tokens in _commands_for(key, obj):
+                f.write(encode_command(tokens))
+            if obj.expire_at is not None:
+                f.write(encode_command(["PEXPIREAT", key, str(obj.expire_at)]))
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+    if progress is not None:
+        progress(done)
 
-        # HashStore
-        for key, fields in handler.hashes.hashes.items():
-            for field, val in fields.items():
-                write_line(_to_resp(["HSET", key, field, val]))
+def _commands_for(key, obj):
+    value = obj.value
+    if obj.type == STRING:
+        yield ["SET", key, str(value)]
+    elif obj.type == LIST:
+        yield from _batched("RPUSH", key, ([item] for item in value))
+    elif obj.type == SET:
+        yield from _batched("SADD", key, ([member] for member in sorted(value)))
+    elif obj.type == HASH:
+        yield from _batched("HSET", key, ([field, val] for field, val in value.items()))
+    elif obj.type == ZSET:
+        yield from _batched("ZADD", key, ([str(score), member] for member, score in value.scores.items()))
 
-        # ZSetStore
-        for key, members in handler.zsets.scores.items():
-            for member, score in members.items():
-                write_line(_to_resp(["ZADD", key, str(score), member]))
 
-def _to_resp(tokens):
-    out = f"*{len(tokens)}\r\n"
-    for token in tokens:
-        out += f"${len(token)}\r\n{token}\r\n"
-    return out
+def _batched(name, key, items):
+    """One command per ITEMS_PER_COMMAND items, each item a list of tokens."""
+    tokens, count = [name, key], 0
+    for item in items:
+        tokens += item
+        count += 1
+        if count == ITEMS_PER_COMMAND:
+            yield tokens
+            tokens, count = [name, key], 0
+    if count:
+        yield tokens
@@ -1,22 +1,34 @@
 # persistence/aof_replayer.py
 
-async def replay_aof(filepath: str, command_handler):
+import os
+from protocol.parser import RESPParser, NEED_MORE, ProtocolError
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+def replay_aof(filepath: str, command_handler):
     try:
-        with open(filepath, "r") as f:
-            lines = f.readlines()
+        f = open(filepath, "rb")
     except FileNotFoundError:
         return
 
-    i = 0
-    while i < len(lines):
-        if not lines[i].startswith("*"):
-            i += 1
-            continue
-        argc = int(lines[i][1:])
-        i += 1
-        tokens = []
-        for _ in range(argc):
-            i += 1  # skip $<len>
-            tokens.append(lines[i].strip())
-            i += 1
-        await command_handler.handle(tokens)
+    parser = RESPParser(inline=False)
+    with f:
+        # Only replay what was in the file when we started.
+        remaining = os.fstat(f.fileno()).st_size
+        while remaining > 0:
+            chunk = f.read(min(READ_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            parser.feed(chunk)
+            while True:
+                try:
+                    tokens = parser.parse()
+                except ProtocolError:
+                    # Not a RESP record (e.g. a stray text line): skip it.
+                    parser.skip_line()
+                    continue
+                if tokens is NEED_MORE:
+                    break
+                if isinstance(tokens, list) and tokens:
+                    command_handler.handle(tokens)
@@ -0,0 +1,130 @@
+# persistence/aof_rewriter.py
+
+import asyncio
+import gc
+import os
+import struct
+import time
+from persistence.aof_compactor import rewrite_aof
+
+_PROGRESS = struct.Struct("<Q")
+
+
+class AOFRewriter:
+    """BGREWRITEAOF in a forked child, like Redis.
+
+    fork() gives the child a copy-on-write snapshot of the keyspace as it
+    was at that instant, which it writes out as a fresh AOF while the
+    server carries on. Records appended after the fork are also kept in
+    the AOF writer's rewrite buffer. When the child exits, the buffer is
+    appended to its file, the file is moved over the AOF, and the writer
+    thread switches to it. The child reports keys written over a pipe so
+    INFO persistence can show progress.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.pid: int | None = None
+        self.pipe: int | None = None
+        self.path: str | None = None
+        self.keys_total = 0
+        self.keys_done = 0
+        self.started = 0.0
+        self.last_duration = -1.0
+        self.last_status = "ok"
+        self.rewrites = 0
+        # Resolved when the rewrite in progress finishes (for tests and tools).
+        self.done: asyncio.Future | None = None
+
+    @property
+    def in_progress(self) -> bool:
+        return self.pid is not None
+
+    def start(self):
+        """Fork the rewrite child. Needs a running event loop."""
+        if self.in_progress:
+            raise ValueError("Background append only file rewriting already in progress")
+        loop = asyncio.get_running_loop()
+        handler = self.handler
+        aof = handler.aof
+        path = aof.filepath + ".rewrite"
+        read_fd, write_fd = os.pipe()
+        # Keep the collector's bookkeeping writes from copying every page
+        # in the child (and stop it running there at all).
+        gc.freeze()
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                os.close(read_fd)
+                gc.disable()
+                rewrite_aof(handler, path, lambda done: os.write(write_fd, _PROGRESS.pack(done)),
+                            fsync=aof.fsync != "no")
+                status = 0
+            finally:
+                os._exit(status)
+        gc.unfreeze()
+        os.close(write_fd)
+        os.set_blocking(read_fd, False)
+        aof.begin_rewrite()
+        self.pid, self.pipe, self.path = pid, read_fd, path
+        self.keys_total = len(handler.keyspace.data)
+        self.keys_done = 0
+        self.started = time.monotonic()
+        self.done = loop.create_future()
+        loop.add_reader(read_fd, self._on_pipe)
+
+    def _on_pipe(self):
+        try:
+            data = os.read(self.pipe, 64 * 1024)
+        except BlockingIOError:
+            return
+        if data:
+            # Only the latest report matters; reports are never split.
+            count = len(data) // _PROGRESS.size
+            if count:
+                self.keys_done = _PROGRESS.unpack_from(data, (count - 1) * _PROGRESS.size)[0]
+            return
+        # EOF: the child has exited.
+        self._finish()
+
+    def _finish(self):
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(self.pipe)
+        os.close(self.pipe)
+        _, status = os.waitpid(self.pid, 0)
+        aof = self.handler.aof
+        ok = os.waitstatus_to_exitcode(status) == 0
+        if ok:
+            try:
+                aof.finish_rewrite(self.path)
+            except OSError:
+                ok = False
+        if not ok:
+            aof.abort_rewrite()
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self.last_status = "ok" if ok else "err"
+        self.last_duration = time.monotonic() - self.started
+        self.rewrites += 1
+        self.pid = self.pipe = None
+        self.done.set_result(ok)
+
+    def stats(self) -> list[tuple[str, object]]:
+        """(field, value) pairs for INFO persistence."""
+        running = self.in_progress
+        total = self.keys_total
+        progress = self.keys_done / total * 100 if running and total else 0.0
+        return [
+            ("aof_rewrite_in_progress", int(running)),
+            ("aof_rewrite_keys_done", self.keys_done if running else 0),
+            ("aof_rewrite_keys_total", total if running else 0),
+            ("aof_rewrite_progress", f"{progress:.2f}%"),
+            ("aof_rewrite_buffer_length", len(self.handler.aof.rewrite_buffer or b"")),
+            ("aof_current_rewrite_time_sec", int(time.monotonic() - self.started) if running else -1),
+            ("aof_last_rewrite_time_sec", round(self.last_duration, 3) if self.rewrites else -1),
+            ("aof_last_bgrewrite_status", self.last_status),
+            ("aof_rewrites", self.rewrites),
+        ]
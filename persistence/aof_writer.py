@@ -1,18 +1,289 @@
 # persistence/aof_writer.py
 
+import asyncio
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Callable
+import config
+
+FSYNC_POLICIES = ("always", "everysec", "no")
+QUEUE_FULL_POLICIES = ("block", "drop")
+
+# Tells the writer thread to finish up.
+_CLOSE = object()
+# Tells the writer thread to carry on in a new file (after a rewrite).
+_REOPEN = object()
+
+
+def encode_command(tokens: list[str]) -> bytes:
+    # Lengths are byte counts of the encoded token, so values that are
+    # not plain ASCII (or not UTF-8 at all) replay intact.
+    out = [b"*%d\r\n" % len(tokens)]
+    for token in tokens:
+        data = token.encode("utf-8", "surrogateescape")
+        out.append(b"$%d\r\n%s\r\n" % (len(data), data))
+    return b"".join(out)
+
+
+def fsync_dir(path: str):
+    """fsync the directory holding path, so a rename into it survives a
+    crash and not just the renamed file's contents."""
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
 class AOFWriter:
-    def __init__(self, filepath="aof.log"):
+    """Appends write commands to the AOF under an appendfsync policy.
+
+    Records are encoded on the event loop into a buffer. At the end of
+    each loop tick the buffer goes onto a bounded queue as one block, and
+    a writer thread writes it to the file. A slow disk then delays only
+    the writer thread, not the clients. If the disk falls behind
+    far enough to fill the queue, AOF_QUEUE_FULL picks whether the loop
+    waits for room ("block", backpressure) or the block is dropped and
+    counted ("drop", giving up durability for latency). Under "always"
+    the loop always waits: replies are promised to follow the fsync, so a
+    block can't be dropped. Outside an event
+    loop (AOF replay, tools, tests) appends are written at once.
+
+    - no: the OS decides when the data reaches the disk.
+    - everysec: the writer thread fsyncs once a second if anything was
+      written; a crash loses at most about a second of writes.
+    - always: the writer thread fsyncs after each block, and replies
+      passed through send_when_durable() are held until that is done.
+      One fsync covers every client's writes in that tick (group commit).
+    """
+
+    def __init__(self, filepath="aof.log", fsync: str | None = None,
+                 queue_size: int | None = None, when_full: str | None = None):
         self.filepath = filepath
+        self.fsync = fsync or config.APPENDFSYNC
+        if self.fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown appendfsync policy: {self.fsync}")
+        self.when_full = when_full or config.AOF_QUEUE_FULL
+        if self.when_full not in QUEUE_FULL_POLICIES:
+            raise ValueError(f"Unknown AOF queue full policy: {self.when_full}")
         self.file = open(self.filepath, "ab", buffering=0)  # binary append
-    
+        self.buffer = bytearray()
+        # A copy of every record appended while a background rewrite runs
+        # (see persistence.aof_rewriter); None otherwise.
+        self.rewrite_buffer: bytearray | None = None
+        self.flush_scheduled = False
+        self.loop: asyncio.AbstractEventLoop | None = None
+        # Replies waiting for this tick's block to be fsynced (always)...
+        self.held: list[tuple[Callable[[bytes], None], bytes]] = []
+        # ...and those of blocks handed to the writer thread, oldest first.
+        self.syncing: deque[list[tuple[Callable[[bytes], None], bytes]]] = deque()
+
+        self.queue: queue.Queue = queue.Queue(queue_size or config.AOF_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.pending_bytes = 0      # queued or being written
+        self.dropped_blocks = 0
+        self.dropped_bytes = 0
+        self.writes = 0
+        self.write_latency_last = 0.0   # seconds per block, write + fsync
+        self.write_latency_max = 0.0
+        self.write_latency_total = 0.0
+        self.fsyncs = 0
+        # Data written since the last fsync (everysec); writer thread only.
+        self.unsynced = False
+        self.last_fsync = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name="aof-writer", daemon=True)
+        self.thread.start()
+
     def append(self, tokens: list[str]):
-        self.file.write(self._encode_as_resp(tokens))
+        self._buffer(self._encode_as_resp(tokens))
+
+    def append_many(self, commands: list[list[str]]):
+        """Append several commands as one contiguous record."""
+        self._buffer(b"".join(encode_command(tokens) for tokens in commands))
 
     def _encode_as_resp(self, tokens: list[str]) -> bytes:
-        out = f"*{len(tokens)}\r\n"
-        for token in tokens:
-            out += f"${len(token)}\r\n{token}\r\n"
-        return out.encode("utf-8")
+        return encode_command(tokens)
+
+    def _buffer(self, data: bytes):
+        self.buffer += data
+        if self.rewrite_buffer is not None:
+            self.rewrite_buffer += data
+        if self.flush_scheduled:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write_now()
+            return
+        self.loop = loop
+        self.flush_scheduled = True
+        loop.call_soon(self.flush)
+
+    def send_when_durable(self, send: Callable[[bytes], None], reply: bytes):
+        """Call send(reply) once the writes made so far are as durable as
+        the policy promises: at once, unless appendfsync is always and
+        some records are still waiting for their fsync."""
+        if self.fsync == "always" and (self.flush_scheduled or self.syncing):
+            self.held.append((send, reply))
+        else:
+            send(reply)
+
+    def flush(self, wait: bool = False):
+        """Hand the buffered block to the writer thread (end of loop tick).
+        wait blocks for room in the queue whatever AOF_QUEUE_FULL says, as
+        does appendfsync always."""
+        self.flush_scheduled = False
+        if not self.buffer:
+            return
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        group = None
+        if self.fsync == "always":
+            group, self.held = self.held, []
+        with self.lock:
+            self.pending_bytes += len(data)
+        try:
+            self.queue.put((data, group is not None),
+                           block=wait or group is not None or self.when_full == "block")
+        except queue.Full:
+            with self.lock:
+                self.pending_bytes -= len(data)
+            self.dropped_blocks += 1
+            self.dropped_bytes += len(data)
+            return
+        if group is not None:
+            self.syncing.append(group)
+
+    def _synced(self):
+        """Loop side of the writer thread finishing an always block."""
+        for send, reply in self.syncing.popleft():
+            send(reply)
+        if not self.syncing and not self.flush_scheduled and self.held:
+            # Replies queued behind the block that carry no writes of their own.
+            held, self.held = self.held, []
+            for send, reply in held:
+                send(reply)
+
+    def _write_now(self):
+        self.queue.join()  # keep file order behind the writer thread
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        with self.lock:
+            self.pending_bytes += len(data)
+        self._write(data, self.fsync == "always")
+
+    def _write(self, data: bytes, sync: bool):
+        start = time.perf_counter()
+        view = memoryview(data)
+        while view:
+            view = view[self.file.write(view):]
+        if sync:
+            os.fsync(self.file.fileno())
+            self.last_fsync = time.monotonic()
+        else:
+            self.unsynced = True
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.pending_bytes -= len(data)
+            self.writes += 1
+            if sync:
+                self.fsyncs += 1
+            self.write_latency_last = latency
+            self.write_latency_total += latency
+            if latency > self.write_latency_max:
+                self.write_latency_max = latency
+
+    def _run(self):
+        everysec = self.fsync == "everysec"
+        while True:
+            timeout = None
+            if everysec:
+                timeout = max(self.last_fsync + 1 - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is _CLOSE:
+                self.queue.task_done()
+                return
+            if item is not None and item[0] is _REOPEN:
+                self.file.close()
+                self.file = item[1]
+                self.unsynced = False
+                self.queue.task_done()
+            elif item is not None:
+                data, group = item
+                self._write(data, self.fsync == "always")
+                if group:
+                    try:
+                        self.loop.call_soon_threadsafe(self._synced)
+                    except RuntimeError:
+                        pass  # the loop is gone; nobody is waiting
+                self.queue.task_done()
+            if everysec and time.monotonic() - self.last_fsync >= 1:
+                if self.unsynced:
+                    self.unsynced = False
+                    os.fsync(self.file.fileno())
+                    with self.lock:
+                        self.fsyncs += 1
+                self.last_fsync = time.monotonic()
+
+    def begin_rewrite(self):
+        """Start keeping a copy of new records for a background rewrite."""
+        self.rewrite_buffer = bytearray()
+
+    def abort_rewrite(self):
+        self.rewrite_buffer = None
+
+    def finish_rewrite(self, rewritten: str):
+        """Append the records made during the rewrite to the rewritten
+        file, move it over the AOF and carry on appending there.
+
+        Everything up to now still goes to the old file first (the writer
+        thread is told to switch files in queue order), so nothing is lost
+        if the replace fails.
+        """
+        self.flush(wait=True)
+        tail, self.rewrite_buffer = self.rewrite_buffer, None
+        with open(rewritten, "ab") as f:
+            f.write(tail)
+            f.flush()
+            if self.fsync != "no":
+                os.fsync(f.fileno())
+        os.replace(rewritten, self.filepath)
+        if self.fsync != "no":
+            fsync_dir(self.filepath)
+        self.queue.put((_REOPEN, open(self.filepath, "ab", buffering=0)))
+
+    @property
+    def queue_depth(self) -> int:
+        return self.queue.qsize()
+
+    def stats(self) -> list[tuple[str, object]]:
+        """(field, value) pairs for INFO persistence."""
+        with self.lock:
+            writes = self.writes
+            average = self.write_latency_total / writes if writes else 0.0
+            return [
+                ("aof_fsync", self.fsync),
+                ("aof_queue_depth", self.queue_depth),
+                ("aof_pending_bytes", self.pending_bytes + len(self.buffer)),
+                ("aof_writes", writes),
+                ("aof_write_latency_last_us", round(self.write_latency_last * 1e6)),
+                ("aof_write_latency_avg_us", round(average * 1e6)),
+                ("aof_write_latency_max_us", round(self.write_latency_max * 1e6)),
+                ("aof_fsyncs", self.fsyncs),
+                ("aof_dropped_blocks", self.dropped_blocks),
+                ("aof_dropped_bytes", self.dropped_bytes),
+            ]
 
     def close(self):
+        """Write out everything queued, then stop the writer thread."""
+        self.flush(wait=True)
+        self.queue.put(_CLOSE)
+        self.thread.join()
+        if self.fsync != "no" and self.unsynced:
+            os.fsync(self.file.fileno())
         self.file.close()
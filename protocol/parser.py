@@ -1,40 +1,244 @@
 # protocol/parser.py
 
-# RESP parsing and serialization
+# Incremental RESP parser.
+#
+# Bytes are fed in as they arrive and complete values are pulled out with
+# parse(). The parser keeps its position and any half-built aggregates
+# between calls, so a command split across reads is resumed rather than
+# re-scanned. Bulk payloads are located by their declared length (never by
+# searching for CRLF) and decoded straight out of a memoryview, which keeps
+# them binary-safe: bytes that are not valid UTF-8 round-trip through
+# 'surrogateescape'.
+
+ENCODING = "utf-8"
+ERRORS = "surrogateescape"
+
+MAX_BULK_LENGTH = 512 * 1024 * 1024
+MAX_INLINE_LENGTH = 64 * 1024
+
+# Returned by parse() when the buffer does not hold a complete value yet.
+NEED_MORE = object()
+
+_CRLF = b"\r\n"
+_ARRAY = ord("*")
+_BULK = ord("$")
+_SIMPLE = ord("+")
+_ERROR = ord("-")
+_INTEGER = ord(":")
+# RESP3
+_NULL = ord("_")
+_BOOLEAN = ord("#")
+_DOUBLE = ord(",")
+_BIG_NUMBER = ord("(")
+_BULK_ERROR = ord("!")
+_VERBATIM = ord("=")
+_MAP = ord("%")
+_SET = ord("~")
+_PUSH = ord(">")
+_ATTRIBUTE = ord("|")
+
+_TYPE_BYTES = frozenset(b"*$+-:_#,(!=%~>|")
+_BLOB_TYPES = frozenset((_BULK, _BULK_ERROR, _VERBATIM))
+_AGGREGATE_TYPES = frozenset((_ARRAY, _MAP, _SET, _PUSH, _ATTRIBUTE))
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class RESPError(str):
+    """An error reply (simple or blob) received from the other side."""
+
+
 class RESPParser:
-    def __init__(self, stream: bytes):
-        self.stream = stream
+    def __init__(self, stream: bytes = b"", inline: bool = True, decode: bool = True):
+        self.buffer = bytearray(stream)
         self.index = 0
+        # Accept telnet-style "SET foo bar\r\n" lines at the top level.
+        self.inline = inline
+        # Return bulk strings as str (binary-safe) or as raw bytes.
+        self.decode = decode
+        # Aggregates still being filled: [type, expected, items]
+        self._stack = []
+
+    def feed(self, data: bytes):
+        if self.index:
+            # Drop what has already been consumed before growing the buffer.
+            del self.buffer[:self.index]
+            self.index = 0
+        self.buffer += data
+
+    @property
+    def buffered(self) -> int:
+        """Bytes fed but not parsed yet."""
+        return len(self.buffer) - self.index
 
     def parse(self):
-        if self.stream[self.index:self.index+1] == b'*':
-            return self._parse_array()
-        raise ValueError("Unsupported RESP type")
-
-    def _parse_array(self):
-        self.index += 1
-        line = self._readline()
-        num_elements = int(line)
-        elements = []
-        for _ in range(num_elements):
-            prefix = self.stream[self.index:self.index+1]
-            if prefix == b'$':      # only support bulk strings for now
-                self.index += 1
-                elements.append(self._parse_bulk_string())
+        """Return the next complete value, or NEED_MORE."""
+        if self.index >= len(self.buffer):
+            return NEED_MORE
+        with memoryview(self.buffer) as view:
+            return self._parse(view)
+
+    def __iter__(self):
+        while True:
+            value = self.parse()
+            if value is NEED_MORE:
+                return
+            yield value
+
+    def skip_line(self):
+        """Discard input up to and including the next newline.
+
+        Used to resynchronise after a ProtocolError.
+        """
+        self._stack.clear()
+        end = self.buffer.find(b"\n", self.index)
+        self.index = len(self.buffer) if end == -1 else end + 1
+
+    def _parse(self, view: memoryview):
+        buf = self.buffer
+        end = len(buf)
+        pos = self.index
+        stack = self._stack
+
+        while True:
+            if pos >= end:
+                return NEED_MORE
+
+            prefix = buf[pos]
+            if prefix not in _TYPE_BYTES:
+                # Inline command: a line of words ended by \n or \r\n
+                # (nc and telnet send either).
+                if stack or not self.inline:
+                    raise ProtocolError(f"unexpected type byte {chr(prefix)!r}")
+                line_end = buf.find(b"\n", pos)
+                if line_end == -1:
+                    if end - pos > MAX_INLINE_LENGTH:
+                        raise ProtocolError("too big inline request")
+                    return NEED_MORE
+                value = str(view[pos:line_end], ENCODING, ERRORS).split()
+                pos = line_end + 1
+                self.index = pos
+                if value:
+                    return value
+                continue
+
+            line_end = buf.find(_CRLF, pos)
+            if line_end == -1:
+                if end - pos > MAX_INLINE_LENGTH:
+                    raise ProtocolError("too big header or inline request")
+                return NEED_MORE
+
+            if prefix == _BULK:
+                length = _int(buf, pos + 1, line_end)
+                if length < 0:
+                    value = None
+                    pos = line_end + 2
+                else:
+                    if length > MAX_BULK_LENGTH:
+                        raise ProtocolError("invalid bulk length")
+                    start = line_end + 2
+                    stop = start + length
+                    if stop + 2 > end:
+                        return NEED_MORE
+                    if buf[stop:stop + 2] != _CRLF:
+                        raise ProtocolError("bulk string not terminated by CRLF")
+                    value = self._blob(view, start, stop)
+                    pos = stop + 2
+
+            elif prefix in _AGGREGATE_TYPES:
+                count = _int(buf, pos + 1, line_end)
+                pos = line_end + 2
+                if count < 0:
+                    value = None
+                else:
+                    if prefix == _MAP or prefix == _ATTRIBUTE:
+                        count *= 2
+                    if count or prefix == _ATTRIBUTE:
+                        if count:
+                            stack.append([prefix, count, []])
+                        self.index = pos
+                        continue
+                    value = _finish_aggregate(prefix, [])
+
+            elif prefix in _BLOB_TYPES:
+                length = _int(buf, pos + 1, line_end)
+                if length < 0 or length > MAX_BULK_LENGTH:
+                    raise ProtocolError("invalid bulk length")
+                start = line_end + 2
+                stop = start + length
+                if stop + 2 > end:
+                    return NEED_MORE
+                value = str(view[start:stop], ENCODING, ERRORS)
+                if prefix == _BULK_ERROR:
+                    value = RESPError(value)
+                else:
+                    value = value[4:]  # strip the "txt:" format tag
+                pos = stop + 2
+
             else:
-                raise ValueError(f"Unsupported array element type: {prefix}")
-        return elements
-
-    def _parse_bulk_string(self):
-        length = int(self._readline())
-        if length == -1:
-            return None
-        value = self.stream[self.index:self.index+length].decode()
-        self.index += length + 2  # skip \r\n
-        return value
-
-    def _readline(self):
-        end = self.stream.index(b'\r\n', self.index)
-        line = self.stream[self.index:end].decode()
-        self.index = end + 2
+                value = _parse_simple(prefix, str(view[pos + 1:line_end], ENCODING, ERRORS))
+                pos = line_end + 2
+
+            # Hand the finished value to the innermost open aggregate.
+            while stack:
+                frame = stack[-1]
+                items = frame[2]
+                items.append(value)
+                if len(items) < frame[1]:
+                    break
+                stack.pop()
+                if frame[0] == _ATTRIBUTE:
+                    # Attributes annotate the value that follows; skip them.
+                    value = NEED_MORE
+                    break
+                value = _finish_aggregate(frame[0], items)
+
+            self.index = pos
+            if not stack and value is not NEED_MORE:
+                return value
+
+    def _blob(self, view: memoryview, start: int, stop: int):
+        if self.decode:
+            return str(view[start:stop], ENCODING, ERRORS)
+        return bytes(view[start:stop])
+
+
+def _int(buf: bytearray, start: int, stop: int) -> int:
+    try:
+        return int(buf[start:stop])
+    except ValueError:
+        raise ProtocolError(f"invalid length {bytes(buf[start:stop])!r}") from None
+
+
+def _parse_simple(prefix: int, line: str):
+    if prefix == _SIMPLE:
         return line
+    if prefix == _ERROR:
+        return RESPError(line)
+    if prefix == _INTEGER or prefix == _BIG_NUMBER:
+        try:
+            return int(line)
+        except ValueError:
+            raise ProtocolError(f"invalid integer {line!r}") from None
+    if prefix == _NULL:
+        return None
+    if prefix == _BOOLEAN:
+        if line not in ("t", "f"):
+            raise ProtocolError(f"invalid boolean {line!r}")
+        return line == "t"
+    if prefix == _DOUBLE:
+        try:
+            return float(line)
+        except ValueError:
+            raise ProtocolError(f"invalid double {line!r}") from None
+    raise ProtocolError(f"unexpected type byte {chr(prefix)!r}")
+
+
+def _finish_aggregate(prefix: int, items: list):
+    if prefix == _MAP:
+        return dict(zip(items[::2], items[1::2]))
+    if prefix == _SET:
+        return set(items)
+    return items
@@ -1,21 +1,129 @@
 # protocol/serializer.py
 
-def simple_string(msg: str) -> str:
-    return f"+{msg}\r\n"
+# Every reply is built as bytes, ready for transport.write(). Constant
+# replies are interned and small length headers are precomputed, so the
+# common cases don't format anything at all.
 
-def error(msg: str) -> str:
-    return f"-ERR {msg}\r\n"
+ENCODING = "utf-8"
+ERRORS = "surrogateescape"  # binary-safe counterpart of protocol.parser
 
-def integer(val: int) -> str:
-    return f":{val}\r\n"
+CRLF = b"\r\n"
 
-def bulk_string(val: str | None) -> str:
+OK = b"+OK\r\n"
+PONG = b"+PONG\r\n"
+QUEUED = b"+QUEUED\r\n"
+ZERO = b":0\r\n"
+ONE = b":1\r\n"
+NULL = b"$-1\r\n"
+NULL_ARRAY = b"*-1\r\n"
+EMPTY_ARRAY = b"*0\r\n"
+
+_SHARED_HEADERS = 256
+_SHARED_INTEGERS = 1024
+
+_BULK_HEADERS = tuple(b"$%d\r\n" % n for n in range(_SHARED_HEADERS))
+_ARRAY_HEADERS = tuple(b"*%d\r\n" % n for n in range(_SHARED_HEADERS))
+_INTEGERS = (ZERO, ONE) + tuple(b":%d\r\n" % n for n in range(2, _SHARED_INTEGERS))
+_SIMPLE_STRINGS = {"OK": OK, "PONG": PONG, "QUEUED": QUEUED}
+
+
+def simple_string(msg: str) -> bytes:
+    shared = _SIMPLE_STRINGS.get(msg)
+    if shared is not None:
+        return shared
+    return b"+%s\r\n" % msg.encode(ENCODING, ERRORS)
+
+def error(msg: str, code: str = "ERR") -> bytes:
+    return b"-%s %s\r\n" % (code.encode(), msg.encode(ENCODING, ERRORS))
+
+def integer(val: int) -> bytes:
+    if 0 <= val < _SHARED_INTEGERS:
+        return _INTEGERS[val]
+    return b":%d\r\n" % val
+
+def bulk_string(val: str | bytes | None) -> bytes:
     if val is None:
-        return "$-1\r\n"
-    return f"${len(val)}\r\n{val}\r\n"
+        return NULL
+    if isinstance(val, str):
+        val = val.encode(ENCODING, ERRORS)
+    return _bulk_header(len(val)) + val + CRLF
+
+def array(items: list) -> bytes:
+    if not items:
+        return EMPTY_ARRAY
+    # One amortised append per element into a local buffer rather than a
+    # chain of intermediate strings; the bytes() at the end is one copy.
+    out = bytearray()
+    _write_array(out, items)
+    return bytes(out)
+
+def reply_array(replies: list[bytes]) -> bytes:
+    """An array of already-serialized replies (EXEC's)."""
+    n = len(replies)
+    header = _ARRAY_HEADERS[n] if n < _SHARED_HEADERS else b"*%d\r\n" % n
+    return header + b"".join(replies)
+
+
+class ResponseBuilder:
+    """Accumulates replies for one connection until they are flushed."""
+
+    def __init__(self):
+        self.buffer = bytearray()
 
-def array(items: list[str]) -> str:
-    out = f"*{len(items)}\r\n"
+    def __len__(self):
+        return len(self.buffer)
+
+    def write(self, data: bytes):
+        self.buffer += data
+
+    def simple_string(self, msg: str):
+        self.buffer += simple_string(msg)
+
+    def error(self, msg: str, code: str = "ERR"):
+        self.buffer += error(msg, code)
+
+    def integer(self, val: int):
+        self.buffer += integer(val)
+
+    def bulk_string(self, val: str | bytes | None):
+        _write_item(self.buffer, val)
+
+    def array(self, items: list):
+        _write_array(self.buffer, items)
+
+    def take(self) -> bytes:
+        """Return everything written so far and reset the buffer."""
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _bulk_header(length: int) -> bytes:
+    if length < _SHARED_HEADERS:
+        return _BULK_HEADERS[length]
+    return b"$%d\r\n" % length
+
+def _write_array(out: bytearray, items):
+    n = len(items)
+    out += _ARRAY_HEADERS[n] if n < _SHARED_HEADERS else b"*%d\r\n" % n
     for item in items:
-        out += bulk_string(item)
-    return out
+        _write_item(out, item)
+
+def _write_item(out: bytearray, item):
+    if isinstance(item, str):
+        data = item.encode(ENCODING, ERRORS)
+        out += _bulk_header(len(data))
+        out += data
+        out += CRLF
+    elif item is None:
+        out += NULL
+    elif isinstance(item, (bytes, bytearray)):
+        out += _bulk_header(len(item))
+        out += item
+        out += CRLF
+    elif isinstance(item, int):
+        out += integer(item)
+    elif isinstance(item, (list, tuple)):
+        _write_array(out, item)
+    else:
+        _write_item(out, str(item))
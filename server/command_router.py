@@ -1,260 +1,1181 @@
 # server/command_router.py
 
-from datastore import BaseStore, ListStore, SetStore, HashStore, ZSetStore, ExpiryManager, PubSubManager
+from typing import Callable, NamedTuple
+from datastore import (BaseStore, ListStore, SetStore, HashStore, ZSetStore, ExpiryManager, PubSubManager,
+                       BlockingQueues, Transactions, Keyspace, WrongTypeError)
 from protocol import serializer as s
-from persistence.aof_writer import AOFWriter
+from persistence.aof_writer import AOFWriter, fsync_dir
 from persistence.aof_compactor import rewrite_aof
+from persistence.aof_rewriter import AOFRewriter
+from server.sharding import ShardMap, key_hash_slot
+from datastore.memory import format_bytes
+from datastore.eviction import lru_clock
+from datastore.keyspace import mstime, encoding_of, string_to_float, LIST, SET, HASH, ZSET
+from datastore.scan import compile_glob
+from datastore.skiplist import ScoreRange
+from datastore.zset_store import format_score
+import asyncio
+import config
+import math
 import os
 
+
+class CommandSpec(NamedTuple):
+    name: str
+    handler: Callable
+    # Redis convention: N means exactly N tokens (name included), -N at least N.
+    arity: int
+    flags: tuple[str, ...]
+    # Key positions: first and last key index (negative counts from the end)
+    # and the step between keys. 0/0/0 for commands that take no keys.
+    first_key: int
+    last_key: int
+    step: int
+    # Whether a successful call is appended to the AOF.
+    aof: bool
+    # Whether the command may grow memory, so eviction runs before it.
+    denyoom: bool
+    # For "movablekeys" commands, whose keys the positions above can't
+    # describe: tokens -> keys.
+    getkeys: Callable | None = None
+
+    def keys(self, tokens: list[str]) -> list[str]:
+        if self.getkeys is not None:
+            return self.getkeys(tokens)
+        if not self.first_key:
+            return []
+        last = self.last_key if self.last_key >= 0 else len(tokens) + self.last_key
+        return tokens[self.first_key:last + 1:self.step]
+
+    def info(self) -> list:
+        return [self.name, self.arity, list(self.flags), self.first_key, self.last_key, self.step]
+
+
+# Upper-case command name -> CommandSpec. Filled in by @command below, so
+# dispatch is a single dict lookup.
+COMMANDS: dict[str, CommandSpec] = {}
+
+
+def command(name: str, arity: int, flags: tuple[str, ...] = (), keys: tuple[int, int, int] = (0, 0, 0),
+            getkeys: Callable | None = None):
+    def register(func):
+        COMMANDS[name] = CommandSpec(name.lower(), func, arity, flags, *keys,
+                                    aof="write" in flags, denyoom="denyoom" in flags,
+                                    getkeys=getkeys)
+        return func
+    return register
+
+
+def _numkeys_keys(tokens: list[str]) -> list[str]:
+    """Keys of a command whose first argument counts the keys after it."""
+    try:
+        numkeys = int(tokens[1])
+    except ValueError:
+        return []
+    return tokens[2:2 + numkeys] if numkeys > 0 else []
+
+
 class CommandHandler:
-    def __init__(self):
-        self.store = BaseStore()
-        self.lists = ListStore()
-        self.sets = SetStore()
-        self.hashes = HashStore()
-        self.zsets = ZSetStore()
-        self.expiry = ExpiryManager()
-        self.pubsub = PubSubManager()
-        self.aof = AOFWriter()
-
-    async def handle(self, tokens: list[str], writer=None):
+    def __init__(self, aof_path: str = "aof.log", shard: ShardMap | None = None):
+        # One keyspace shared by every type-specific store.
+        self.keyspace = Keyspace()
+        self.store = BaseStore(self.keyspace)
+        self.lists = ListStore(self.keyspace)
+        self.sets = SetStore(self.keyspace)
+        self.hashes = HashStore(self.keyspace)
+        self.zsets = ZSetStore(self.keyspace)
+        self.expiry = ExpiryManager(self.keyspace)
+        self.pubsub = PubSubManager(self._push)
+        # Clients parked in BLPOP/BRPOP/BLMOVE, woken by pushes.
+        self.blocking = BlockingQueues()
+        # MULTI queues and WATCHed keys, per connection.
+        self.transactions = Transactions(self.keyspace)
+        # AOF records of the transaction EXEC is running, written as one
+        # batch when it finishes; None outside EXEC.
+        self.exec_log: list[list[str]] | None = None
+        self.aof = AOFWriter(aof_path)
+        self.rewriter = AOFRewriter(self)
+        # Set while replaying the AOF so replayed commands aren't logged again.
+        self.loading = False
+        self._command_reply = None
+        # A write command may set this to log something other than its own
+        # tokens (e.g. an absolute deadline in place of a relative TTL);
+        # an empty list logs nothing.
+        self.propagate = None
+        # Slot layout when running as one worker of a sharded server.
+        self.shard = shard
+        # Snapshots behind SSCAN/HSCAN/ZSCAN cursors.
+
+    def handle(self, tokens: list[str], writer=None):
         if not tokens:
             return s.error("Empty command")
 
-        cmd = tokens[0].upper()
+        spec = COMMANDS.get(tokens[0].upper())
+        if spec is None:
+            return self._reject(writer, s.error(f"Unknown command '{tokens[0].upper()}'"))
+
+        arity = spec.arity
+        if (arity >= 0 and len(tokens) != arity) or len(tokens) < -arity:
+            return self._reject(writer, s.error(f"wrong number of arguments for '{spec.name}' command"))
+
+        keys = spec.keys(tokens)
+        if self.shard is not None and not self.loading:
+            refusal = self._check_slot(keys) if keys else self._check_scope(spec, writer)
+            if refusal is not None:
+                return self._reject(writer, refusal)
 
+        if self.transactions.clients:
+            tx = self.transactions.get(writer)
+            if tx is not None and tx.queue is not None and spec.name not in _TRANSACTION_COMMANDS:
+                tx.queue.append(tokens)
+                return s.QUEUED
+
+        self.propagate = None
         try:
-            # --- Base Commands ---
-            if cmd == "PING":
-                return s.simple_string("PONG")
-
-            elif cmd == "BGREWRITEAOF":
-                self.rewrite_aof_log()
-                return s.simple_string("Background AOF rewrite started")
-            
-            elif cmd == "SET":
-                if len(tokens) != 3:
-                    return self._error("Usage: SET key value")
-                try:
-                    self.store.set(tokens[1], tokens[2])
-                except MemoryError as e:
-                    return s.error(str(e))
-                self.aof.append(tokens)
-                return s.simple_string("OK")
-
-            elif cmd == "GET":
-                if len(tokens) != 2:
-                    return self._error("Usage: GET key")
-                self._delete_if_expired(tokens[1])
-                val = self.store.get(tokens[1])
-                return s.bulk_string(val)
-
-            elif cmd == "DEL":
-                if len(tokens) != 2:
-                    return self._error("Usage: DEL key")
-                success = self.store.delete(tokens[1])
-                self.aof.append(tokens)
-                return s.integer(int(success))
-
-            elif cmd == "EXISTS":
-                if len(tokens) != 2:
-                    return self._error("Usage: EXISTS key")
-                self._delete_if_expired(tokens[1])
-                exists = self.store.exists(tokens[1])
-                return s.integer(int(exists))
-
-            elif cmd == "EXPIRE":
-                if len(tokens) != 3:
-                    return s.error("Usage: EXPIRE key seconds")
-                key = tokens[1]
-                ttl = int(tokens[2])
-                # Check if key exists in any store
-                exists = (
-                    self.store.exists(key) or
-                    key in self.hashes.hashes or
-                    key in self.lists.lists or
-                    key in self.sets.sets or
-                    key in self.zsets.scores  # or self.zsets.sorted, depending on your implementation
-                )
-                if not exists:
-                    return s.integer(0)
-                self.expiry.set_expiry(key, ttl)
-                return s.integer(1)
-
-            elif cmd == "TTL":
-                if len(tokens) != 2:
-                    return s.error("Usage: TTL key")
-                return s.integer(self.expiry.ttl(tokens[1]))
-
-            # --- LIST Commands ---
-            elif cmd == "LPUSH":
-                if len(tokens) < 3:
-                    return self._error("Usage: LPUSH key value [value ...]")
-                count = self.lists.lpush(tokens[1], *tokens[2:])
-                self.aof.append(tokens)
-                return s.integer(count)
-
-            elif cmd == "RPUSH":
-                if len(tokens) < 3:
-                    return self._error("Usage: RPUSH key value [value ...]")
-                count = self.lists.rpush(tokens[1], *tokens[2:])
-                self.aof.append(tokens)
-                return s.integer(count)
-
-            elif cmd == "LPOP":
-                if len(tokens) != 2:
-                    return self._error("Usage: LPOP key")
-                self._delete_if_expired(tokens[1])
-                val = self.lists.lpop(tokens[1])
-                self.aof.append(tokens)
-                return s.bulk_string(val)
-
-            elif cmd == "RPOP":
-                if len(tokens) != 2:
-                    return self._error("Usage: RPOP key")
-                self._delete_if_expired(tokens[1])
-                val = self.lists.rpop(tokens[1])
-                self.aof.append(tokens)
-                return s.bulk_string(val)
-
-            elif cmd == "LRANGE":
-                if len(tokens) != 4:
-                    return self._error("Usage: LRANGE key start end")
-                self._delete_if_expired(tokens[1])
-                result = self.lists.lrange(tokens[1], int(tokens[2]), int(tokens[3]))
-                return s.array(result)
-
-            elif cmd == "LLEN":
-                if len(tokens) != 2:
-                    return self._error("Usage: LLEN key")
-                self._delete_if_expired(tokens[1])
-                return s.integer(self.lists.llen(tokens[1]))
-
-            # --- SET Commands ---
-            elif cmd == "SADD":
-                if len(tokens) < 3:
-                    return self._error("Usage: SADD key member [member ...]")
-                count = self.sets.sadd(tokens[1], *tokens[2:])
-                self.aof.append(tokens)
-                return s.integer(count)
-
-            elif cmd == "SREM":
-                if len(tokens) < 3:
-                    return self._error("Usage: SREM key member [member ...]")
-                count = self.sets.srem(tokens[1], *tokens[2:])
-                self.aof.append(tokens)
-                return s.integer(count)
-
-            elif cmd == "SISMEMBER":
-                if len(tokens) != 3:
-                    return self._error("Usage: SISMEMBER key member")
-                self._delete_if_expired(tokens[1])
-                is_member = self.sets.sismember(tokens[1], tokens[2])
-                return s.integer(int(is_member))
-
-            elif cmd == "SMEMBERS":
-                if len(tokens) != 2:
-                    return self._error("Usage: SMEMBERS key")
-                self._delete_if_expired(tokens[1])
-                members = self.sets.smembers(tokens[1])
-                return s.array(members)
-
-            # --- HASH Commands ---
-            elif cmd == "HSET":
-                if len(tokens) != 4:
-                    return s.error("Usage: HSET key field value")
-                result = self.hashes.hset(tokens[1], tokens[2], tokens[3])
-                self.aof.append(tokens)
-                return s.integer(result)
-
-            elif cmd == "HGET":
-                if len(tokens) != 3:
-                    return s.error("Usage: HGET key field")
-                self._delete_if_expired(tokens[1])
-                val = self.hashes.hget(tokens[1], tokens[2])
-                return s.bulk_string(val)
-
-            elif cmd == "HGETALL":
-                if len(tokens) != 2:
-                    return s.error("Usage: HGETALL key")
-                self._delete_if_expired(tokens[1])
-                return s.array(self.hashes.hgetall(tokens[1]))
-
-            elif cmd == "HDEL":
-                if len(tokens) < 3:
-                    return s.error("Usage: HDEL key field [field ...]")
-                count = self.hashes.hdel(tokens[1], *tokens[2:])
-                self.aof.append(tokens)
-                return s.integer(count)
-            
-            # --- ZSET Commands ---
-            elif cmd == "ZADD":
-                if len(tokens) != 4:
-                    return s.error("Usage: ZADD key score member")
-                result = self.zsets.zadd(tokens[1], float(tokens[2]), tokens[3])
-                self.aof.append(tokens)
-                return s.integer(result)
-
-            elif cmd == "ZSCORE":
-                if len(tokens) != 3:
-                    return s.error("Usage: ZSCORE key member")
-                self._delete_if_expired(tokens[1])
-                score = self.zsets.zscore(tokens[1], tokens[2])
-                return s.bulk_string(score)
-
-            elif cmd == "ZRANGE":
-                if len(tokens) != 4:
-                    return s.error("Usage: ZRANGE key start stop")
-                self._delete_if_expired(tokens[1])
-                members = self.zsets.zrange(tokens[1], int(tokens[2]), int(tokens[3]))
-                return s.array(members)
-            # --- Pub/Sub Commands ---
-            if cmd == "SUBSCRIBE":
-                if not writer:
-                    return s.error("SUBSCRIBE requires a client connection.")
-                if len(tokens) < 2:
-                    return s.error("Usage: SUBSCRIBE channel [channel ...]")
-                await self.pubsub.subscribe(writer, *tokens[1:])
-                for channel in tokens[1:]:
-                    writer.write(s.array(["subscribe", channel, "1"]).encode())
-                    await writer.drain()
-                return None  # We don't return a normal response
-
-            elif cmd == "UNSUBSCRIBE":
-                if not writer:
-                    return s.error("UNSUBSCRIBE requires a client connection.")
-                if len(tokens) < 2:
-                    return s.error("Usage: UNSUBSCRIBE channel [channel ...]")
-                await self.pubsub.unsubscribe(writer, *tokens[1:])
-                for channel in tokens[1:]:
-                    writer.write(s.array(["unsubscribe", channel, "0"]).encode())
-                    await writer.drain()
+            if spec.denyoom:
+                self.keyspace.eviction.perform_evictions()
+            response = spec.handler(self, tokens, writer)
+        except WrongTypeError as e:
+            return s.error(str(e), "WRONGTYPE")
+        except MemoryError as e:
+            return s.error(str(e), "OOM")
+        except Exception as e:
+            return s.error(str(e))
+
+        # A handler may also reject its arguments by returning an error
+        # reply; like a raised error, that changed nothing and isn't logged.
+        # WATCH versions are bumped by the keyspace itself, for the keys a
+        # store really changed.
+        if spec.aof and (type(response) is not bytes or response[:1] != b"-"):
+            logged = tokens if self.propagate is None else self.propagate
+            if logged and not self.loading:
+                if self.exec_log is None:
+                    self.aof.append(logged)
+                else:
+                    self.exec_log.append(logged)
+        if self.blocking.ready and self.exec_log is None:
+            # The write gave blocked clients something to pop; serve them
+            # now, so their pops are logged right after it. Inside EXEC
+            # that waits until the whole transaction has run.
+            self.blocking.serve_ready()
+        return response
+
+    def _reject(self, writer, error: bytes) -> bytes:
+        """Return error for a command that couldn't run; inside MULTI it
+        also makes the EXEC fail."""
+        if self.transactions.clients:
+            tx = self.transactions.get(writer)
+            if tx is not None and tx.queue is not None:
+                tx.dirty = True
+        return error
+
+    # --- Base Commands ---
+    @command("PING", -1, ("fast",))
+    def _ping(self, tokens, writer):
+        if len(tokens) > 1:
+            return s.bulk_string(tokens[1])
+        return s.PONG
+
+    @command("BGREWRITEAOF", 1, ("admin",))
+    def _bgrewriteaof(self, tokens, writer):
+        if hasattr(os, "fork") and _loop_running():
+            self.rewriter.start()
+        else:
+            # No fork() (or no event loop to watch the child from): rewrite inline.
+            self.rewrite_aof_log()
+        return s.simple_string("Background AOF rewrite started")
+
+    @command("COMMAND", -1, ("loading",))
+    def _command(self, tokens, writer):
+        sub = tokens[1].upper() if len(tokens) > 1 else None
+        if sub is None:
+            if self._command_reply is None:
+                self._command_reply = s.array([spec.info() for spec in COMMANDS.values()])
+            return self._command_reply
+        if sub == "COUNT":
+            return s.integer(len(COMMANDS))
+        if sub == "INFO":
+            names = tokens[2:] or [spec.name for spec in COMMANDS.values()]
+            infos = []
+            for name in names:
+                spec = COMMANDS.get(name.upper())
+                infos.append(spec.info() if spec else None)
+            return s.array(infos)
+        if sub == "GETKEYS":
+            if len(tokens) < 3:
+                return s.error("Usage: COMMAND GETKEYS command [arg ...]")
+            spec = COMMANDS.get(tokens[2].upper())
+            if spec is None:
+                return s.error("Invalid command specified")
+            if not spec.first_key:
+                return s.error("The command has no key arguments")
+            keys = spec.keys(tokens[2:])
+            if not keys:
+                return s.error("Invalid arguments specified for command")
+            return s.array(keys)
+        return s.error(f"Unknown COMMAND subcommand '{tokens[1]}'")
+
+    @command("INFO", -1, ("loading",))
+    def _info(self, tokens, writer):
+        sections = [name.lower() for name in tokens[1:]] or list(INFO_SECTIONS)
+        lines = []
+        for name in sections:
+            section = INFO_SECTIONS.get(name)
+            if section is None:
+                continue
+            if lines:
+                lines.append("")
+            lines.append(f"# {name.capitalize()}")
+            lines.extend(f"{field}:{value}" for field, value in section(self))
+        return s.bulk_string("\r\n".join(lines) + "\r\n")
+
+    def _info_memory(self):
+        ks = self.keyspace
+        return [
+            ("used_memory", ks.used_memory),
+            ("used_memory_human", format_bytes(ks.used_memory)),
+            ("used_memory_peak", ks.peak_memory),
+            ("used_memory_peak_human", format_bytes(ks.peak_memory)),
+            ("maxmemory", config.MAX_MEMORY_BYTES),
+            ("maxmemory_human", format_bytes(config.MAX_MEMORY_BYTES)),
+            ("maxmemory_policy", config.EVICTION_POLICY),
+            ("memory_recount_drift", ks.recount_drift),
+            ("lazyfree_pending_objects", ks.lazyfree.pending_objects),
+        ]
+
+    def _info_clients(self):
+        return [
+            ("blocked_clients", self.blocking.blocked_clients),
+        ]
+
+    def _info_persistence(self):
+        return [("loading", int(self.loading))] + self.rewriter.stats() + self.aof.stats()
+
+    def _info_stats(self):
+        return [
+            ("expired_keys", self.keyspace.expired_keys),
+            ("expire_cycle_time", round(self.expiry.cycle_time)),
+            ("evicted_keys", self.keyspace.eviction.evicted_keys),
+            ("lazyfreed_objects", self.keyspace.lazyfree.freed_objects),
+        ]
+
+    def _info_keyspace(self):
+        count = len(self.keyspace.data)
+        if not count:
+            return []
+        expires = sum(1 for obj in self.keyspace.data.values() if obj.expire_at is not None)
+        return [("db0", f"keys={count},expires={expires}")]
+
+    @command("MEMORY", -2, ("readonly",))
+    def _memory(self, tokens, writer):
+        sub = tokens[1].upper()
+        if sub == "USAGE":
+            if len(tokens) != 3:
+                return s.error("wrong number of arguments for 'memory|usage' command")
+            usage = self.store.memory_usage(tokens[2])
+            return s.integer(usage) if usage is not None else s.NULL
+        if sub == "STATS" and len(tokens) == 2:
+            ks = self.keyspace
+            count = len(ks.data)
+            return s.array([
+                "peak.allocated", ks.peak_memory,
+                "total.allocated", ks.used_memory,
+                "keys.count", count,
+                "keys.bytes-per-key", ks.used_memory // count if count else 0,
+                "recount.drift", ks.recount_drift,
+            ])
+        return s.error(f"Unknown MEMORY subcommand '{tokens[1]}'")
+
+    @command("CLUSTER", -2)
+    def _cluster(self, tokens, writer):
+        sub = tokens[1].upper()
+        if sub == "KEYSLOT" and len(tokens) == 3:
+            return s.integer(key_hash_slot(tokens[2]))
+        if self.shard is None:
+            return s.error("This instance has cluster support disabled")
+        if sub == "SLOTS":
+            shard = self.shard
+            return s.array([
+                [first, last, [shard.host, shard.shard_port(index), f"shard-{index}"]]
+                for first, last, index in shard.slot_ranges()
+            ])
+        if sub == "MYID":
+            return s.bulk_string(f"shard-{self.shard.index}")
+        return s.error(f"Unknown CLUSTER subcommand '{tokens[1]}'")
+
+    @command("SET", -3, ("write", "denyoom"), (1, 1, 1))
+    def _set(self, tokens, writer):
+        key, value = tokens[1], tokens[2]
+        condition = None
+        expire_at = None
+        keep_ttl = get = False
+        i = 3
+        while i < len(tokens):
+            opt = tokens[i].upper()
+            if opt in ("NX", "XX") and condition is None:
+                condition = opt
+            elif opt == "KEEPTTL" and expire_at is None:
+                keep_ttl = True
+            elif opt == "GET":
+                get = True
+            elif opt in ("EX", "PX", "EXAT", "PXAT") and expire_at is None and not keep_ttl and i + 1 < len(tokens):
+                i += 1
+                expire_at = _parse_deadline(opt, tokens[i], "set")
+            else:
+                return s.error("syntax error")
+            i += 1
+
+        old = self.store.get(key) if get else None
+        if condition is not None and self.store.exists(key) != (condition == "XX"):
+            self.propagate = []
+            return s.NULL
+
+        self.store.set(key, value, expire_at=expire_at, keep_ttl=keep_ttl)
+        if expire_at is not None or condition is not None or get:
+            self.propagate = ["SET", key, value]
+            if expire_at is not None:
+                self.propagate += ["PXAT", str(expire_at)]
+            elif keep_ttl:
+                self.propagate.append("KEEPTTL")
+        return s.bulk_string(old) if get else s.OK
+
+    @command("GET", 2, ("readonly", "fast"), (1, 1, 1))
+    def _get(self, tokens, writer):
+        return s.bulk_string(self.store.get(tokens[1]))
+
+    @command("INCR", 2, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _incr(self, tokens, writer):
+        return s.integer(self.store.incrby(tokens[1], 1))
+
+    @command("DECR", 2, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _decr(self, tokens, writer):
+        return s.integer(self.store.incrby(tokens[1], -1))
+
+    @command("INCRBY", 3, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _incrby(self, tokens, writer):
+        return s.integer(self.store.incrby(tokens[1], _parse_int(tokens[2])))
+
+    @command("DECRBY", 3, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _decrby(self, tokens, writer):
+        return s.integer(self.store.incrby(tokens[1], -_parse_int(tokens[2])))
+
+    @command("INCRBYFLOAT", 3, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _incrbyfloat(self, tokens, writer):
+        key = tokens[1]
+        result = self.store.incrbyfloat(key, _parse_float(tokens[2]))
+        # Log the result, so replay doesn't depend on float rounding.
+        self.propagate = ["SET", key, result, "KEEPTTL"]
+        return s.bulk_string(result)
+
+    @command("APPEND", 3, ("write", "denyoom"), (1, 1, 1))
+    def _append(self, tokens, writer):
+        return s.integer(self.store.append(tokens[1], tokens[2]))
+
+    @command("STRLEN", 2, ("readonly", "fast"), (1, 1, 1))
+    def _strlen(self, tokens, writer):
+        return s.integer(self.store.strlen(tokens[1]))
+
+    @command("GETRANGE", 4, ("readonly",), (1, 1, 1))
+    def _getrange(self, tokens, writer):
+        return s.bulk_string(self.store.getrange(tokens[1], _parse_int(tokens[2]), _parse_int(tokens[3])))
+
+    @command("SETRANGE", 4, ("write", "denyoom"), (1, 1, 1))
+    def _setrange(self, tokens, writer):
+        return s.integer(self.store.setrange(tokens[1], _parse_int(tokens[2]), tokens[3]))
+
+    @command("MGET", -2, ("readonly", "fast"), (1, -1, 1))
+    def _mget(self, tokens, writer):
+        return s.array(self.store.mget(tokens[1:]))
+
+    @command("MSET", -3, ("write", "denyoom"), (1, -1, 2))
+    def _mset(self, tokens, writer):
+        if len(tokens) % 2 == 0:
+            return s.error("wrong number of arguments for 'mset' command")
+        self.store.mset(*tokens[1:])
+        return s.OK
+
+    @command("MSETNX", -3, ("write", "denyoom"), (1, -1, 2))
+    def _msetnx(self, tokens, writer):
+        if len(tokens) % 2 == 0:
+            return s.error("wrong number of arguments for 'msetnx' command")
+        if not self.store.msetnx(*tokens[1:]):
+            self.propagate = []
+            return s.ZERO
+        return s.ONE
+
+    @command("DEL", -2, ("write",), (1, -1, 1))
+    def _del(self, tokens, writer):
+        return s.integer(sum(self.store.delete(key) for key in tokens[1:]))
+
+    @command("UNLINK", -2, ("write", "fast"), (1, -1, 1))
+    def _unlink(self, tokens, writer):
+        return s.integer(sum(self.store.unlink(key) for key in tokens[1:]))
+
+    @command("EXISTS", -2, ("readonly", "fast"), (1, -1, 1))
+    def _exists(self, tokens, writer):
+        return s.integer(sum(self.store.exists(key) for key in tokens[1:]))
+
+    @command("EXPIRE", 3, ("write", "fast"), (1, 1, 1))
+    def _expire(self, tokens, writer):
+        return self._expire_generic(tokens, "EX")
+
+    @command("PEXPIRE", 3, ("write", "fast"), (1, 1, 1))
+    def _pexpire(self, tokens, writer):
+        return self._expire_generic(tokens, "PX")
+
+    @command("EXPIREAT", 3, ("write", "fast"), (1, 1, 1))
+    def _expireat(self, tokens, writer):
+        return self._expire_generic(tokens, "EXAT")
+
+    @command("PEXPIREAT", 3, ("write", "fast"), (1, 1, 1))
+    def _pexpireat(self, tokens, writer):
+        return self._expire_generic(tokens, "PXAT")
+
+    def _expire_generic(self, tokens, unit):
+        key = tokens[1]
+        when = _parse_deadline(unit, tokens[2], tokens[0].lower(), allow_past=True)
+        if not self.expiry.expire_at(key, when):
+            self.propagate = []
+            return s.ZERO
+        # Log the absolute deadline so replaying later doesn't extend it.
+        self.propagate = ["PEXPIREAT", key, str(when)] if key in self.keyspace.data else ["DEL", key]
+        return s.ONE
+
+    @command("TTL", 2, ("readonly", "fast"), (1, 1, 1))
+    def _ttl(self, tokens, writer):
+        return s.integer(self.expiry.ttl(tokens[1]))
+
+    @command("PTTL", 2, ("readonly", "fast"), (1, 1, 1))
+    def _pttl(self, tokens, writer):
+        return s.integer(self.expiry.pttl(tokens[1]))
+
+    @command("PERSIST", 2, ("write", "fast"), (1, 1, 1))
+    def _persist(self, tokens, writer):
+        return s.integer(int(self.expiry.persist(tokens[1])))
+
+    @command("TYPE", 2, ("readonly", "fast"), (1, 1, 1))
+    def _type(self, tokens, writer):
+        return s.simple_string(self.keyspace.type_of(tokens[1]))
+
+    @command("KEYS", 2, ("readonly",))
+    def _keys(self, tokens, writer):
+        match = compile_glob(tokens[1])
+        now = mstime()
+        return s.array([key for key, obj in self.keyspace.data.items()
+                        if match(key) and (obj.expire_at is None or obj.expire_at > now)])
+
+    @command("SCAN", -2, ("readonly",))
+    def _scan(self, tokens, writer):
+        cursor = _parse_cursor(tokens[1])
+        match, count, type = _parse_scan_options(tokens[2:], allow_type=True)
+        cursor, keys = self.keyspace.scan(cursor, count)
+        if match is not None:
+            keys = [key for key in keys if match(key)]
+        if type is not None:
+            data = self.keyspace.data
+            keys = [key for key in keys if data[key].type == type]
+        return s.array([str(cursor), keys])
+
+    @command("OBJECT", -2, ("readonly",), (2, 2, 1))
+    def _object(self, tokens, writer):
+        sub = tokens[1].upper()
+        if len(tokens) != 3 or sub not in ("ENCODING", "FREQ", "IDLETIME"):
+            return s.error(f"Unknown subcommand or wrong number of arguments for '{tokens[1]}'")
+        obj = self.keyspace.lookup(tokens[2], touch=False)
+        if obj is None:
+            return s.NULL
+        if sub == "ENCODING":
+            return s.bulk_string(encoding_of(obj))
+        lfu = config.EVICTION_POLICY == "allkeys-lfu"
+        if sub == "FREQ":
+            if not lfu:
+                return s.error("An LFU maxmemory policy is not selected, access frequency not tracked")
+            return s.integer(self.keyspace.eviction.frequency(obj))
+        if lfu:
+            return s.error("An LFU maxmemory policy is selected, idle time not tracked")
+        return s.integer((lru_clock() - obj.lru) // 1000)
+
+    @command("DBSIZE", 1, ("readonly", "fast"))
+    def _dbsize(self, tokens, writer):
+        return s.integer(len(self.keyspace))
+
+    @command("FLUSHDB", -1, ("write",))
+    def _flushdb(self, tokens, writer):
+        return self._flush(tokens)
+
+    @command("FLUSHALL", -1, ("write",))
+    def _flushall(self, tokens, writer):
+        return self._flush(tokens)
+
+    def _flush(self, tokens):
+        if len(tokens) > 2:
+            raise ValueError("syntax error")
+        mode = tokens[1].upper() if len(tokens) == 2 else "SYNC"
+        if mode not in ("ASYNC", "SYNC"):
+            raise ValueError("syntax error")
+        self.keyspace.flush(lazy=mode == "ASYNC")
+        return s.OK
+
+    # --- LIST Commands ---
+    @command("LPUSH", -3, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _lpush(self, tokens, writer):
+        length = self.lists.lpush(tokens[1], *tokens[2:])
+        self.blocking.signal(tokens[1])
+        return s.integer(length)
+
+    @command("RPUSH", -3, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _rpush(self, tokens, writer):
+        length = self.lists.rpush(tokens[1], *tokens[2:])
+        self.blocking.signal(tokens[1])
+        return s.integer(length)
+
+    @command("LPOP", 2, ("write", "fast"), (1, 1, 1))
+    def _lpop(self, tokens, writer):
+        return s.bulk_string(self.lists.lpop(tokens[1]))
+
+    @command("RPOP", 2, ("write", "fast"), (1, 1, 1))
+    def _rpop(self, tokens, writer):
+        return s.bulk_string(self.lists.rpop(tokens[1]))
+
+    @command("LMOVE", 5, ("write", "denyoom"), (1, 2, 1))
+    def _lmove(self, tokens, writer):
+        source, destination = tokens[1], tokens[2]
+        wherefrom, whereto = _parse_side(tokens[3]), _parse_side(tokens[4])
+        value = self.lists.lmove(source, destination, wherefrom, whereto)
+        if value is not None:
+            self.blocking.signal(destination)
+        return s.bulk_string(value)
+
+    @command("BLPOP", -3, ("write", "blocking"), (1, -2, 1))
+    def _blpop(self, tokens, writer):
+        return self._blocking_pop(tokens, "LPOP")
+
+    @command("BRPOP", -3, ("write", "blocking"), (1, -2, 1))
+    def _brpop(self, tokens, writer):
+        return self._blocking_pop(tokens, "RPOP")
+
+    def _blocking_pop(self, tokens, pop_command):
+        keys = tokens[1:-1]
+        timeout = _parse_timeout(tokens[-1])
+        pop = self.lists.lpop if pop_command == "LPOP" else self.lists.rpop
+
+        def serve(key):
+            try:
+                value = pop(key)
+            except WrongTypeError:
+                # The key changed type while we were blocked (e.g. inside
+                # a transaction); keep waiting for a list.
+                return None
+            if value is None:
                 return None
+            # Logged as the pop that actually happened.
+            self._log([pop_command, key])
+            return s.array([key, value])
+
+        self.propagate = []
+        for key in keys:
+            self.keyspace.lookup_typed(key, LIST)
+        for key in keys:
+            reply = serve(key)
+            if reply is not None:
+                return reply
+        return self._block(keys, serve, timeout, s.NULL_ARRAY)
+
+    @command("BLMOVE", 6, ("write", "denyoom", "blocking"), (1, 2, 1))
+    def _blmove(self, tokens, writer):
+        source, destination = tokens[1], tokens[2]
+        wherefrom, whereto = _parse_side(tokens[3]), _parse_side(tokens[4])
+        timeout = _parse_timeout(tokens[5])
+
+        def serve(key):
+            try:
+                value = self.lists.lmove(source, destination, wherefrom, whereto)
+            except WrongTypeError as e:
+                # The destination changed type while we were blocked.
+                return s.error(str(e), "WRONGTYPE")
+            if value is None:
+                return None
+            self._log(["LMOVE", source, destination, wherefrom, whereto])
+            self.blocking.signal(destination)
+            return s.bulk_string(value)
+
+        self.propagate = []
+        reply = serve(source)
+        if reply is not None:
+            return reply
+        return self._block([source], serve, timeout, s.NULL)
+
+    @command("LRANGE", 4, ("readonly",), (1, 1, 1))
+    def _lrange(self, tokens, writer):
+        return s.array(self.lists.lrange(tokens[1], _parse_int(tokens[2]), _parse_int(tokens[3])))
+
+    @command("LLEN", 2, ("readonly", "fast"), (1, 1, 1))
+    def _llen(self, tokens, writer):
+        return s.integer(self.lists.llen(tokens[1]))
+
+    @command("LINDEX", 3, ("readonly",), (1, 1, 1))
+    def _lindex(self, tokens, writer):
+        return s.bulk_string(self.lists.lindex(tokens[1], _parse_int(tokens[2])))
+
+    @command("LSET", 4, ("write", "denyoom"), (1, 1, 1))
+    def _lset(self, tokens, writer):
+        self.lists.lset(tokens[1], _parse_int(tokens[2]), tokens[3])
+        return s.OK
+
+    @command("LTRIM", 4, ("write",), (1, 1, 1))
+    def _ltrim(self, tokens, writer):
+        self.lists.ltrim(tokens[1], _parse_int(tokens[2]), _parse_int(tokens[3]))
+        return s.OK
 
-            elif cmd == "PUBLISH":
-                if len(tokens) != 3:
-                    return s.error("Usage: PUBLISH channel message")
-                count = await self.pubsub.publish(tokens[1], tokens[2])
-                return s.integer(count)
+    @command("LINSERT", 5, ("write", "denyoom"), (1, 1, 1))
+    def _linsert(self, tokens, writer):
+        where = tokens[2].upper()
+        if where not in ("BEFORE", "AFTER"):
+            return s.error("syntax error")
+        return s.integer(self.lists.linsert(tokens[1], tokens[3], tokens[4], after=where == "AFTER"))
+
+    @command("LREM", 4, ("write",), (1, 1, 1))
+    def _lrem(self, tokens, writer):
+        return s.integer(self.lists.lrem(tokens[1], _parse_int(tokens[2]), tokens[3]))
+
+    @command("LPOS", -3, ("readonly",), (1, 1, 1))
+    def _lpos(self, tokens, writer):
+        rank, count, maxlen = 1, None, 0
+        i = 3
+        while i < len(tokens):
+            opt = tokens[i].upper()
+            if i + 1 >= len(tokens) or opt not in ("RANK", "COUNT", "MAXLEN"):
+                return s.error("syntax error")
+            value = _parse_int(tokens[i + 1])
+            if opt == "RANK":
+                if value == 0:
+                    return s.error("RANK can't be zero: use 1 to start from the first match, "
+                                   "2 from the second ... or use negative to start from the end of the list")
+                rank = value
+            elif value < 0:
+                return s.error(f"{opt} can't be negative")
+            elif opt == "COUNT":
+                count = value
             else:
-                return s.error(f"Unknown command '{cmd}'")
+                maxlen = value
+            i += 2
+        positions = self.lists.lpos(tokens[1], tokens[2], rank, 1 if count is None else count, maxlen)
+        if count is not None:
+            return s.array(positions)
+        return s.integer(positions[0]) if positions else s.NULL
+
+    # --- SET Commands ---
+    @command("SADD", -3, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _sadd(self, tokens, writer):
+        return s.integer(self.sets.sadd(tokens[1], *tokens[2:]))
+
+    @command("SREM", -3, ("write", "fast"), (1, 1, 1))
+    def _srem(self, tokens, writer):
+        return s.integer(self.sets.srem(tokens[1], *tokens[2:]))
+
+    @command("SISMEMBER", 3, ("readonly", "fast"), (1, 1, 1))
+    def _sismember(self, tokens, writer):
+        return s.integer(int(self.sets.sismember(tokens[1], tokens[2])))
+
+    @command("SMEMBERS", 2, ("readonly",), (1, 1, 1))
+    def _smembers(self, tokens, writer):
+        return s.array(self.sets.smembers(tokens[1]))
+
+    @command("SMISMEMBER", -3, ("readonly", "fast"), (1, 1, 1))
+    def _smismember(self, tokens, writer):
+        return s.array(self.sets.smismember(tokens[1], *tokens[2:]))
+
+    @command("SCARD", 2, ("readonly", "fast"), (1, 1, 1))
+    def _scard(self, tokens, writer):
+        return s.integer(self.sets.scard(tokens[1]))
+
+    @command("SRANDMEMBER", -2, ("readonly",), (1, 1, 1))
+    def _srandmember(self, tokens, writer):
+        if len(tokens) > 3:
+            return s.error("syntax error")
+        if len(tokens) == 2:
+            return s.bulk_string(self.sets.srandmember(tokens[1]))
+        return s.array(self.sets.srandmember(tokens[1], _parse_int(tokens[2])))
+
+    @command("SPOP", -2, ("write", "fast"), (1, 1, 1))
+    def _spop(self, tokens, writer):
+        if len(tokens) > 3:
+            return s.error("syntax error")
+        key = tokens[1]
+        count = None
+        if len(tokens) == 3:
+            count = _parse_int(tokens[2])
+            if count < 0:
+                raise ValueError("value is out of range, must be positive")
+        popped = self.sets.spop(key, count)
+        # The choice is random, so log which members went.
+        members = popped if count is not None else [popped] if popped is not None else []
+        self.propagate = ["SREM", key] + members if members else []
+        return s.array(popped) if count is not None else s.bulk_string(popped)
+
+    @command("SINTER", -2, ("readonly",), (1, -1, 1))
+    def _sinter(self, tokens, writer):
+        return s.array(self.sets.sinter(*tokens[1:]))
+
+    @command("SUNION", -2, ("readonly",), (1, -1, 1))
+    def _sunion(self, tokens, writer):
+        return s.array(self.sets.sunion(*tokens[1:]))
+
+    @command("SDIFF", -2, ("readonly",), (1, -1, 1))
+    def _sdiff(self, tokens, writer):
+        return s.array(self.sets.sdiff(*tokens[1:]))
+
+    @command("SINTERSTORE", -3, ("write", "denyoom"), (1, -1, 1))
+    def _sinterstore(self, tokens, writer):
+        return s.integer(self.sets.store(tokens[1], self.sets.sinter(*tokens[2:])))
+
+    @command("SUNIONSTORE", -3, ("write", "denyoom"), (1, -1, 1))
+    def _sunionstore(self, tokens, writer):
+        return s.integer(self.sets.store(tokens[1], self.sets.sunion(*tokens[2:])))
+
+    @command("SDIFFSTORE", -3, ("write", "denyoom"), (1, -1, 1))
+    def _sdiffstore(self, tokens, writer):
+        return s.integer(self.sets.store(tokens[1], self.sets.sdiff(*tokens[2:])))
+
+    @command("SINTERCARD", -3, ("readonly", "movablekeys"), (2, 2, 1), getkeys=_numkeys_keys)
+    def _sintercard(self, tokens, writer):
+        numkeys = _parse_int(tokens[1])
+        if numkeys <= 0:
+            return s.error("numkeys should be greater than 0")
+        if numkeys > len(tokens) - 2:
+            return s.error("Number of keys can't be greater than number of args")
+        keys = tokens[2:2 + numkeys]
+        rest = tokens[2 + numkeys:]
+        limit = 0
+        if rest:
+            if len(rest) != 2 or rest[0].upper() != "LIMIT":
+                return s.error("syntax error")
+            limit = _parse_int(rest[1])
+            if limit < 0:
+                return s.error("LIMIT can't be negative")
+        return s.integer(self.sets.sintercard(*keys, limit=limit))
+
+    @command("SSCAN", -3, ("readonly",), (1, 1, 1))
+    def _sscan(self, tokens, writer):
+        cursor, members = self._scan_collection(tokens, SET)
+        return s.array([str(cursor), members])
+
+    def _scan_collection(self, tokens, type):
+        """Run an SSCAN/HSCAN/ZSCAN step; returns (next cursor, matching members)."""
+        cursor = _parse_cursor(tokens[2])
+        match, count, _ = _parse_scan_options(tokens[3:], allow_type=False)
+        obj = self.keyspace.lookup_typed(tokens[1], type)
+        if obj is None:
+            return 0, []
+        if encoding_of(obj) in ("intset", "listpack"):
+            # Small enough to return in one go, as Redis does.
+            cursor, members = 0, list(obj.value)
+        else:
+            cursor, members = obj.value.scan(cursor, count)
+        if match is not None:
+            members = [m for m in members if match(m)]
+        return cursor, members
+
+    # --- HASH Commands ---
+    @command("HSET", -4, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _hset(self, tokens, writer):
+        if len(tokens) % 2:
+            return s.error("wrong number of arguments for 'hset' command")
+        return s.integer(self.hashes.hset(tokens[1], *tokens[2:]))
+
+    @command("HMGET", -3, ("readonly", "fast"), (1, 1, 1))
+    def _hmget(self, tokens, writer):
+        return s.array(self.hashes.hmget(tokens[1], *tokens[2:]))
+
+    @command("HINCRBY", 4, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _hincrby(self, tokens, writer):
+        return s.integer(self.hashes.hincrby(tokens[1], tokens[2], _parse_int(tokens[3])))
+
+    @command("HGET", 3, ("readonly", "fast"), (1, 1, 1))
+    def _hget(self, tokens, writer):
+        return s.bulk_string(self.hashes.hget(tokens[1], tokens[2]))
+
+    @command("HGETALL", 2, ("readonly",), (1, 1, 1))
+    def _hgetall(self, tokens, writer):
+        return s.array(self.hashes.hgetall(tokens[1]))
+
+    @command("HDEL", -3, ("write", "fast"), (1, 1, 1))
+    def _hdel(self, tokens, writer):
+        return s.integer(self.hashes.hdel(tokens[1], *tokens[2:]))
+
+    @command("HSCAN", -3, ("readonly",), (1, 1, 1))
+    def _hscan(self, tokens, writer):
+        cursor, fields = self._scan_collection(tokens, HASH)
+        h = self.keyspace.data[tokens[1]].value if fields else None
+        reply = []
+        for field in fields:
+            reply += (field, h.get(field))
+        return s.array([str(cursor), reply])
+
+    # --- ZSET Commands ---
+    @command("ZADD", -4, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _zadd(self, tokens, writer):
+        flags = {"NX": False, "XX": False, "GT": False, "LT": False, "CH": False, "INCR": False}
+        i = 2
+        while i < len(tokens) and tokens[i].upper() in flags:
+            flags[tokens[i].upper()] = True
+            i += 1
+        pairs = tokens[i:]
+        incr = flags.pop("INCR")
+        ch = flags.pop("CH")
+        if not pairs or len(pairs) % 2:
+            return s.error("syntax error")
+        if flags["NX"] and flags["XX"]:
+            return s.error("XX and NX options at the same time are not compatible")
+        if (flags["GT"] and flags["LT"]) or (flags["NX"] and (flags["GT"] or flags["LT"])):
+            return s.error("GT, LT, and/or NX options at the same time are not compatible")
+        if incr and len(pairs) != 2:
+            return s.error("INCR option supports a single increment-element pair")
+        scores = [_parse_float(score) for score in pairs[::2]]
+
+        if incr:
+            score = self.zsets.zincrby(tokens[1], scores[0], pairs[1],
+                                       nx=flags["NX"], xx=flags["XX"], gt=flags["GT"], lt=flags["LT"])
+            return s.bulk_string(format_score(score) if score is not None else None)
+        score_members = [x for pair in zip(scores, pairs[1::2]) for x in pair]
+        return s.integer(self.zsets.zadd(tokens[1], *score_members, ch=ch,
+                                         nx=flags["NX"], xx=flags["XX"], gt=flags["GT"], lt=flags["LT"]))
+
+    @command("ZINCRBY", 4, ("write", "denyoom", "fast"), (1, 1, 1))
+    def _zincrby(self, tokens, writer):
+        score = self.zsets.zincrby(tokens[1], _parse_float(tokens[2]), tokens[3])
+        return s.bulk_string(format_score(score))
+
+    @command("ZREM", -3, ("write", "fast"), (1, 1, 1))
+    def _zrem(self, tokens, writer):
+        return s.integer(self.zsets.zrem(tokens[1], *tokens[2:]))
+
+    @command("ZSCORE", 3, ("readonly", "fast"), (1, 1, 1))
+    def _zscore(self, tokens, writer):
+        return s.bulk_string(self.zsets.zscore(tokens[1], tokens[2]))
+
+    @command("ZCARD", 2, ("readonly", "fast"), (1, 1, 1))
+    def _zcard(self, tokens, writer):
+        return s.integer(self.zsets.zcard(tokens[1]))
+
+    @command("ZRANK", 3, ("readonly", "fast"), (1, 1, 1))
+    def _zrank(self, tokens, writer):
+        rank = self.zsets.zrank(tokens[1], tokens[2])
+        return s.integer(rank) if rank is not None else s.NULL
+
+    @command("ZREVRANK", 3, ("readonly", "fast"), (1, 1, 1))
+    def _zrevrank(self, tokens, writer):
+        rank = self.zsets.zrank(tokens[1], tokens[2], reverse=True)
+        return s.integer(rank) if rank is not None else s.NULL
+
+    @command("ZRANGE", -4, ("readonly",), (1, 1, 1))
+    def _zrange(self, tokens, writer):
+        return self._zrange_generic(tokens, reverse=False)
+
+    @command("ZREVRANGE", -4, ("readonly",), (1, 1, 1))
+    def _zrevrange(self, tokens, writer):
+        return self._zrange_generic(tokens, reverse=True)
+
+    def _zrange_generic(self, tokens, reverse):
+        withscores = len(tokens) == 5 and tokens[4].upper() == "WITHSCORES"
+        if len(tokens) > 4 and not withscores:
+            return s.error("syntax error")
+        return s.array(self.zsets.zrange(tokens[1], _parse_int(tokens[2]), _parse_int(tokens[3]),
+                                         reverse=reverse, withscores=withscores))
+
+    @command("ZRANGEBYSCORE", -4, ("readonly",), (1, 1, 1))
+    def _zrangebyscore(self, tokens, writer):
+        return self._zrangebyscore_generic(tokens, reverse=False)
+
+    @command("ZREVRANGEBYSCORE", -4, ("readonly",), (1, 1, 1))
+    def _zrevrangebyscore(self, tokens, writer):
+        return self._zrangebyscore_generic(tokens, reverse=True)
+
+    def _zrangebyscore_generic(self, tokens, reverse):
+        # ZREVRANGEBYSCORE takes max before min.
+        low, high = (tokens[3], tokens[2]) if reverse else (tokens[2], tokens[3])
+        spec = _parse_score_range(low, high)
+        withscores = False
+        offset, count = 0, -1
+        i = 4
+        while i < len(tokens):
+            opt = tokens[i].upper()
+            if opt == "WITHSCORES":
+                withscores = True
+                i += 1
+            elif opt == "LIMIT" and i + 2 < len(tokens):
+                offset, count = _parse_int(tokens[i + 1]), _parse_int(tokens[i + 2])
+                i += 3
+            else:
+                return s.error("syntax error")
+        return s.array(self.zsets.zrangebyscore(tokens[1], spec, reverse=reverse, offset=offset,
+                                                count=count, withscores=withscores))
+
+    @command("ZCOUNT", 4, ("readonly", "fast"), (1, 1, 1))
+    def _zcount(self, tokens, writer):
+        return s.integer(self.zsets.zcount(tokens[1], _parse_score_range(tokens[2], tokens[3])))
+
+    @command("ZSCAN", -3, ("readonly",), (1, 1, 1))
+    def _zscan(self, tokens, writer):
+        cursor, members = self._scan_collection(tokens, ZSET)
+        scores = self.keyspace.data[tokens[1]].value.scores if members else None
+        reply = []
+        for member in members:
+            reply += (member, format_score(scores[member]))
+        return s.array([str(cursor), reply])
+
+    # --- Transactions ---
+    @command("MULTI", 1, ("fast",))
+    def _multi(self, tokens, writer):
+        self.transactions.multi(writer)
+        return s.OK
+
+    @command("EXEC", 1)
+    def _exec(self, tokens, writer):
+        tx = self.transactions.get(writer)
+        if tx is None or tx.queue is None:
+            raise ValueError("EXEC without MULTI")
+        queue = tx.queue
+        aborted = tx.dirty
+        changed = self.transactions.changed(tx)
+        self.transactions.reset(writer)
+        if aborted:
+            return s.error("Transaction discarded because of previous errors.", "EXECABORT")
+        if changed:
+            return s.NULL_ARRAY
+        # Run the queue back to back (nothing else can interleave, as
+        # handle() never yields) and log its writes as one record.
+        self.exec_log = []
+        try:
+            replies = [self.handle(tokens, writer) for tokens in queue]
+        finally:
+            logged, self.exec_log = self.exec_log, None
+        if len(logged) == 1:
+            self.aof.append(logged[0])
+        elif logged:
+            self.aof.append_many([["MULTI"], *logged, ["EXEC"]])
+        return s.reply_array(replies)
+
+    @command("DISCARD", 1, ("fast",))
+    def _discard(self, tokens, writer):
+        tx = self.transactions.get(writer)
+        if tx is None or tx.queue is None:
+            raise ValueError("DISCARD without MULTI")
+        self.transactions.reset(writer)
+        return s.OK
+
+    @command("WATCH", -2, ("fast",), (1, -1, 1))
+    def _watch(self, tokens, writer):
+        tx = self.transactions.get(writer)
+        if tx is not None and tx.queue is not None:
+            raise ValueError("WATCH inside MULTI is not allowed")
+        self.transactions.watch(writer, tokens[1:])
+        return s.OK
+
+    @command("UNWATCH", 1, ("fast",))
+    def _unwatch(self, tokens, writer):
+        # Inside MULTI this is queued, and EXEC has unwatched by the time it runs.
+        self.transactions.reset(writer)
+        return s.OK
+
+    # --- Pub/Sub Commands ---
+    @command("SUBSCRIBE", -2, ("pubsub",))
+    def _subscribe(self, tokens, writer):
+        if not writer:
+            return s.error("SUBSCRIBE requires a client connection.")
+        self.pubsub.subscribe_nowait(writer, *tokens[1:])
+        # Confirmations go back as the reply so they stay ordered
+        # with the rest of a pipelined batch.
+        return b"".join(s.array(["subscribe", channel, "1"]) for channel in tokens[1:])
+
+    @command("UNSUBSCRIBE", -2, ("pubsub",))
+    def _unsubscribe(self, tokens, writer):
+        if not writer:
+            return s.error("UNSUBSCRIBE requires a client connection.")
+        self.pubsub.unsubscribe_nowait(writer, *tokens[1:])
+        return b"".join(s.array(["unsubscribe", channel, "0"]) for channel in tokens[1:])
+
+    @command("PUBLISH", 3, ("pubsub", "fast"))
+    def _publish(self, tokens, writer):
+        return s.integer(self.pubsub.publish_nowait(tokens[1], tokens[2]))
+
+    def _check_slot(self, keys: list[str]):
+        """Return a redirect/error reply unless this shard owns every key."""
+        slot = key_hash_slot(keys[0])
+        for key in keys[1:]:
+            if key_hash_slot(key) != slot:
+                return s.error("Keys in request don't hash to the same slot", "CROSSSLOT")
+        if self.shard.owns(slot):
+            return None
+        owner = self.shard.shard_for_slot(slot)
+        return s.error(f"{slot} {self.shard.address(owner)}", "MOVED")
+
+    def _check_scope(self, spec: CommandSpec, writer):
+        """Return an error reply for a keyless command this worker can't
+        answer for the whole keyspace. Pub/sub channels aren't shared
+        between workers, and whole-keyspace commands only see one shard,
+        so they are served only on a worker's own port, where it is clear
+        which shard answers."""
+        if "pubsub" in spec.flags:
+            return s.error("pub/sub is not supported in sharded mode")
+        if spec.name in _PER_SHARD_COMMANDS and _local_port(writer) == self.shard.port:
+            return s.error(f"'{spec.name}' only sees one shard in sharded mode; "
+                           "send it to a worker's own port (see CLUSTER SLOTS)")
+        return None
+
+    def _block(self, keys, serve, timeout: float, timeout_reply: bytes):
+        """Park the client on keys, or inside EXEC (which must not wait)
+        reply as if the timeout had passed."""
+        if self.exec_log is not None:
+            return timeout_reply
+        return self.blocking.block(keys, serve, timeout, timeout_reply)
+
+    def _log(self, tokens: list[str]):
+        """Append a command to the AOF outside of handle()'s own logging."""
+        if self.loading:
+            return
+        if self.exec_log is None:
+            self.aof.append(tokens)
+        else:
+            self.exec_log.append(tokens)
+
+    def _push(self, writer, payload: bytes):
+        """Deliver a pub/sub message in order with the subscriber's replies,
+        which under appendfsync always may still be held for an fsync."""
+        self.aof.send_when_durable(writer.write, payload)
+
+    def client_closed(self, writer):
+        """Drop everything held for a connection that went away."""
+        self.pubsub.unsubscribe_nowait(writer, *list(self.pubsub.channels))
+        self.transactions.reset(writer)
+
+    def _delete_key(self, key: str):
+        self.keyspace.delete(key, lazy=config.LAZYFREE_LAZY_EXPIRE)
 
-        except Exception as e:
-            return s.error(str(e))
-        
-    def _delete_if_expired(self, key: str):
-        if self.expiry.is_expired(key):
-            self._delete_key_everywhere(key)
-
-    def _delete_key_everywhere(self, key: str):
-        self.store.delete(key)
-        self.lists.lists.pop(key, None)
-        self.sets.sets.pop(key, None)
-        self.hashes.hashes.pop(key, None)
-        self.zsets.scores.pop(key, None)
-        self.zsets.sorted.pop(key, None)
-        self.expiry.remove(key)
-        
     def rewrite_aof_log(self):
-        rewrite_aof(self)
-        os.replace("aof.log.rewrite", "aof.log")
\ No newline at end of file
+        path = self.aof.filepath
+        durable = self.aof.fsync != "no"
+        rewrite_aof(self, out_file=path + ".rewrite", fsync=durable)
+        self.aof.close()
+        os.replace(path + ".rewrite", path)
+        if durable:
+            fsync_dir(path)
+        self.aof = AOFWriter(path)
+
+
+def _loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def _parse_int(token: str) -> int:
+    try:
+        return int(token)
+    except ValueError:
+        raise ValueError("value is not an integer or out of range") from None
+
+
+def _parse_cursor(token: str) -> int:
+    try:
+        cursor = int(token)
+    except ValueError:
+        cursor = -1
+    if cursor < 0:
+        raise ValueError("invalid cursor")
+    return cursor
+
+
+def _parse_scan_options(tokens: list[str], allow_type: bool):
+    """Parse SCAN's [MATCH pattern] [COUNT count] [TYPE type] into
+    (match function or None, count, type or None)."""
+    match = type = None
+    count = 10
+    if len(tokens) % 2:
+        raise ValueError("syntax error")
+    for i in range(0, len(tokens), 2):
+        opt, arg = tokens[i].upper(), tokens[i + 1]
+        if opt == "MATCH":
+            match = None if arg == "*" else compile_glob(arg)
+        elif opt == "COUNT":
+            count = _parse_int(arg)
+            if count < 1:
+                raise ValueError("syntax error")
+        elif opt == "TYPE" and allow_type:
+            type = arg.lower()
+        else:
+            raise ValueError("syntax error")
+    return match, count, type
+
+
+def _parse_side(token: str) -> str:
+    side = token.upper()
+    if side not in ("LEFT", "RIGHT"):
+        raise ValueError("syntax error")
+    return side
+
+
+def _parse_timeout(token: str) -> float:
+    """A blocking command's timeout in seconds; 0 blocks forever."""
+    timeout = string_to_float(token)
+    if timeout is None or math.isinf(timeout):
+        raise ValueError("timeout is not a float or out of range")
+    if timeout < 0:
+        raise ValueError("timeout is negative")
+    return timeout
+
+
+def _parse_float(token: str) -> float:
+    value = string_to_float(token)
+    if value is None:
+        raise ValueError("value is not a valid float")
+    return value
+
+
+def _parse_score_range(low: str, high: str) -> ScoreRange:
+    """Parse ZRANGEBYSCORE-style bounds: a number, -inf/+inf, or (number for exclusive."""
+    bounds = []
+    for token in (low, high):
+        exclusive = token.startswith("(")
+        value = string_to_float(token[1:] if exclusive else token)
+        if value is None:
+            raise ValueError("min or max is not a float")
+        bounds.append((value, exclusive))
+    (low_value, minex), (high_value, maxex) = bounds
+    return ScoreRange(low_value, high_value, minex, maxex)
+
+
+def _parse_deadline(unit: str, token: str, command: str, allow_past: bool = False) -> int:
+    """Turn an EX/PX/EXAT/PXAT argument into an absolute unix time in ms."""
+    n = _parse_int(token)
+    if not allow_past and n <= 0:
+        raise ValueError(f"invalid expire time in '{command}' command")
+    if unit in ("EX", "EXAT"):
+        n *= 1000
+    return n + mstime() if unit in ("EX", "PX") else n
+
+
+# Run even inside MULTI rather than being queued.
+_TRANSACTION_COMMANDS = frozenset(("multi", "exec", "discard", "watch"))
+# Commands about the whole keyspace or server, which in sharded mode only
+# cover the worker that runs them.
+_PER_SHARD_COMMANDS = frozenset(("keys", "scan", "dbsize", "flushdb", "flushall",
+                                 "info", "memory", "bgrewriteaof"))
+
+
+def _local_port(writer) -> int | None:
+    """The port a client connected to (None without a connection)."""
+    sockname = writer.get_extra_info("sockname") if writer is not None else None
+    return sockname[1] if sockname else None
+
+
+# INFO section name -> method returning (field, value) pairs, in output order.
+INFO_SECTIONS = {
+    "clients": CommandHandler._info_clients,
+    "memory": CommandHandler._info_memory,
+    "persistence": CommandHandler._info_persistence,
+    "stats": CommandHandler._info_stats,
+    "keyspace": CommandHandler._info_keyspace,
+}
@@ -0,0 +1,94 @@
+# server/sharding.py
+
+# Multi-process sharded mode.
+#
+# Keys are mapped to one of 16384 hash slots exactly like Redis Cluster
+# (CRC16 of the key, or of its {hash tag}), and each worker process owns a
+# contiguous range of slots. Every worker listens on the shared port with
+# SO_REUSEPORT, so the kernel spreads new connections across processes, and
+# on a port of its own (port + 1 + shard). A command whose key lives on
+# another shard is answered with -MOVED <slot> <host>:<port>, so cluster-aware
+# clients learn the slot map and talk to the owning worker directly.
+#
+# Workers share nothing else: pub/sub is refused in this mode, and commands
+# about the whole keyspace (KEYS, SCAN, DBSIZE, FLUSHALL, INFO...) are only
+# answered on a worker's own port, for that worker's shard.
+
+import binascii
+import multiprocessing
+import os
+import config
+
+HASH_SLOTS = 16384
+
+
+def key_hash_slot(key: str) -> int:
+    data = key.encode("utf-8", "surrogateescape")
+    start = data.find(b"{")
+    if start != -1:
+        end = data.find(b"}", start + 1)
+        if end > start + 1:
+            data = data[start + 1:end]
+    # CRC-16/XMODEM, the same checksum Redis Cluster uses.
+    return binascii.crc_hqx(data, 0) & (HASH_SLOTS - 1)
+
+
+def shard_aof_path(aof_path: str, shard: int) -> str:
+    root, ext = os.path.splitext(aof_path)
+    return f"{root}.shard{shard}{ext}"
+
+
+class ShardMap:
+    """The slot layout as seen from one worker."""
+
+    def __init__(self, index: int, count: int, host: str, port: int):
+        self.index = index
+        self.count = count
+        self.host = host
+        self.port = port
+
+    def shard_for_slot(self, slot: int) -> int:
+        return slot * self.count // HASH_SLOTS
+
+    def owns(self, slot: int) -> bool:
+        return self.shard_for_slot(slot) == self.index
+
+    def shard_port(self, shard: int) -> int:
+        return self.port + 1 + shard
+
+    def address(self, shard: int) -> str:
+        return f"{self.host}:{self.shard_port(shard)}"
+
+    def slot_ranges(self) -> list[tuple[int, int, int]]:
+        """(first_slot, last_slot, shard) for every shard."""
+        ranges = []
+        for shard in range(self.count):
+            first = -(-shard * HASH_SLOTS // self.count)
+            last = -(-(shard + 1) * HASH_SLOTS // self.count) - 1
+            ranges.append((first, last, shard))
+        return ranges
+
+
+def run_sharded(workers: int, host: str = "0.0.0.0", port: int = 6379, aof_path: str = "aof.log"):
+    """Start one server process per shard and wait for them."""
+    from server.tcp_server import run_server
+
+    processes = []
+    for index in range(workers):
+        shard = ShardMap(index, workers, config.SHARD_ANNOUNCE_HOST, port)
+        process = multiprocessing.Process(
+            target=run_server,
+            kwargs=dict(host=host, port=port, aof_path=shard_aof_path(aof_path, index), shard=shard),
+            name=f"shard-{index}",
+        )
+        process.start()
+        processes.append(process)
+
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
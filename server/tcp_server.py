@@ -1,57 +1,261 @@
 # server/tcp_server.py
 
 import asyncio
+import config
 from server.command_router import CommandHandler
+from server.sharding import ShardMap
 from persistence.aof_replayer import replay_aof
+from protocol.parser import RESPParser, NEED_MORE, ProtocolError
+from protocol.serializer import ResponseBuilder
+
+# How much to pull off the socket per read. Pipelined clients send many
+# commands back to back, so one read usually holds a whole batch.
+READ_CHUNK_SIZE = 64 * 1024
+# Unparsed bytes a blocked connection (BLPOP...) may queue up behind the
+# blocking command before reading stops until it is answered.
+MAX_BLOCKED_BUFFER = 1024 * 1024
+
+
+class RESPProtocol(asyncio.Protocol):
+    """Low-level transport for one client connection.
+
+    data_received() feeds the parser directly and answers the whole batch
+    with one transport.write(), so a command costs no coroutine switches or
+    futures. Under appendfsync always the write waits for the AOF's group
+    fsync at the end of the loop tick. The transport itself is handed to the command handler as the
+    connection's writer (for pub/sub delivery).
+
+    A blocking command (BLPOP...) answers with a future instead of bytes.
+    The rest of the connection's pipeline then waits in the parser until
+    the future resolves, so replies stay in order. Reading carries on
+    while blocked (new bytes are only buffered), so a client that hangs
+    up is noticed and its waiter cancelled instead of being handed an
+    element nobody will receive. Once MAX_BLOCKED_BUFFER bytes are
+    waiting, reading pauses until the command is answered.
+    """
+
+    def __init__(self, handler: CommandHandler):
+        self.handler = handler
+        self.parser = RESPParser()
+        self.replies = ResponseBuilder()
+        self.transport = None
+        # The reply this connection is blocked on, if any.
+        self.blocked: asyncio.Future | None = None
+        # Why reading is paused: the client isn't reading its replies, or
+        # too much is queued behind a blocked command.
+        self.writing_paused = False
+        self.backlogged = False
+
+    def connection_made(self, transport: asyncio.Transport):
+        self.transport = transport
+
+    def data_received(self, data: bytes):
+        self.parser.feed(data)
+        if self.blocked is None:
+            self._run_commands()
+        self._check_backlog()
+
+    def _check_backlog(self):
+        backlogged = self.blocked is not None and self.parser.buffered > MAX_BLOCKED_BUFFER
+        if backlogged != self.backlogged:
+            self.backlogged = backlogged
+            self._update_reading()
+
+    def _update_reading(self):
+        if self.transport.is_closing():
+            return
+        if self.writing_paused or self.backlogged:
+            self.transport.pause_reading()
+        else:
+            self.transport.resume_reading()
+
+    def _run_commands(self):
+        parser = self.parser
+        replies = self.replies
+        handle = self.handler.handle
+        transport = self.transport
+        try:
+            while (tokens := parser.parse()) is not NEED_MORE:
+                if not isinstance(tokens, list):
+                    raise ProtocolError("expected a command array")
+                response = handle(tokens, transport)
+                if isinstance(response, asyncio.Future):
+                    self.blocked = response
+                    response.add_done_callback(self._unblock)
+                    break
+                if response is not None:
+                    replies.write(response)
+        except Exception as e:
+            replies.error(str(e))
+            transport.write(replies.take())
+            transport.close()
+            return
+        if replies:
+            self.handler.aof.send_when_durable(transport.write, replies.take())
+
+    def _unblock(self, future: asyncio.Future):
+        self.blocked = None
+        if future.cancelled() or self.transport.is_closing():
+            return
+        self.handler.aof.send_when_durable(self.transport.write, future.result())
+        self._run_commands()
+        self._check_backlog()
+
+    def pause_writing(self):
+        # The client isn't reading its replies; stop reading its commands
+        # until the transport buffer drains.
+        self.writing_paused = True
+        self._update_reading()
+
+    def resume_writing(self):
+        self.writing_paused = False
+        self._update_reading()
+
+    def connection_lost(self, exc):
+        if self.blocked is not None:
+            self.blocked.cancel()
+        self.handler.client_closed(self.transport)
+
+
+async def _wait_blocked(reader: asyncio.StreamReader, parser: RESPParser, future: asyncio.Future):
+    """Wait for a blocked command's reply while still reading from the
+    client, buffering what it sends in parser, so a disconnect cancels the
+    waiter. Returns None if the client went away. Reading stops once
+    MAX_BLOCKED_BUFFER bytes are buffered."""
+    while not future.done():
+        if parser.buffered > MAX_BLOCKED_BUFFER:
+            try:
+                await asyncio.wait((future,))
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            break
+        read = asyncio.ensure_future(reader.read(READ_CHUNK_SIZE))
+        try:
+            await asyncio.wait((read, future), return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            read.cancel()
+            future.cancel()
+            raise
+        if not read.done():
+            # Let the read finish cancelling so the next one may start.
+            read.cancel()
+            await asyncio.wait((read,))
+            break
+        try:
+            data = read.result()
+        except Exception:
+            data = b""
+        if not data:
+            future.cancel()
+            return None
+        parser.feed(data)
+    return future.result()
+
 
 async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, handler: CommandHandler):
     addr = writer.get_extra_info('peername')
-    while True:
+    parser = RESPParser()
+    replies = ResponseBuilder()
+    hung_up = False
+    while not hung_up:
         try:
-            data = await reader.readline()
+            data = await reader.read(READ_CHUNK_SIZE)
             if not data:
                 break
+            parser.feed(data)
 
-            # RESP parsing
-            command_line = data.decode().strip()
-            if command_line.startswith("*"):
-                # Multi-bulk RESP array
-                count = int(command_line[1:])
-                tokens = []
-                for _ in range(count):
-                    await reader.readline()  # skip $<len>
-                    value = (await reader.readline()).decode().strip()
-                    tokens.append(value)
-            else:
-                tokens = command_line.split()
-
-            response = await handler.handle(tokens, writer)
-            if response is not None:
-                writer.write(response.encode())
+            # Run every complete command in the buffer in order, then flush
+            # the replies with a single write/drain instead of one per command.
+            while (tokens := parser.parse()) is not NEED_MORE:
+                if not isinstance(tokens, list):
+                    raise ProtocolError("expected a command array")
+                response = handler.handle(tokens, writer)
+                if isinstance(response, asyncio.Future):
+                    # Blocked (BLPOP...): send what we have and wait.
+                    if replies:
+                        handler.aof.send_when_durable(writer.write, replies.take())
+                    response = await _wait_blocked(reader, parser, response)
+                    if response is None:
+                        hung_up = True  # the client went away while blocked
+                        break
+                if response is not None:
+                    replies.write(response)
+            if replies:
+                handler.aof.send_when_durable(writer.write, replies.take())
                 await writer.drain()
 
         except Exception as e:
-            writer.write(f"-ERR {str(e)}\r\n".encode())
+            replies.error(str(e))
+            writer.write(replies.take())
             await writer.drain()
             break
 
+    handler.client_closed(writer)
     writer.close()
     await writer.wait_closed()
 
 
-async def start_server():
-    handler = CommandHandler()
+async def create_server(handler: CommandHandler, host: str, port: int, transport: str | None = None,
+                        reuse_port: bool = False):
+    """Listen for clients using the configured transport.
+
+    "protocol" serves connections with RESPProtocol; "streams" keeps the
+    StreamReader/StreamWriter loop in handle_client as a fallback.
+    """
+    transport = transport or config.SERVER_TRANSPORT
+    if transport == "protocol":
+        loop = asyncio.get_running_loop()
+        return await loop.create_server(lambda: RESPProtocol(handler), host=host, port=port,
+                                        reuse_port=reuse_port or None)
+    if transport == "streams":
+        return await asyncio.start_server(
+            lambda r, w: handle_client(r, w, handler), host=host, port=port,
+            reuse_port=reuse_port or None
+        )
+    raise ValueError(f"Unknown server transport: {transport}")
+
+
+async def start_server(host: str = "0.0.0.0", port: int = 6379, aof_path: str = "aof.log",
+                       transport: str | None = None, shard: ShardMap | None = None):
+    handler = CommandHandler(aof_path, shard)
 
     # Replay past state
-    await replay_aof("aof.log", handler)
-    
+    handler.loading = True
+    replay_aof(aof_path, handler)
+    handler.loading = False
+    # A MULTI cut off at the end of the file never ran; drop its queue.
+    handler.transactions.reset(None)
+
     # Start GC task
-    asyncio.create_task(handler.expiry.run_gc(handler._delete_key_everywhere, interval=1))
+    asyncio.create_task(handler.expiry.run_gc(handler._delete_key, interval=1))
+    asyncio.create_task(handler.keyspace.run_memory_recount(config.MEMORY_RECOUNT_INTERVAL))
+    asyncio.create_task(handler.keyspace.lazyfree.run())
 
-    server = await asyncio.start_server(
-        lambda r, w: handle_client(r, w, handler), host="0.0.0.0", port=6379
-    )
+    if shard is None:
+        server = await create_server(handler, host, port, transport)
+        print(f"🚀 Redis clone running on port {port}")
+        async with server:
+            await server.serve_forever()
+        return
 
-    print("🚀 Redis clone running on port 6379")
-    async with server:
-        await server.serve_forever()
+    # Sharded worker: share the public port with the other workers and
+    # listen on a port of our own for clients following -MOVED redirects.
+    shared = await create_server(handler, host, port, transport, reuse_port=True)
+    own_port = shard.shard_port(shard.index)
+    private = await create_server(handler, host, own_port, transport)
+    print(f"🚀 Redis clone shard {shard.index}/{shard.count} running on ports {port} and {own_port}")
+    async with shared, private:
+        await asyncio.gather(shared.serve_forever(), private.serve_forever())
+
+
+def run_server(**kwargs):
+    """Run start_server() to completion, on uvloop when it is installed."""
+    if config.USE_UVLOOP:
+        try:
+            import uvloop
+        except ImportError:
+            uvloop = None
+        if uvloop is not None:
+            return uvloop.run(start_server(**kwargs))
+    return asyncio.run(start_server(**kwargs))
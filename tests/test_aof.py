@@ -1,5 +1,7 @@
 # tests/test_aof.py
 
+import asyncio
+import threading
 import unittest
 import os
 from persistence.aof_writer import AOFWriter
@@ -48,6 +50,20 @@ class TestAOF(unittest.TestCase):
             ["ZADD", "myz", "1", "x"]
         ])
 
+    def test_replay_binary_and_crlf_values(self):
+        handler = MockCommandHandler()
+        writer = AOFWriter(filepath=self.test_file)
+        writer.append(["SET", "k", "line\r\nbreak"])
+        writer.append(["SET", "caf\u00e9", "\udcff"])
+        writer.close()
+
+        replay_aof(self.test_file, handler)
+
+        self.assertEqual(handler.calls, [
+            ["SET", "k", "line\r\nbreak"],
+            ["SET", "caf\u00e9", "\udcff"]
+        ])
+
     def test_replay_ignores_non_resp_lines(self):
         with open(self.test_file, "w") as f:
             f.write("NOTRESP\n")
@@ -69,6 +85,117 @@ class TestAOF(unittest.TestCase):
         replay_aof("nonexistent_file.log", handler)
         self.assertEqual(handler.calls, [])
 
+    def test_unknown_fsync_policy(self):
+        with self.assertRaises(ValueError):
+            AOFWriter(filepath=self.test_file, fsync="sometimes")
+
+
+class TestAOFFsyncPolicies(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.test_file = "test_aof_fsync.log"
+
+    def tearDown(self):
+        if os.path.exists(self.test_file):
+            os.remove(self.test_file)
+
+    async def test_appends_in_a_tick_share_one_write(self):
+        writer = AOFWriter(filepath=self.test_file, fsync="no")
+        writer.append(["SET", "a", "1"])
+        writer.append(["SET", "b", "2"])
+        self.assertEqual(os.path.getsize(self.test_file), 0)
+        await asyncio.sleep(0)
+        self.assertFalse(writer.buffer)
+        await self.drained(writer)
+        self.assertEqual(os.path.getsize(self.test_file), 2 * len(b"*3\r\n$3\r\nSET\r\n$1\r\na\r\n$1\r\n1\r\n"))
+        self.assertEqual(writer.writes, 1)
+        writer.close()
+
+    async def test_always_holds_replies_for_the_group_fsync(self):
+        writer = AOFWriter(filepath=self.test_file, fsync="always")
+        sent = []
+        writer.send_when_durable(sent.append, b"+PONG\r\n")  # nothing pending
+        writer.append(["SET", "a", "1"])
+        writer.send_when_durable(sent.append, b"+OK\r\n")
+        writer.append(["SET", "b", "2"])
+        writer.send_when_durable(sent.append, b"+OK2\r\n")
+        self.assertEqual(sent, [b"+PONG\r\n"])
+        await asyncio.sleep(0)
+        # Handed to the writer thread; a read-only reply now queues behind.
+        writer.send_when_durable(sent.append, b"+PONG2\r\n")
+        self.assertEqual(sent, [b"+PONG\r\n"])
+        await self.drained(writer)
+        await asyncio.sleep(0)
+        self.assertEqual(sent, [b"+PONG\r\n", b"+OK\r\n", b"+OK2\r\n", b"+PONG2\r\n"])
+        self.assertEqual(writer.fsyncs, 1)
+        writer.close()
+
+    async def test_everysec_syncs_in_the_background(self):
+        writer = AOFWriter(filepath=self.test_file, fsync="everysec")
+        sent = []
+        writer.append(["SET", "a", "1"])
+        writer.send_when_durable(sent.append, b"+OK\r\n")
+        self.assertEqual(sent, [b"+OK\r\n"])
+        await asyncio.sleep(0)
+        await self.drained(writer)
+        self.assertTrue(writer.unsynced)
+        writer.close()
+        self.assertFalse(writer.thread.is_alive())
+
+    async def test_full_queue_drops_blocks_when_asked(self):
+        writer = AOFWriter(filepath=self.test_file, fsync="no", queue_size=1, when_full="drop")
+        # Stall the writer thread on one block, as a slow disk would, and
+        # fill the queue behind it.
+        disk = threading.Event()
+        write = writer._write
+        writer._write = lambda data, sync: disk.wait() and write(data, sync)
+        writer.queue.put((b"", False))
+        while writer.queue.qsize():
+            await asyncio.sleep(0.001)
+        writer.queue.put((b"", False))
+        writer.append(["SET", "a", "1"])
+        await asyncio.sleep(0)
+        stats = dict(writer.stats())
+        self.assertEqual(stats["aof_dropped_blocks"], 1)
+        self.assertGreater(stats["aof_dropped_bytes"], 0)
+        disk.set()
+        writer.close()
+
+    async def test_always_never_drops_held_replies(self):
+        writer = AOFWriter(filepath=self.test_file, fsync="always", queue_size=1, when_full="drop")
+        disk = threading.Event()
+        write = writer._write
+        writer._write = lambda data, sync: disk.wait() and write(data, sync)
+        writer.queue.put((b"", False))
+        while writer.queue.qsize():
+            await asyncio.sleep(0.001)
+        writer.queue.put((b"", False))
+        writer.append(["SET", "a", "1"])
+        sent = []
+        writer.send_when_durable(sent.append, b"+OK\r\n")
+        # The flush waits for room instead of dropping the block.
+        threading.Timer(0.05, disk.set).start()
+        while not sent:
+            await asyncio.sleep(0.001)
+        self.assertEqual(dict(writer.stats())["aof_dropped_blocks"], 0)
+        with open(self.test_file, "rb") as f:
+            self.assertIn(b"SET", f.read())
+        writer.close()
+
+    async def test_metrics(self):
+        writer = AOFWriter(filepath=self.test_file, fsync="always")
+        writer.append(["SET", "a", "1"])
+        self.assertGreater(dict(writer.stats())["aof_pending_bytes"], 0)
+        await asyncio.sleep(0)
+        await self.drained(writer)
+        stats = dict(writer.stats())
+        self.assertEqual((stats["aof_queue_depth"], stats["aof_pending_bytes"]), (0, 0))
+        self.assertEqual((stats["aof_writes"], stats["aof_fsyncs"]), (1, 1))
+        self.assertGreater(stats["aof_write_latency_max_us"], 0)
+        writer.close()
+
+    async def drained(self, writer):
+        await asyncio.to_thread(writer.queue.join)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -2,49 +2,22 @@
 
 import unittest
 import os
+from datastore import Keyspace, BaseStore, ListStore, SetStore, HashStore, ZSetStore
 from persistence.aof_compactor import rewrite_aof
 
 class MockCommandHandler:
     def __init__(self):
-        self.store = MockBaseStore()
-        self.lists = MockListStore()
-        self.sets = MockSetStore()
-        self.hashes = MockHashStore()
-        self.zsets = MockZSetStore()
-
-class MockBaseStore:
-    def __init__(self):
-        self.store = {
-            "foo": ("bar", None),
-            "hello": ("world", None)
-        }
-
-class MockListStore:
-    def __init__(self):
-        self.lists = {
-            "mylist": ["a", "b", "c"]
-        }
-
-class MockSetStore:
-    def __init__(self):
-        self.sets = {
-            "myset": {"x", "y"}
-        }
-
-class MockHashStore:
-    def __init__(self):
-        self.hashes = {
-            "myhash": {"name": "Alice", "age": "30"}
-        }
-
-class MockZSetStore:
-    def __init__(self):
-        self.scores = {
-            "myzset": {"one": 1.0, "two": 2.5}
-        }
-        self.sorted = {
-            "myzset": [(1.0, "one"), (2.5, "two")]
-        }
+        self.keyspace = Keyspace()
+        BaseStore(self.keyspace).set("foo", "bar")
+        BaseStore(self.keyspace).set("hello", "world")
+        ListStore(self.keyspace).rpush("mylist", "a", "b", "c")
+        SetStore(self.keyspace).sadd("myset", "x", "y")
+        hashes = HashStore(self.keyspace)
+        hashes.hset("myhash", "name", "Alice")
+        hashes.hset("myhash", "age", "30")
+        zsets = ZSetStore(self.keyspace)
+        zsets.zadd("myzset", 1.0, "one")
+        zsets.zadd("myzset", 2.5, "two")
 
 class TestAOFCompactor(unittest.TestCase):
     def setUp(self):
@@ -67,23 +40,35 @@ class TestAOFCompactor(unittest.TestCase):
         self.assertIn("*3\r\n$3\r\nSET\r\n$3\r\nfoo\r\n$3\r\nbar\r\n", content)
         self.assertIn("*5\r\n$5\r\nRPUSH\r\n$6\r\nmylist\r\n$1\r\na\r\n$1\r\nb\r\n$1\r\nc\r\n", content)
         self.assertIn("*4\r\n$4\r\nSADD\r\n$5\r\nmyset\r\n$1\r\nx\r\n$1\r\ny\r\n", content)
-        self.assertIn("*4\r\n$4\r\nHSET\r\n$6\r\nmyhash\r\n$4\r\nname\r\n$5\r\nAlice\r\n", content)
-        self.assertIn("*4\r\n$4\r\nZADD\r\n$6\r\nmyzset\r\n$3\r\n1.0\r\n$3\r\none\r\n", content)
+        self.assertIn("*6\r\n$4\r\nHSET\r\n$6\r\nmyhash\r\n$4\r\nname\r\n$5\r\nAlice\r\n$3\r\nage\r\n$2\r\n30\r\n", content)
+        self.assertIn("*6\r\n$4\r\nZADD\r\n$6\r\nmyzset\r\n$3\r\n1.0\r\n$3\r\none\r\n$3\r\n2.5\r\n$3\r\ntwo\r\n", content)
+
+    def test_rewrite_skips_expired_keys(self):
+        handler = MockCommandHandler()
+        handler.keyspace.data["foo"].expire_at = 0
+        rewrite_aof(handler, out_file=self.outfile)
+
+        with open(self.outfile, "rb") as f:
+            content = f.read()
+
+        self.assertNotIn(b"$3\r\nfoo\r\n", content)
+        self.assertIn(b"$5\r\nhello\r\n", content)
+
+    def test_rewrite_keeps_ttl_as_absolute_deadline(self):
+        handler = MockCommandHandler()
+        handler.keyspace.set_expire("foo", handler.keyspace.data["foo"], 4102444800000)
+        rewrite_aof(handler, out_file=self.outfile)
+
+        with open(self.outfile, "rb") as f:
+            content = f.read()
+
+        self.assertIn(b"*3\r\n$9\r\nPEXPIREAT\r\n$3\r\nfoo\r\n$13\r\n4102444800000\r\n", content)
+        self.assertNotIn(b"PEXPIREAT\r\n$5\r\nhello", content)
 
     def test_rewrite_empty_stores(self):
         class EmptyHandler:
             def __init__(self):
-                self.store = MockBaseStore()
-                self.store.store.clear()
-                self.lists = MockListStore()
-                self.lists.lists.clear()
-                self.sets = MockSetStore()
-                self.sets.sets.clear()
-                self.hashes = MockHashStore()
-                self.hashes.hashes.clear()
-                self.zsets = MockZSetStore()
-                self.zsets.scores.clear()
-                self.zsets.sorted.clear()
+                self.keyspace = Keyspace()
 
         rewrite_aof(EmptyHandler(), out_file=self.outfile)
 
@@ -0,0 +1,113 @@
+# tests/test_aof_rewriter.py
+
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+from persistence.aof_replayer import replay_aof
+from server.command_router import CommandHandler
+
+class TestBackgroundRewrite(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        fd, self.aof_path = tempfile.mkstemp(suffix=".aof")
+        os.close(fd)
+        self.handler = CommandHandler(aof_path=self.aof_path)
+
+    def tearDown(self):
+        self.handler.aof.close()
+        for path in (self.aof_path, self.aof_path + ".rewrite"):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def replayed(self) -> CommandHandler:
+        fd, copy = tempfile.mkstemp(suffix=".aof")
+        os.close(fd)
+        with open(self.aof_path, "rb") as src, open(copy, "wb") as dst:
+            dst.write(src.read())
+        handler = CommandHandler(aof_path=copy)
+        handler.loading = True
+        replay_aof(copy, handler)
+        handler.loading = False
+        handler.aof.close()
+        os.remove(copy)
+        return handler
+
+    async def test_writes_during_rewrite_are_kept(self):
+        handle = self.handler.handle
+        for i in range(3000):
+            handle(["SET", f"k{i}", "v"])
+        for _ in range(500):
+            handle(["INCR", "counter"])
+        await asyncio.sleep(0)
+        size_before = os.path.getsize(self.aof_path)
+
+        self.assertEqual(handle(["BGREWRITEAOF"]), b"+Background AOF rewrite started\r\n")
+        self.assertIn(b"already in progress", handle(["BGREWRITEAOF"]))
+        self.assertIn(b"aof_rewrite_in_progress:1", handle(["INFO", "persistence"]))
+        # Not in the child's snapshot: these must come from the rewrite buffer.
+        handle(["INCR", "counter"])
+        handle(["RPUSH", "later", "a", "b"])
+        handle(["DEL", "k0"])
+        self.assertTrue(await asyncio.wait_for(self.handler.rewriter.done, 10))
+
+        handle(["SET", "after", "1"])  # goes to the new file
+        await asyncio.sleep(0)
+        await asyncio.to_thread(self.handler.aof.queue.join)
+        self.assertLess(os.path.getsize(self.aof_path), size_before)
+
+        replayed = self.replayed()
+        self.assertEqual(replayed.handle(["GET", "counter"]), b"$3\r\n501\r\n")
+        self.assertEqual(replayed.handle(["LRANGE", "later", "0", "-1"]), b"*2\r\n$1\r\na\r\n$1\r\nb\r\n")
+        self.assertEqual(replayed.handle(["EXISTS", "k0", "k1", "after"]), b":2\r\n")
+        self.assertEqual(replayed.handle(["DBSIZE"]), b":3002\r\n")
+
+        info = handle(["INFO", "persistence"])
+        self.assertIn(b"aof_rewrite_in_progress:0", info)
+        self.assertIn(b"aof_last_bgrewrite_status:ok", info)
+        self.assertIn(b"aof_rewrites:1", info)
+
+    async def test_failed_rewrite_keeps_the_old_file(self):
+        self.handler.handle(["SET", "k", "v"])
+        await asyncio.sleep(0)
+        await asyncio.to_thread(self.handler.aof.queue.join)
+        with open(self.aof_path, "rb") as f:
+            before = f.read()
+        with mock.patch("persistence.aof_rewriter.rewrite_aof", side_effect=OSError("disk full")):
+            self.handler.handle(["BGREWRITEAOF"])
+        self.assertFalse(await asyncio.wait_for(self.handler.rewriter.done, 10))
+        self.assertIsNone(self.handler.aof.rewrite_buffer)
+        self.assertFalse(os.path.exists(self.aof_path + ".rewrite"))
+        with open(self.aof_path, "rb") as f:
+            self.assertEqual(f.read(), before)
+        self.assertIn(b"aof_last_bgrewrite_status:err", self.handler.handle(["INFO", "persistence"]))
+
+    async def test_rename_is_made_durable(self):
+        self.handler.handle(["SET", "k", "v"])
+        with mock.patch("persistence.aof_writer.fsync_dir") as fsync_dir:
+            self.handler.handle(["BGREWRITEAOF"])
+            self.assertTrue(await asyncio.wait_for(self.handler.rewriter.done, 10))
+        fsync_dir.assert_called_once_with(self.aof_path)
+
+    async def test_big_keys_are_rewritten_in_batches(self):
+        handle = self.handler.handle
+        handle(["HSET", "h"] + [f"f{i}" for i in range(150) for _ in (0, 1)])
+        handle(["ZADD", "z"] + [token for i in range(150) for token in (str(i), f"m{i}")])
+        handle(["BGREWRITEAOF"])
+        self.assertTrue(await asyncio.wait_for(self.handler.rewriter.done, 10))
+        with open(self.aof_path, "rb") as f:
+            content = f.read()
+        # 150 elements at 64 per command: 64 + 64 + 22.
+        self.assertEqual(content.count(b"$4\r\nHSET\r\n"), 3)
+        self.assertEqual(content.count(b"$4\r\nZADD\r\n"), 3)
+        self.assertEqual(content.count(b"*130\r\n"), 4)
+
+        replayed = self.replayed()
+        self.assertEqual(replayed.handle(["HGETALL", "h"]), handle(["HGETALL", "h"]))
+        self.assertEqual(replayed.handle(["HGET", "h", "f149"]), b"$4\r\nf149\r\n")
+        self.assertEqual(replayed.handle(["ZCARD", "z"]), b":150\r\n")
+        self.assertEqual(replayed.handle(["ZRANGE", "z", "0", "-1", "WITHSCORES"]),
+                         handle(["ZRANGE", "z", "0", "-1", "WITHSCORES"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -27,7 +27,7 @@ class TestBaseStore(unittest.TestCase):
         self.ds.set("foo", "bar")
         self.assertTrue(self.ds.expire("foo", 2))
         ttl1 = self.ds.ttl("foo")
-        self.assertTrue(0 <= ttl1 <= 1)
+        self.assertTrue(0 <= ttl1 <= 2)
         time.sleep(2.1)
         self.assertIsNone(self.ds.get("foo"))
         self.assertEqual(self.ds.ttl("foo"), -2)
@@ -36,5 +36,14 @@ class TestBaseStore(unittest.TestCase):
         self.ds.set("foo", "bar")
         self.assertEqual(self.ds.ttl("foo"), -1)
 
+    def test_counters_store_ints(self):
+        self.assertEqual(self.ds.incrby("n", 5), 5)
+        self.assertEqual(self.ds.incrby("n", -7), -2)
+        self.assertEqual(self.ds.get("n"), "-2")
+        self.assertEqual(self.ds.incrbyfloat("n", 0.5), "-1.5")
+        self.ds.set("i", "7")
+        self.assertEqual(self.ds.keyspace.lookup("i").value, 7)
+        self.assertEqual(self.ds.strlen("i"), 1)
+
 if __name__ == "__main__":
     unittest.main()
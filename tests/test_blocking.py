@@ -0,0 +1,121 @@
+# tests/test_blocking.py
+
+import asyncio
+import os
+import tempfile
+import unittest
+from datastore.blocking import BlockingQueues
+from server.command_router import CommandHandler
+
+class TestBlockingQueues(unittest.IsolatedAsyncioTestCase):
+    async def test_waiters_are_served_in_order(self):
+        queues = BlockingQueues()
+        items = ["a", "b"]
+        serve = lambda key: items.pop(0).encode() if items else None
+        first = queues.block(["k"], serve, 0, b"timeout")
+        second = queues.block(["k"], serve, 0, b"timeout")
+        third = queues.block(["k"], serve, 0, b"timeout")
+        queues.signal("k")
+        queues.serve_ready()
+        self.assertEqual((first.result(), second.result()), (b"a", b"b"))
+        self.assertFalse(third.done())
+        self.assertEqual(queues.blocked_clients, 1)
+
+    async def test_waiter_on_several_keys_leaves_every_queue(self):
+        queues = BlockingQueues()
+        future = queues.block(["a", "b"], lambda key: key.encode(), 0, b"timeout")
+        queues.signal("b")
+        queues.serve_ready()
+        self.assertEqual(future.result(), b"b")
+        self.assertEqual(queues.waiters, {})
+
+    async def test_timeout_and_cancel_clean_up(self):
+        queues = BlockingQueues()
+        timed = queues.block(["k"], lambda key: None, 0.01, b"timeout")
+        cancelled = queues.block(["k"], lambda key: None, 0, b"timeout")
+        cancelled.cancel()
+        self.assertEqual(await timed, b"timeout")
+        await asyncio.sleep(0)
+        self.assertEqual(queues.waiters, {})
+        self.assertEqual(queues.blocked_clients, 0)
+
+    def test_signal_ignores_keys_without_waiters(self):
+        queues = BlockingQueues()
+        queues.signal("k")
+        self.assertEqual(queues.ready, {})
+
+class TestBlockingCommands(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        fd, self.aof_path = tempfile.mkstemp(suffix=".aof")
+        os.close(fd)
+        self.handler = CommandHandler(aof_path=self.aof_path)
+        self.logged = []
+        self.handler.aof.append = self.logged.append
+
+    def tearDown(self):
+        self.handler.aof.close()
+        os.remove(self.aof_path)
+
+    async def test_blpop_returns_at_once_when_data_is_there(self):
+        self.handler.handle(["RPUSH", "b", "x"])
+        self.assertEqual(self.handler.handle(["BLPOP", "a", "b", "0"]),
+                         b"*2\r\n$1\r\nb\r\n$1\r\nx\r\n")
+        self.assertEqual(self.logged[-1], ["LPOP", "b"])
+
+    async def test_push_wakes_waiters_fifo_and_logs_pops(self):
+        first = self.handler.handle(["BLPOP", "q", "0"])
+        second = self.handler.handle(["BRPOP", "q", "0"])
+        self.assertIsInstance(first, asyncio.Future)
+        self.handler.handle(["RPUSH", "q", "1", "2", "3"])
+        self.assertEqual(first.result(), b"*2\r\n$1\r\nq\r\n$1\r\n1\r\n")
+        self.assertEqual(second.result(), b"*2\r\n$1\r\nq\r\n$1\r\n3\r\n")
+        self.assertEqual(self.logged, [["RPUSH", "q", "1", "2", "3"], ["LPOP", "q"], ["RPOP", "q"]])
+        self.assertEqual(self.handler.handle(["LRANGE", "q", "0", "-1"]), b"*1\r\n$1\r\n2\r\n")
+
+    async def test_lmove_and_blmove(self):
+        self.handler.handle(["RPUSH", "src", "a", "b"])
+        self.assertEqual(self.handler.handle(["LMOVE", "src", "dst", "LEFT", "LEFT"]), b"$1\r\na\r\n")
+        self.assertEqual(self.handler.handle(["LMOVE", "src", "dst", "RIGHT", "LEFT"]), b"$1\r\nb\r\n")
+        self.assertEqual(self.handler.handle(["LRANGE", "dst", "0", "-1"]), b"*2\r\n$1\r\nb\r\n$1\r\na\r\n")
+        self.assertEqual(self.handler.handle(["LMOVE", "src", "dst", "LEFT", "LEFT"]), b"$-1\r\n")
+        self.assertIn(b"syntax error", self.handler.handle(["LMOVE", "src", "dst", "UP", "LEFT"]))
+
+        # A blocked BLMOVE feeds a BLPOP waiting on its destination.
+        pop = self.handler.handle(["BLPOP", "out", "0"])
+        move = self.handler.handle(["BLMOVE", "in", "out", "LEFT", "RIGHT", "0"])
+        self.handler.handle(["LPUSH", "in", "job"])
+        self.assertEqual(move.result(), b"$3\r\njob\r\n")
+        self.assertEqual(pop.result(), b"*2\r\n$3\r\nout\r\n$3\r\njob\r\n")
+        self.assertEqual(self.logged[-2:], [["LMOVE", "in", "out", "LEFT", "RIGHT"], ["LPOP", "out"]])
+
+    async def test_timeout_replies_and_errors(self):
+        reply = self.handler.handle(["BLPOP", "q", "0.01"])
+        self.assertEqual(await reply, b"*-1\r\n")
+        reply = self.handler.handle(["BLMOVE", "q", "d", "LEFT", "LEFT", "0.01"])
+        self.assertEqual(await reply, b"$-1\r\n")
+        self.assertIn(b"timeout is negative", self.handler.handle(["BLPOP", "q", "-1"]))
+        self.assertIn(b"not a float", self.handler.handle(["BLPOP", "q", "soon"]))
+        self.handler.handle(["SET", "str", "v"])
+        self.assertIn(b"WRONGTYPE", self.handler.handle(["BLPOP", "str", "0"]))
+        self.assertEqual(self.logged, [["SET", "str", "v"]])
+    async def test_key_retyped_inside_exec_keeps_waiter_blocked(self):
+        pop = self.handler.handle(["BLPOP", "k", "0"], "a")
+        for tokens in (["MULTI"], ["LPUSH", "k", "x"], ["DEL", "k"], ["SET", "k", "str"]):
+            self.handler.handle(tokens, "b")
+        reply = self.handler.handle(["EXEC"], "b")
+        self.assertEqual(reply, b"*3\r\n:1\r\n:1\r\n+OK\r\n")
+        self.assertFalse(pop.done())
+        self.handler.handle(["DEL", "k"])
+        self.handler.handle(["LPUSH", "k", "y"])
+        self.assertEqual(pop.result(), b"*2\r\n$1\r\nk\r\n$1\r\ny\r\n")
+
+    async def test_failing_serve_fails_only_its_waiter(self):
+        def serve(key):
+            raise ValueError("boom")
+        future = self.handler.blocking.block(["k"], serve, 0, b"timeout")
+        self.handler.handle(["LPUSH", "k", "x"])
+        self.assertEqual(future.result(), b"-ERR boom\r\n")
+        self.assertEqual(self.handler.blocking.blocked_clients, 0)
+
+if __name__ == "__main__":
+    unittest.main()
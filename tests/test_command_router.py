@@ -1,123 +1,597 @@
 # tests/test_command_router.py
 
+import os
+import tempfile
 import time
 import unittest
 from server.command_router import CommandHandler
 
 class TestCommandHandler(unittest.TestCase):
     def setUp(self):
-        self.handler = CommandHandler()
+        fd, self.aof_path = tempfile.mkstemp(suffix=".aof")
+        os.close(fd)
+        self.handler = CommandHandler(aof_path=self.aof_path)
+
+    def tearDown(self):
+        self.handler.aof.close()
+        os.remove(self.aof_path)
 
     def test_ping(self):
         res = self.handler.handle(["PING"])
-        self.assertEqual(res, "+PONG\r\n")
+        self.assertEqual(res, b"+PONG\r\n")
 
     def test_set_and_get(self):
-        self.assertEqual(self.handler.handle(["SET", "foo", "bar"]), "+OK\r\n")
-        self.assertEqual(self.handler.handle(["GET", "foo"]), "$3\r\nbar\r\n")
+        self.assertEqual(self.handler.handle(["SET", "foo", "bar"]), b"+OK\r\n")
+        self.assertEqual(self.handler.handle(["GET", "foo"]), b"$3\r\nbar\r\n")
 
     def test_get_missing_key(self):
-        self.assertEqual(self.handler.handle(["GET", "missing"]), "$-1\r\n")
+        self.assertEqual(self.handler.handle(["GET", "missing"]), b"$-1\r\n")
 
     def test_set_invalid_args(self):
-        self.assertIn("-ERR", self.handler.handle(["SET", "foo"]))
+        self.assertIn(b"-ERR", self.handler.handle(["SET", "foo"]))
 
     def test_get_invalid_args(self):
-        self.assertIn("-ERR", self.handler.handle(["GET"]))
+        self.assertIn(b"-ERR", self.handler.handle(["GET"]))
 
     def test_del(self):
         self.handler.handle(["SET", "foo", "bar"])
-        self.assertEqual(self.handler.handle(["DEL", "foo"]), ":1\r\n")
-        self.assertEqual(self.handler.handle(["DEL", "foo"]), ":0\r\n")
+        self.assertEqual(self.handler.handle(["DEL", "foo"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["DEL", "foo"]), b":0\r\n")
 
     def test_exists(self):
-        self.assertEqual(self.handler.handle(["EXISTS", "foo"]), ":0\r\n")
+        self.assertEqual(self.handler.handle(["EXISTS", "foo"]), b":0\r\n")
         self.handler.handle(["SET", "foo", "bar"])
-        self.assertEqual(self.handler.handle(["EXISTS", "foo"]), ":1\r\n")
+        self.assertEqual(self.handler.handle(["EXISTS", "foo"]), b":1\r\n")
 
     def test_expire_and_ttl(self):
         self.handler.handle(["SET", "foo", "bar"])
-        self.assertEqual(self.handler.handle(["EXPIRE", "foo", "2"]), ":1\r\n")
+        self.assertEqual(self.handler.handle(["EXPIRE", "foo", "2"]), b":1\r\n")
         ttl = int(self.handler.handle(["TTL", "foo"]).strip()[1:])
-        self.assertTrue(0 <= ttl <= 1)
+        self.assertTrue(0 <= ttl <= 2)
         time.sleep(2.1)
-        self.assertEqual(self.handler.handle(["TTL", "foo"]), ":-2\r\n")
+        self.assertEqual(self.handler.handle(["TTL", "foo"]), b":-2\r\n")
 
     def test_expire_invalid_key(self):
-        self.assertEqual(self.handler.handle(["EXPIRE", "missing", "10"]), ":0\r\n")
+        self.assertEqual(self.handler.handle(["EXPIRE", "missing", "10"]), b":0\r\n")
 
     def test_ttl_no_expiry(self):
         self.handler.handle(["SET", "foo", "bar"])
-        self.assertEqual(self.handler.handle(["TTL", "foo"]), ":-1\r\n")
+        self.assertEqual(self.handler.handle(["TTL", "foo"]), b":-1\r\n")
 
     def test_unknown_command(self):
-        self.assertIn("-ERR", self.handler.handle(["FOOBAR"]))
+        self.assertIn(b"-ERR", self.handler.handle(["FOOBAR"]))
 
     def test_empty_command(self):
-        self.assertIn("-ERR", self.handler.handle([]))
+        self.assertIn(b"-ERR", self.handler.handle([]))
+
+    def test_wrong_arity(self):
+        self.assertEqual(self.handler.handle(["GET", "a", "b"]),
+                         b"-ERR wrong number of arguments for 'get' command\r\n")
+        self.assertIn(b"-ERR", self.handler.handle(["LPUSH", "mylist"]))
+
+    def test_command_case_insensitive(self):
+        self.assertEqual(self.handler.handle(["ping"]), b"+PONG\r\n")
+
+    def test_command_info(self):
+        res = self.handler.handle(["COMMAND", "INFO", "get", "nosuch"])
+        self.assertEqual(res, b"*2\r\n*6\r\n$3\r\nget\r\n:2\r\n*2\r\n$8\r\nreadonly\r\n"
+                              b"$4\r\nfast\r\n:1\r\n:1\r\n:1\r\n$-1\r\n")
+        count = int(self.handler.handle(["COMMAND", "COUNT"])[1:])
+        self.assertTrue(self.handler.handle(["COMMAND"]).startswith(b"*%d\r\n" % count))
+
+    def test_command_getkeys(self):
+        self.assertEqual(self.handler.handle(["COMMAND", "GETKEYS", "SET", "k", "v"]), b"*1\r\n$1\r\nk\r\n")
+        self.assertIn(b"-ERR", self.handler.handle(["COMMAND", "GETKEYS", "PING"]))
+        self.assertEqual(self.handler.handle(["COMMAND", "GETKEYS", "SINTERCARD", "2", "a", "b", "LIMIT", "1"]),
+                         b"*2\r\n$1\r\na\r\n$1\r\nb\r\n")
+        self.assertIn(b"Invalid arguments", self.handler.handle(["COMMAND", "GETKEYS", "SINTERCARD", "x", "a"]))
+
+    def test_aof_logs_write_commands_only(self):
+        logged = []
+        self.handler.aof.append = logged.append
+        self.handler.handle(["SET", "foo", "bar"])
+        self.handler.handle(["GET", "foo"])
+        self.handler.handle(["SET", "foo"])
+        self.handler.loading = True
+        self.handler.handle(["SET", "foo", "baz"])
+        self.assertEqual(logged, [["SET", "foo", "bar"]])
+
+    def test_returned_errors_are_not_logged(self):
+        self.handler.handle(["WATCH", "a"])
+        self.assertIn(b"syntax error", self.handler.handle(["SET", "a", "1", "BOGUS"]))
+        self.assertIn(b"syntax error", self.handler.handle(["LINSERT", "l", "MIDDLE", "p", "v"]))
+        self.assertIn(b"-ERR", self.handler.handle(["MSET", "a"]))
+        self.assertEqual(self.handler.keyspace.versions, {"a": 0})
+        with open(self.aof_path, "rb") as f:
+            self.assertEqual(f.read(), b"")
+
+    def test_wrongtype(self):
+        self.handler.handle(["SET", "foo", "bar"])
+        self.assertEqual(self.handler.handle(["LPUSH", "foo", "x"]),
+                         b"-WRONGTYPE Operation against a key holding the wrong kind of value\r\n")
+        self.handler.handle(["RPUSH", "mylist", "x"])
+        self.assertIn(b"-WRONGTYPE", self.handler.handle(["GET", "mylist"]))
+
+    def test_type_and_dbsize(self):
+        self.handler.handle(["SET", "s", "v"])
+        self.handler.handle(["RPUSH", "l", "v"])
+        self.handler.handle(["SADD", "st", "v"])
+        self.handler.handle(["HSET", "h", "f", "v"])
+        self.handler.handle(["ZADD", "z", "1", "m"])
+        for key, type_ in [("s", b"string"), ("l", b"list"), ("st", b"set"), ("h", b"hash"), ("z", b"zset"),
+                           ("missing", b"none")]:
+            self.assertEqual(self.handler.handle(["TYPE", key]), b"+" + type_ + b"\r\n")
+        self.assertEqual(self.handler.handle(["DBSIZE"]), b":5\r\n")
+
+    def test_set_overwrites_other_types(self):
+        self.handler.handle(["RPUSH", "k", "x"])
+        self.handler.handle(["SET", "k", "v"])
+        self.assertEqual(self.handler.handle(["GET", "k"]), b"$1\r\nv\r\n")
+        self.assertEqual(self.handler.handle(["DBSIZE"]), b":1\r\n")
+
+    def test_expire_applies_to_every_type(self):
+        self.handler.handle(["RPUSH", "l", "x"])
+        self.assertEqual(self.handler.handle(["EXPIRE", "l", "100"]), b":1\r\n")
+        self.handler.keyspace.data["l"].expire_at = 1
+        self.assertEqual(self.handler.handle(["LLEN", "l"]), b":0\r\n")
+        self.assertEqual(self.handler.handle(["TYPE", "l"]), b"+none\r\n")
+
+    def test_empty_collections_are_removed(self):
+        self.handler.handle(["RPUSH", "l", "x"])
+        self.handler.handle(["LPOP", "l"])
+        self.handler.handle(["SADD", "s", "x"])
+        self.handler.handle(["SREM", "s", "x"])
+        self.assertEqual(self.handler.handle(["DBSIZE"]), b":0\r\n")
 
     # --- LIST COMMANDS ---
     def test_lpush_rpush_lrange(self):
-        self.assertEqual(self.handler.handle(["LPUSH", "mylist", "c", "b", "a"]), ":3\r\n")
-        self.assertEqual(self.handler.handle(["RPUSH", "mylist", "d", "e"]), ":5\r\n")
+        self.assertEqual(self.handler.handle(["LPUSH", "mylist", "c", "b", "a"]), b":3\r\n")
+        self.assertEqual(self.handler.handle(["RPUSH", "mylist", "d", "e"]), b":5\r\n")
         result = self.handler.handle(["LRANGE", "mylist", "0", "4"])
-        self.assertEqual(result, "*5\r\n$1\r\na\r\n$1\r\nb\r\n$1\r\nc\r\n$1\r\nd\r\n$1\r\ne\r\n")
+        self.assertEqual(result, b"*5\r\n$1\r\na\r\n$1\r\nb\r\n$1\r\nc\r\n$1\r\nd\r\n$1\r\ne\r\n")
     
     def test_lpop_rpop(self):
         self.handler.handle(["RPUSH", "mylist", "one", "two", "three"])
-        self.assertEqual(self.handler.handle(["LPOP", "mylist"]), "$3\r\none\r\n")
-        self.assertEqual(self.handler.handle(["RPOP", "mylist"]), "$5\r\nthree\r\n")
+        self.assertEqual(self.handler.handle(["LPOP", "mylist"]), b"$3\r\none\r\n")
+        self.assertEqual(self.handler.handle(["RPOP", "mylist"]), b"$5\r\nthree\r\n")
 
     def test_llen(self):
         self.handler.handle(["RPUSH", "mylist", "x", "y"])
-        self.assertEqual(self.handler.handle(["LLEN", "mylist"]), ":2\r\n")
+        self.assertEqual(self.handler.handle(["LLEN", "mylist"]), b":2\r\n")
 
     def test_lrange_invalid_args(self):
-        self.assertIn("-ERR", self.handler.handle(["LRANGE", "mylist", "1"]))
+        self.assertIn(b"-ERR", self.handler.handle(["LRANGE", "mylist", "1"]))
 
     # --- SET COMMANDS ---
     def test_sadd_smembers(self):
-        self.assertEqual(self.handler.handle(["SADD", "myset", "a", "b", "c"]), ":3\r\n")
+        self.assertEqual(self.handler.handle(["SADD", "myset", "a", "b", "c"]), b":3\r\n")
         members = self.handler.handle(["SMEMBERS", "myset"])
-        self.assertTrue(all(m in members for m in ["$1\r\na\r\n", "$1\r\nb\r\n", "$1\r\nc\r\n"]))
+        self.assertTrue(all(m in members for m in [b"$1\r\na\r\n", b"$1\r\nb\r\n", b"$1\r\nc\r\n"]))
 
     def test_srem(self):
         self.handler.handle(["SADD", "myset", "x", "y", "z"])
-        self.assertEqual(self.handler.handle(["SREM", "myset", "x", "y"]), ":2\r\n")
+        self.assertEqual(self.handler.handle(["SREM", "myset", "x", "y"]), b":2\r\n")
         remaining = self.handler.handle(["SMEMBERS", "myset"])
-        self.assertNotIn("$1\nx\r\n", remaining)
+        self.assertNotIn(b"$1\nx\r\n", remaining)
 
     def test_sismember(self):
         self.handler.handle(["SADD", "myset", "hello"])
-        self.assertEqual(self.handler.handle(["SISMEMBER", "myset", "hello"]), ":1\r\n")
-        self.assertEqual(self.handler.handle(["SISMEMBER", "myset", "world"]), ":0\r\n")
+        self.assertEqual(self.handler.handle(["SISMEMBER", "myset", "hello"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["SISMEMBER", "myset", "world"]), b":0\r\n")
 
     # --- HASH COMMANDS ---
     def test_hset_hget(self):
-        self.assertEqual(self.handler.handle(["HSET", "h", "f1", "v1"]), ":1\r\n")
-        self.assertEqual(self.handler.handle(["HGET", "h", "f1"]), "$2\r\nv1\r\n")
+        self.assertEqual(self.handler.handle(["HSET", "h", "f1", "v1"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["HGET", "h", "f1"]), b"$2\r\nv1\r\n")
 
     def test_hgetall(self):
         self.handler.handle(["HSET", "h", "a", "1"])
         self.handler.handle(["HSET", "h", "b", "2"])
         res = self.handler.handle(["HGETALL", "h"])
-        self.assertIn("$1\r\na\r\n", res)
-        self.assertIn("$1\r\n1\r\n", res)
-        self.assertIn("$1\r\nb\r\n", res)
-        self.assertIn("$1\r\n2\r\n", res)  
+        self.assertIn(b"$1\r\na\r\n", res)
+        self.assertIn(b"$1\r\n1\r\n", res)
+        self.assertIn(b"$1\r\nb\r\n", res)
+        self.assertIn(b"$1\r\n2\r\n", res)  
 
     def test_hdel(self):
         self.handler.handle(["HSET", "h", "f", "v"])
-        self.assertEqual(self.handler.handle(["HDEL", "h", "f", "nonexistent"]), ":1\r\n")
+        self.assertEqual(self.handler.handle(["HDEL", "h", "f", "nonexistent"]), b":1\r\n")
 
     # --- ZSET COMMANDS ---
     def test_zadd_zscore_zrange(self):
-        self.assertEqual(self.handler.handle(["ZADD", "myz", "2", "b"]), ":1\r\n")
-        self.assertEqual(self.handler.handle(["ZADD", "myz", "1", "a"]), ":1\r\n")
-        self.assertEqual(self.handler.handle(["ZSCORE", "myz", "a"]), "$3\r\n1.0\r\n")        
+        self.assertEqual(self.handler.handle(["ZADD", "myz", "2", "b"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["ZADD", "myz", "1", "a"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["ZSCORE", "myz", "a"]), b"$3\r\n1.0\r\n")        
         res = self.handler.handle(["ZRANGE", "myz", "0", "1"])
-        self.assertIn("$1\r\na\r\n", res)
-        self.assertIn("$1\r\nb\r\n", res)
+        self.assertIn(b"$1\r\na\r\n", res)
+        self.assertIn(b"$1\r\nb\r\n", res)
+
+    def test_zadd_options(self):
+        h = self.handler
+        self.assertEqual(h.handle(["ZADD", "z", "1", "a", "2", "b"]), b":2\r\n")
+        self.assertEqual(h.handle(["ZADD", "z", "CH", "3", "a", "3", "c"]), b":2\r\n")
+        self.assertEqual(h.handle(["ZADD", "z", "INCR", "2", "a"]), b"$3\r\n5.0\r\n")
+        self.assertEqual(h.handle(["ZADD", "z", "NX", "INCR", "2", "a"]), b"$-1\r\n")
+        self.assertIn(b"not compatible", h.handle(["ZADD", "z", "NX", "XX", "1", "a"]))
+        self.assertIn(b"not compatible", h.handle(["ZADD", "z", "GT", "LT", "1", "a"]))
+        self.assertIn(b"syntax error", h.handle(["ZADD", "z", "1", "a", "2"]))
+        self.assertIn(b"not a valid float", h.handle(["ZADD", "z", "nan", "a"]))
+
+    def test_zset_queries(self):
+        h = self.handler
+        h.handle(["ZADD", "z", "1", "a", "2", "b", "3", "c"])
+        self.assertEqual(h.handle(["ZCARD", "z"]), b":3\r\n")
+        self.assertEqual(h.handle(["ZRANK", "z", "b"]), b":1\r\n")
+        self.assertEqual(h.handle(["ZREVRANK", "z", "b"]), b":1\r\n")
+        self.assertEqual(h.handle(["ZRANK", "z", "x"]), b"$-1\r\n")
+        self.assertEqual(h.handle(["ZREVRANGE", "z", "0", "0", "WITHSCORES"]),
+                         b"*2\r\n$1\r\nc\r\n$3\r\n3.0\r\n")
+        self.assertEqual(h.handle(["ZRANGEBYSCORE", "z", "(1", "+inf", "LIMIT", "0", "1"]),
+                         b"*1\r\n$1\r\nb\r\n")
+        self.assertEqual(h.handle(["ZREVRANGEBYSCORE", "z", "3", "2"]),
+                         b"*2\r\n$1\r\nc\r\n$1\r\nb\r\n")
+        self.assertEqual(h.handle(["ZCOUNT", "z", "-inf", "(3"]), b":2\r\n")
+        self.assertIn(b"min or max", h.handle(["ZCOUNT", "z", "x", "1"]))
+        self.assertEqual(h.handle(["ZINCRBY", "z", "10", "a"]), b"$4\r\n11.0\r\n")
+        self.assertEqual(h.handle(["ZREM", "z", "a", "b"]), b":2\r\n")
+        self.assertEqual(h.handle(["ZRANGE", "z", "0", "-1"]), b"*1\r\n$1\r\nc\r\n")
+
+    def test_list_index_commands(self):
+        h = self.handler
+        h.handle(["RPUSH", "l", "a", "b", "c", "b"])
+        self.assertEqual(h.handle(["LINDEX", "l", "-1"]), b"$1\r\nb\r\n")
+        self.assertEqual(h.handle(["LSET", "l", "0", "A"]), b"+OK\r\n")
+        self.assertEqual(h.handle(["LSET", "l", "9", "A"]), b"-ERR index out of range\r\n")
+        self.assertEqual(h.handle(["LSET", "nokey", "0", "A"]), b"-ERR no such key\r\n")
+        self.assertEqual(h.handle(["LPOS", "l", "b"]), b":1\r\n")
+        self.assertEqual(h.handle(["LPOS", "l", "b", "RANK", "-1", "COUNT", "0"]), b"*2\r\n:3\r\n:1\r\n")
+        self.assertEqual(h.handle(["LPOS", "l", "z"]), b"$-1\r\n")
+        self.assertIn(b"RANK can't be zero", h.handle(["LPOS", "l", "b", "RANK", "0"]))
+        self.assertEqual(h.handle(["LINSERT", "l", "BEFORE", "c", "x"]), b":5\r\n")
+        self.assertEqual(h.handle(["LREM", "l", "0", "b"]), b":2\r\n")
+        self.assertEqual(h.handle(["LTRIM", "l", "0", "1"]), b"+OK\r\n")
+        self.assertEqual(h.handle(["LRANGE", "l", "0", "-1"]), b"*2\r\n$1\r\nA\r\n$1\r\nx\r\n")
+
+    # --- INFO / MEMORY ---
+    def test_info_memory(self):
+        self.handler.handle(["RPUSH", "l", "a", "b"])
+        res = self.handler.handle(["INFO", "memory"])
+        self.assertIn(b"# Memory\r\n", res)
+        self.assertIn(f"used_memory:{self.handler.keyspace.used_memory}\r\n".encode(), res)
+        self.assertIn(b"maxmemory_policy:", res)
+        self.assertNotIn(b"# Stats", res)
+
+    def test_info_all_sections(self):
+        res = self.handler.handle(["INFO"])
+        self.assertIn(b"# Memory", res)
+        self.assertIn(b"evicted_keys:", res)
+
+    def test_memory_usage_and_stats(self):
+        self.handler.handle(["SET", "k", "v"])
+        usage = self.handler.keyspace.data["k"].size
+        self.assertEqual(self.handler.handle(["MEMORY", "USAGE", "k"]), f":{usage}\r\n".encode())
+        self.assertEqual(self.handler.handle(["MEMORY", "USAGE", "missing"]), b"$-1\r\n")
+        res = self.handler.handle(["MEMORY", "STATS"])
+        self.assertIn(b"total.allocated", res)
+        self.assertIn(b"-ERR", self.handler.handle(["MEMORY", "BOGUS"]))
+
+    def test_denyoom_rejected_under_noeviction(self):
+        import config
+        old = (config.MAX_MEMORY_BYTES, config.EVICTION_POLICY)
+        config.MAX_MEMORY_BYTES, config.EVICTION_POLICY = 1, "noeviction"
+        try:
+            self.handler.keyspace.set("k", "string", "v")
+            self.assertTrue(self.handler.handle(["RPUSH", "l", "a"]).startswith(b"-OOM "))
+            # Commands that free memory still run.
+            self.assertEqual(self.handler.handle(["DEL", "k"]), b":1\r\n")
+        finally:
+            config.MAX_MEMORY_BYTES, config.EVICTION_POLICY = old
+
+    def test_object_freq_and_idletime(self):
+        import config
+        old = config.EVICTION_POLICY
+        try:
+            config.EVICTION_POLICY = "allkeys-lfu"
+            self.handler.handle(["SET", "k", "v"])
+            self.assertEqual(self.handler.handle(["OBJECT", "FREQ", "k"]), b":5\r\n")
+            self.assertEqual(self.handler.handle(["OBJECT", "FREQ", "missing"]), b"$-1\r\n")
+            self.assertIn(b"-ERR", self.handler.handle(["OBJECT", "IDLETIME", "k"]))
+            config.EVICTION_POLICY = "allkeys-lru"
+            self.handler.handle(["SET", "k", "v"])
+            self.assertEqual(self.handler.handle(["OBJECT", "IDLETIME", "k"]), b":0\r\n")
+            self.assertIn(b"-ERR", self.handler.handle(["OBJECT", "FREQ", "k"]))
+        finally:
+            config.EVICTION_POLICY = old
+
+    def test_object_encoding(self):
+        self.handler.handle(["SET", "s", "v"])
+        self.handler.handle(["SADD", "ints", "1", "2"])
+        self.handler.handle(["HSET", "h", "f", "v"])
+        self.handler.handle(["RPUSH", "l", "a"])
+        self.assertEqual(self.handler.handle(["OBJECT", "ENCODING", "s"]), b"$6\r\nembstr\r\n")
+        self.assertEqual(self.handler.handle(["OBJECT", "ENCODING", "ints"]), b"$6\r\nintset\r\n")
+        self.assertEqual(self.handler.handle(["OBJECT", "ENCODING", "h"]), b"$8\r\nlistpack\r\n")
+        self.assertEqual(self.handler.handle(["OBJECT", "ENCODING", "l"]), b"$9\r\nquicklist\r\n")
+        self.assertEqual(self.handler.handle(["OBJECT", "ENCODING", "missing"]), b"$-1\r\n")
+
+    # --- Expiry options ---
+    def test_set_with_ttl(self):
+        self.assertEqual(self.handler.handle(["SET", "k", "v", "EX", "10"]), b"+OK\r\n")
+        self.assertIn(self.handler.handle(["TTL", "k"]), (b":9\r\n", b":10\r\n"))
+        self.handler.handle(["SET", "k", "v", "PX", "1500"])
+        pttl = int(self.handler.handle(["PTTL", "k"])[1:])
+        self.assertTrue(1400 <= pttl <= 1500)
+        self.handler.handle(["SET", "k", "v2", "KEEPTTL"])
+        self.assertNotEqual(self.handler.handle(["PTTL", "k"]), b":-1\r\n")
+        self.handler.handle(["SET", "k", "v3"])
+        self.assertEqual(self.handler.handle(["PTTL", "k"]), b":-1\r\n")
+
+    def test_set_nx_xx_get(self):
+        self.assertEqual(self.handler.handle(["SET", "k", "v", "XX"]), b"$-1\r\n")
+        self.assertEqual(self.handler.handle(["SET", "k", "v", "NX"]), b"+OK\r\n")
+        self.assertEqual(self.handler.handle(["SET", "k", "w", "NX"]), b"$-1\r\n")
+        self.assertEqual(self.handler.handle(["SET", "k", "w", "XX", "GET"]), b"$1\r\nv\r\n")
+        self.assertEqual(self.handler.handle(["GET", "k"]), b"$1\r\nw\r\n")
+
+    def test_set_syntax_errors(self):
+        self.assertIn(b"syntax error", self.handler.handle(["SET", "k", "v", "NX", "XX"]))
+        self.assertIn(b"syntax error", self.handler.handle(["SET", "k", "v", "EX"]))
+        self.assertIn(b"syntax error", self.handler.handle(["SET", "k", "v", "EX", "1", "PX", "1"]))
+        self.assertIn(b"invalid expire time", self.handler.handle(["SET", "k", "v", "EX", "0"]))
+        self.assertIn(b"not an integer", self.handler.handle(["SET", "k", "v", "EX", "x"]))
+
+    def test_pexpire_pttl_persist(self):
+        self.handler.handle(["SET", "k", "v"])
+        self.assertEqual(self.handler.handle(["PEXPIRE", "k", "5000"]), b":1\r\n")
+        pttl = int(self.handler.handle(["PTTL", "k"])[1:])
+        self.assertTrue(4900 <= pttl <= 5000)
+        self.assertEqual(self.handler.handle(["PERSIST", "k"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["PERSIST", "k"]), b":0\r\n")
+        self.assertEqual(self.handler.handle(["PTTL", "k"]), b":-1\r\n")
+        self.assertEqual(self.handler.handle(["PTTL", "missing"]), b":-2\r\n")
+
+    def test_pexpireat_in_past_deletes(self):
+        self.handler.handle(["SET", "k", "v"])
+        self.assertEqual(self.handler.handle(["PEXPIREAT", "k", "1"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["EXISTS", "k"]), b":0\r\n")
+
+    def test_relative_ttls_are_logged_as_deadlines(self):
+        logged = []
+        self.handler.aof.append = logged.append
+        self.handler.handle(["SET", "k", "v", "EX", "100"])
+        self.handler.handle(["EXPIRE", "k", "100"])
+        self.handler.handle(["EXPIRE", "missing", "100"])
+        self.handler.handle(["SET", "k", "v", "NX"])
+        self.handler.handle(["EXPIRE", "k", "-1"])
+        self.assertEqual([t[0] for t in logged], ["SET", "PEXPIREAT", "DEL"])
+        self.assertEqual(logged[0][3], "PXAT")
+        deadline = int(logged[1][2])
+        self.assertAlmostEqual(deadline, time.time() * 1000 + 100_000, delta=1000)
+
+    # --- String counters and ranges ---
+    def test_incr_family(self):
+        self.assertEqual(self.handler.handle(["INCR", "n"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["INCRBY", "n", "10"]), b":11\r\n")
+        self.assertEqual(self.handler.handle(["DECR", "n"]), b":10\r\n")
+        self.assertEqual(self.handler.handle(["DECRBY", "n", "20"]), b":-10\r\n")
+        self.assertEqual(self.handler.handle(["GET", "n"]), b"$3\r\n-10\r\n")
+        self.handler.handle(["SET", "s", "abc"])
+        self.assertIn(b"not an integer", self.handler.handle(["INCR", "s"]))
+        self.assertIn(b"not an integer", self.handler.handle(["INCRBY", "n", "x"]))
+        self.handler.handle(["SET", "big", str(2**63 - 1)])
+        self.assertIn(b"overflow", self.handler.handle(["INCR", "big"]))
+
+    def test_incr_keeps_ttl(self):
+        self.handler.handle(["SET", "n", "1", "EX", "100"])
+        self.handler.handle(["INCR", "n"])
+        self.assertGreater(self.handler.store.ttl("n"), 90)
+
+    def test_incrbyfloat_logs_result(self):
+        logged = []
+        self.handler.aof.append = logged.append
+        self.assertEqual(self.handler.handle(["INCRBYFLOAT", "f", "10.5"]), b"$4\r\n10.5\r\n")
+        self.assertEqual(self.handler.handle(["INCRBYFLOAT", "f", "0.1"]), b"$4\r\n10.6\r\n")
+        self.assertEqual(self.handler.handle(["INCRBYFLOAT", "f", "-0.6"]), b"$2\r\n10\r\n")
+        self.assertEqual(self.handler.handle(["INCRBYFLOAT", "f", "5e3"]), b"$4\r\n5010\r\n")
+        self.assertIn(b"not a valid float", self.handler.handle(["INCRBYFLOAT", "f", "x"]))
+        for bad in (" 1", "1 ", "1_0", "nan", "-NaN", "\u0661", ""):
+            self.assertIn(b"not a valid float", self.handler.handle(["INCRBYFLOAT", "f", bad]))
+        self.assertEqual(logged[-1], ["SET", "f", "5010", "KEEPTTL"])
+        self.assertEqual(len(logged), 4)
+
+    def test_stored_floats_are_read_strictly(self):
+        self.handler.handle(["SET", "f", " 1"])
+        self.assertIn(b"not a valid float", self.handler.handle(["INCRBYFLOAT", "f", "1"]))
+        self.assertIn(b"not a valid float", self.handler.handle(["ZADD", "z", "1_0", "m"]))
+        self.assertIn(b"not a float", self.handler.handle(["ZCOUNT", "z", "( 1", "2"]))
+        self.assertEqual(self.handler.handle(["ZADD", "z", "-inf", "m"]), b":1\r\n")
+
+    def test_append_strlen_getrange_setrange(self):
+        self.assertEqual(self.handler.handle(["APPEND", "s", "Hello"]), b":5\r\n")
+        self.assertEqual(self.handler.handle(["APPEND", "s", " World"]), b":11\r\n")
+        self.assertEqual(self.handler.handle(["STRLEN", "s"]), b":11\r\n")
+        self.assertEqual(self.handler.handle(["STRLEN", "missing"]), b":0\r\n")
+        self.assertEqual(self.handler.handle(["GETRANGE", "s", "0", "4"]), b"$5\r\nHello\r\n")
+        self.assertEqual(self.handler.handle(["GETRANGE", "s", "-5", "-1"]), b"$5\r\nWorld\r\n")
+        self.assertEqual(self.handler.handle(["GETRANGE", "s", "5", "2"]), b"$0\r\n\r\n")
+        self.assertEqual(self.handler.handle(["SETRANGE", "s", "6", "Redis"]), b":11\r\n")
+        self.assertEqual(self.handler.handle(["GET", "s"]), b"$11\r\nHello Redis\r\n")
+        self.assertEqual(self.handler.handle(["SETRANGE", "p", "3", "x"]), b":4\r\n")
+        self.assertEqual(self.handler.handle(["GET", "p"]), b"$4\r\n\x00\x00\x00x\r\n")
+        self.assertEqual(self.handler.handle(["SETRANGE", "q", "3", ""]), b":0\r\n")
+        self.assertEqual(self.handler.handle(["EXISTS", "q"]), b":0\r\n")
+        self.assertIn(b"out of range", self.handler.handle(["SETRANGE", "s", "-1", "x"]))
+
+    def test_integer_strings_are_encoded_and_shared(self):
+        self.handler.handle(["SET", "a", "42"])
+        self.handler.handle(["SET", "b", "42"])
+        self.handler.handle(["SET", "c", "042"])
+        self.assertEqual(self.handler.handle(["OBJECT", "ENCODING", "a"]), b"$3\r\nint\r\n")
+        self.assertEqual(self.handler.handle(["OBJECT", "ENCODING", "c"]), b"$6\r\nembstr\r\n")
+        ks = self.handler.keyspace
+        self.assertIs(ks.lookup("a").value, ks.lookup("b").value)
+        self.handler.handle(["APPEND", "a", "0"])
+        self.assertEqual(self.handler.handle(["GET", "a"]), b"$3\r\n420\r\n")
+        self.handler.handle(["INCRBY", "b", "100000"])
+        self.handler.handle(["SETRANGE", "c", "5", "xyz"])
+        self.assertEqual(ks.recount_memory(list(ks.data)), 0)
+
+    # --- Multi-key and variadic commands ---
+    def test_mset_mget(self):
+        self.assertEqual(self.handler.handle(["MSET", "a", "1", "b", "2"]), b"+OK\r\n")
+        self.handler.handle(["RPUSH", "l", "x"])
+        self.assertEqual(self.handler.handle(["MGET", "a", "missing", "l", "b"]),
+                         b"*4\r\n$1\r\n1\r\n$-1\r\n$-1\r\n$1\r\n2\r\n")
+        self.assertIn(b"wrong number of arguments", self.handler.handle(["MSET", "a", "1", "b"]))
+        self.assertEqual(self.handler.handle(["GET", "b"]), b"$1\r\n2\r\n")
+
+    def test_msetnx(self):
+        self.assertEqual(self.handler.handle(["MSETNX", "a", "1", "b", "2"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["MSETNX", "b", "3", "c", "4"]), b":0\r\n")
+        self.assertEqual(self.handler.handle(["EXISTS", "c"]), b":0\r\n")
+
+    def test_variadic_del_unlink_exists(self):
+        self.handler.handle(["MSET", "a", "1", "b", "2", "c", "3"])
+        self.assertEqual(self.handler.handle(["EXISTS", "a", "a", "b", "missing"]), b":3\r\n")
+        self.assertEqual(self.handler.handle(["DEL", "a", "b", "missing"]), b":2\r\n")
+        self.assertEqual(self.handler.handle(["UNLINK", "c", "a"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["DBSIZE"]), b":0\r\n")
+
+    def test_hset_multiple_hmget_hincrby(self):
+        self.assertEqual(self.handler.handle(["HSET", "h", "a", "1", "b", "2", "a", "3"]), b":2\r\n")
+        self.assertIn(b"wrong number of arguments", self.handler.handle(["HSET", "h", "a", "1", "b"]))
+        self.assertEqual(self.handler.handle(["HMGET", "h", "a", "x", "b"]),
+                         b"*3\r\n$1\r\n3\r\n$-1\r\n$1\r\n2\r\n")
+        self.assertEqual(self.handler.handle(["HMGET", "missing", "a"]), b"*1\r\n$-1\r\n")
+        self.assertEqual(self.handler.handle(["HINCRBY", "h", "a", "10"]), b":13\r\n")
+        self.assertEqual(self.handler.handle(["HINCRBY", "h", "new", "-2"]), b":-2\r\n")
+        self.handler.handle(["HSET", "h", "s", "abc"])
+        self.assertIn(b"not an integer", self.handler.handle(["HINCRBY", "h", "s", "1"]))
+
+    def test_batch_commands_log_one_record(self):
+        logged = []
+        self.handler.aof.append = logged.append
+        self.handler.handle(["MSET", "a", "1", "b", "2"])
+        self.handler.handle(["MSETNX", "a", "1", "c", "2"])
+        self.handler.handle(["HSET", "h", "f1", "v1", "f2", "v2"])
+        self.handler.handle(["DEL", "a", "b"])
+        self.handler.handle(["MGET", "a", "b"])
+        self.assertEqual(logged, [
+            ["MSET", "a", "1", "b", "2"],
+            ["HSET", "h", "f1", "v1", "f2", "v2"],
+            ["DEL", "a", "b"],
+        ])
+
+    # --- Set algebra ---
+    def test_set_algebra_commands(self):
+        self.handler.handle(["SADD", "a", "1", "2", "3"])
+        self.handler.handle(["SADD", "b", "2", "3", "4"])
+        self.assertEqual(self.handler.handle(["SCARD", "a"]), b":3\r\n")
+        self.assertEqual(self.handler.handle(["SMISMEMBER", "a", "1", "9"]), b"*2\r\n:1\r\n:0\r\n")
+        self.assertEqual(self.handler.handle(["SINTERSTORE", "i", "a", "b"]), b":2\r\n")
+        self.assertEqual(self.handler.handle(["SUNIONSTORE", "u", "a", "b"]), b":4\r\n")
+        self.assertEqual(self.handler.handle(["SDIFFSTORE", "d", "a", "b"]), b":1\r\n")
+        self.assertEqual(self.handler.handle(["SMEMBERS", "d"]), b"*1\r\n$1\r\n1\r\n")
+        self.assertEqual(self.handler.handle(["SINTERCARD", "2", "a", "b"]), b":2\r\n")
+        self.assertEqual(self.handler.handle(["SINTERCARD", "2", "a", "b", "LIMIT", "1"]), b":1\r\n")
+        self.assertIn(b"greater than number of args", self.handler.handle(["SINTERCARD", "3", "a", "b"]))
+        self.assertIn(b"syntax error", self.handler.handle(["SINTERCARD", "1", "a", "b"]))
+        self.handler.handle(["SET", "str", "v"])
+        self.assertIn(b"WRONGTYPE", self.handler.handle(["SINTER", "a", "str"]))
+
+    def test_spop_is_logged_as_srem(self):
+        logged = []
+        self.handler.aof.append = logged.append
+        self.handler.handle(["SADD", "s", "a", "b", "c"])
+        popped = self.handler.handle(["SPOP", "s"])
+        self.handler.handle(["SPOP", "missing"])
+        self.handler.handle(["SPOP", "s", "5"])
+        self.assertEqual(logged[1], ["SREM", "s", popped.split(b"\r\n")[1].decode()])
+        self.assertEqual(logged[2][:2], ["SREM", "s"])
+        self.assertEqual(len(logged), 3)
+        self.assertEqual(self.handler.handle(["EXISTS", "s"]), b":0\r\n")
+
+    # --- Keyspace and collection scans ---
+    def test_keys(self):
+        self.handler.handle(["MSET", "user:1", "a", "user:2", "b", "other", "c"])
+        reply = self.handler.handle(["KEYS", "user:*"])
+        self.assertTrue(reply.startswith(b"*2\r\n"))
+        self.assertNotIn(b"other", reply)
+
+    def test_scan_with_match_count_type(self):
+        for i in range(30):
+            self.handler.handle(["SET", f"s{i}", "v"])
+        self.handler.handle(["RPUSH", "list", "x"])
+        seen = []
+        cursor = "0"
+        while True:
+            reply = self.handler.handle(["SCAN", cursor, "MATCH", "s1*", "COUNT", "5", "TYPE", "string"])
+            parts = reply.split(b"\r\n")
+            cursor = parts[2].decode()
+            seen += [p.decode() for p in parts[5::2] if p]
+            if cursor == "0":
+                break
+        self.assertEqual(sorted(seen), sorted(["s1"] + [f"s1{i}" for i in range(10)]))
+        self.assertIn(b"invalid cursor", self.handler.handle(["SCAN", "x"]))
+        self.assertIn(b"syntax error", self.handler.handle(["SCAN", "0", "COUNT", "0"]))
+
+    def test_collection_scans(self):
+        self.handler.handle(["SADD", "s", "a", "b"])
+        self.handler.handle(["HSET", "h", "f", "v"])
+        self.handler.handle(["ZADD", "z", "1", "m"])
+        self.assertEqual(self.handler.handle(["HSCAN", "h", "0"]),
+                         b"*2\r\n$1\r\n0\r\n*2\r\n$1\r\nf\r\n$1\r\nv\r\n")
+        self.assertEqual(self.handler.handle(["ZSCAN", "z", "0"]),
+                         b"*2\r\n$1\r\n0\r\n*2\r\n$1\r\nm\r\n$3\r\n1.0\r\n")
+        self.assertEqual(self.handler.handle(["SSCAN", "s", "0", "MATCH", "b"]),
+                         b"*2\r\n$1\r\n0\r\n*1\r\n$1\r\nb\r\n")
+        self.assertEqual(self.handler.handle(["SSCAN", "missing", "0"]), b"*2\r\n$1\r\n0\r\n*0\r\n")
+        self.assertIn(b"WRONGTYPE", self.handler.handle(["HSCAN", "s", "0"]))
+
+    def test_large_collection_scan_is_incremental(self):
+        self.handler.handle(["HSET", "h"] + [x for i in range(300) for x in (f"f{i}", str(i))])
+        fields = {}
+        cursor, calls = "0", 0
+        while True:
+            reply = self.handler.handle(["HSCAN", "h", cursor, "COUNT", "50"])
+            parts = reply.split(b"\r\n")
+            cursor = parts[2].decode()
+            items = [p.decode() for p in parts[5::2] if p]
+            fields.update(zip(items[::2], items[1::2]))
+            calls += 1
+            if cursor == "0":
+                break
+        self.assertEqual(calls, 6)
+        self.assertEqual(len(fields), 300)
+        self.assertEqual(fields["f7"], "7")
+
+    def test_unlink_defers_big_values(self):
+        self.handler.handle(["SADD", "s"] + [f"m{i}" for i in range(500)])
+        self.handler.handle(["SET", "k", "v"])
+        self.assertEqual(self.handler.handle(["UNLINK", "s", "k", "missing"]), b":2\r\n")
+        lazyfree = self.handler.keyspace.lazyfree
+        self.assertEqual(lazyfree.pending_objects, 1)
+        self.assertIn(b"lazyfree_pending_objects:1", self.handler.handle(["INFO", "memory"]))
+        lazyfree.release()
+        self.assertIn(b"lazyfreed_objects:1", self.handler.handle(["INFO", "stats"]))
+
+    def test_info_persistence(self):
+        self.handler.handle(["SET", "k", "v"])
+        info = self.handler.handle(["INFO", "persistence"])
+        self.assertIn(b"# Persistence", info)
+        self.assertIn(b"aof_queue_depth:0", info)
+        self.assertIn(b"aof_writes:1", info)
+
+    def test_flushall_async_and_flushdb(self):
+        for i in range(10):
+            self.handler.handle(["SET", f"k{i}", "v"])
+        self.assertEqual(self.handler.handle(["FLUSHALL", "ASYNC"]), b"+OK\r\n")
+        self.assertEqual(self.handler.handle(["DBSIZE"]), b":0\r\n")
+        self.assertEqual(self.handler.keyspace.used_memory, 0)
+        self.handler.handle(["SET", "k", "v"])
+        self.assertEqual(self.handler.handle(["FLUSHDB"]), b"+OK\r\n")
+        self.assertEqual(self.handler.handle(["GET", "k"]), b"$-1\r\n")
+        self.assertIn(b"syntax error", self.handler.handle(["FLUSHDB", "LATER"]))
 
 if __name__ == "__main__":
     unittest.main()
@@ -3,6 +3,7 @@
 import pytest
 from datastore import BaseStore
 from config import EVICTION_POLICY
+from datastore.eviction import LFU_INIT_VAL, lfu_log_incr, lfu_decayed, lfu_minutes
 
 def test_lru_eviction(monkeypatch):
     monkeypatch.setattr("config.MAX_MEMORY_BYTES", 500)  # ~500 bytes max
@@ -12,7 +13,7 @@ def test_lru_eviction(monkeypatch):
     for i in range(20):
         store.set(f"key{i}", "x" * 30)  # ~30–40 bytes per key
 
-    total_keys = sum(1 for k in store.store if store.exists(k))
+    total_keys = sum(1 for k in list(store.keyspace.data) if store.exists(k))
     assert total_keys < 20, "Eviction should have occurred under LRU"
 
 def test_lfu_eviction(monkeypatch):
@@ -34,3 +35,78 @@ def test_lfu_eviction(monkeypatch):
     assert store.exists("key0"), "key0 should remain due to high LFU score"
     evicted = [f"key{i}" for i in range(1, 10) if not store.exists(f"key{i}")]
     assert evicted, "Some lower LFU keys should have been evicted"
+
+def test_sampled_lru_prefers_idle_keys(monkeypatch):
+    monkeypatch.setattr("config.MAX_MEMORY_BYTES", 10 ** 9)
+    monkeypatch.setattr("config.EVICTION_POLICY", "allkeys-lru")
+
+    store = BaseStore()
+    for i in range(1000):
+        store.set(f"key{i}", "x")
+        store.keyspace.data[f"key{i}"].lru = i  # key0 is the oldest
+
+    monkeypatch.setattr("config.MAX_MEMORY_BYTES", store.keyspace.used_memory * 0.9)
+    store.eviction.perform_evictions()
+
+    evicted = [i for i in range(1000) if f"key{i}" not in store.keyspace.data]
+    assert store.eviction.evicted_keys == len(evicted) > 0
+    # Victims come overwhelmingly from the idle end of the keyspace.
+    assert sum(evicted) / len(evicted) < 250
+
+def test_pool_skips_deleted_keys(monkeypatch):
+    monkeypatch.setattr("config.EVICTION_POLICY", "allkeys-lru")
+    store = BaseStore()
+    for i in range(10):
+        store.keyspace.set(f"key{i}", "string", "x")
+    store.eviction.populate_pool(now=0)
+    for key in list(store.keyspace.data):
+        store.keyspace.delete(key)
+    store.keyspace.set("only", "string", "x")
+    assert store.eviction.best_key() == "only"
+
+def test_noeviction_raises(monkeypatch):
+    monkeypatch.setattr("config.MAX_MEMORY_BYTES", 1)
+    monkeypatch.setattr("config.EVICTION_POLICY", "noeviction")
+    store = BaseStore()
+    store.keyspace.set("k", "string", "v")
+    with pytest.raises(MemoryError):
+        store.set("other", "v")
+
+def test_lfu_counter_is_logarithmic(monkeypatch):
+    monkeypatch.setattr("config.EVICTION_POLICY", "allkeys-lfu")
+    monkeypatch.setattr("config.LFU_LOG_FACTOR", 10)
+    store = BaseStore()
+    obj = store.keyspace.set("k", "string", "v")
+    assert store.eviction.frequency(obj) == LFU_INIT_VAL
+
+    for _ in range(1000):
+        store.get("k")
+    counter = store.eviction.frequency(obj)
+    # 1000 hits at factor 10 land far below 255 (Redis's table: ~18).
+    assert LFU_INIT_VAL < counter < 40
+    assert obj.lru & 0xFF == counter
+
+def test_lfu_counter_saturates(monkeypatch):
+    monkeypatch.setattr("config.LFU_LOG_FACTOR", 0)
+    assert lfu_log_incr(254) == 255
+    assert lfu_log_incr(255) == 255
+
+def test_lfu_counter_decays(monkeypatch):
+    monkeypatch.setattr("config.LFU_DECAY_TIME", 1)
+    now = lfu_minutes()
+    packed = (((now - 3) & 0xFFFF) << 8) | 10
+    assert lfu_decayed(packed) == 7
+    packed = (((now - 30) & 0xFFFF) << 8) | 10
+    assert lfu_decayed(packed) == 0
+    monkeypatch.setattr("config.LFU_DECAY_TIME", 0)
+    assert lfu_decayed(packed) == 10
+
+def test_lfu_evicts_cold_keys_after_decay(monkeypatch):
+    monkeypatch.setattr("config.EVICTION_POLICY", "allkeys-lfu")
+    monkeypatch.setattr("config.MAX_MEMORY_BYTES", 10 ** 9)
+    store = BaseStore()
+    store.set("was_hot", "v")
+    store.set("fresh", "v")
+    # Hot an hour ago, untouched since: decayed below a brand-new key.
+    store.keyspace.data["was_hot"].lru = (((lfu_minutes() - 60) & 0xFFFF) << 8) | 50
+    assert store.eviction.best_key() == "was_hot"
@@ -5,10 +5,14 @@ import time
 import asyncio
 
 from datastore.expiry import ExpiryManager
+from datastore.keyspace import Keyspace, STRING, mstime
 
 class TestExpiryManager(unittest.TestCase):
     def setUp(self):
-        self.expiry = ExpiryManager()
+        self.keyspace = Keyspace()
+        for key in ("foo", "bar", "a", "b"):
+            self.keyspace.set(key, STRING, "value")
+        self.expiry = ExpiryManager(self.keyspace)
 
     def test_set_and_ttl(self):
         self.expiry.set_expiry("foo", 2)
@@ -18,6 +22,10 @@ class TestExpiryManager(unittest.TestCase):
     def test_ttl_no_expiry(self):
         self.assertEqual(self.expiry.ttl("bar"), -1)
 
+    def test_ttl_missing_key(self):
+        self.assertEqual(self.expiry.ttl("missing"), -2)
+        self.assertFalse(self.expiry.set_expiry("missing", 5))
+
     def test_ttl_expired(self):
         self.expiry.set_expiry("foo", 1)
         time.sleep(1.1)
@@ -28,10 +36,11 @@ class TestExpiryManager(unittest.TestCase):
         time.sleep(1.1)
         self.assertTrue(self.expiry.is_expired("foo"))
 
-    def test_remove_expiry(self):
+    def test_persist(self):
         self.expiry.set_expiry("foo", 5)
-        self.expiry.remove("foo")
+        self.assertTrue(self.expiry.persist("foo"))
         self.assertEqual(self.expiry.ttl("foo"), -1)
+        self.assertFalse(self.expiry.persist("foo"))
 
     def test_keys_to_delete(self):
         self.expiry.set_expiry("a", 1)
@@ -60,6 +69,59 @@ class TestExpiryManager(unittest.TestCase):
 
         asyncio.run(test())
 
+    def test_stale_heap_entries_are_skipped(self):
+        now = mstime()
+        self.keyspace.set_expire("a", self.keyspace.data["a"], now + 50_000)
+        self.keyspace.set_expire("a", self.keyspace.data["a"], now + 100_000)  # the first entry is stale
+        self.keyspace.set_expire("b", self.keyspace.data["b"], now + 50_000)
+        self.keyspace.delete("b")                                          # so is b's
+        self.assertIsNone(self.expiry._pop_due(now + 75_000))
+        self.assertEqual(self.expiry._pop_due(now + 150_000), "a")
+
+    def test_active_cycle_deletes_in_deadline_order(self):
+        past = mstime() - 10_000
+        for i, key in enumerate(("b", "a", "foo")):
+            self.keyspace.set_expire(key, self.keyspace.data[key], past + i)
+        deleted = []
+        backlog = self.expiry.active_expire_cycle(deleted.append, time_limit=1)
+        self.assertFalse(backlog)
+        self.assertEqual(deleted, ["b", "a", "foo"])
+        self.assertEqual(self.keyspace.expired_keys, 3)
+        self.assertGreater(self.expiry.cycle_time, 0)
+
+    def test_active_cycle_is_time_bounded(self):
+        past = mstime() - 10_000
+        for i in range(1000):
+            obj = self.keyspace.set(f"k{i}", STRING, "v")
+            self.keyspace.set_expire(f"k{i}", obj, past)
+        backlog = self.expiry.active_expire_cycle(self.keyspace.delete, time_limit=0)
+        self.assertTrue(backlog)
+        self.assertEqual(self.keyspace.expired_keys, 16)
+        while self.expiry.active_expire_cycle(self.keyspace.delete, time_limit=1):
+            pass
+        self.assertEqual(len(self.keyspace), 4)
+
+    def test_heap_is_compacted(self):
+        for _ in range(3000):
+            self.expiry.set_expiry("foo", 100)
+        self.expiry.active_expire_cycle(self.keyspace.delete, time_limit=1)
+        self.assertEqual(len(self.keyspace.expires), 1)
+
+    def test_lazy_expiry_counts(self):
+        self.keyspace.set_expire("foo", self.keyspace.data["foo"], mstime() - 1)
+        self.assertIsNone(self.keyspace.lookup("foo"))
+        self.assertEqual(self.keyspace.expired_keys, 1)
+
+    def test_expire_at_in_the_past_deletes(self):
+        self.assertTrue(self.expiry.expire_at("foo", mstime() - 1))
+        self.assertNotIn("foo", self.keyspace.data)
+
+    def test_pttl_has_millisecond_precision(self):
+        self.expiry.expire_at("foo", mstime() + 1500)
+        self.assertTrue(1400 <= self.expiry.pttl("foo") <= 1500)
+        self.assertEqual(self.expiry.ttl("foo"), 1)
+        self.assertEqual(self.expiry.pttl("bar"), -1)
+        self.assertEqual(self.expiry.pttl("missing"), -2)
 
 if __name__ == "__main__":
     unittest.main()
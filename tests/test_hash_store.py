@@ -1,4 +1,6 @@
 import unittest
+import config
+from datastore.keyspace import encoding_of
 from datastore.hash_store import HashStore
 
 class TestHashStore(unittest.TestCase):
@@ -24,5 +26,46 @@ class TestHashStore(unittest.TestCase):
         self.assertEqual(count, 1)
         self.assertIsNone(self.h.hget("hash1", "a"))
 
+    def test_multi_field_hset_and_hincrby(self):
+        self.assertEqual(self.h.hset("hash1", "a", "1", "b", "2"), 2)
+        self.assertEqual(self.h.hmget("hash1", "b", "x", "a"), ["2", None, "1"])
+        self.assertEqual(self.h.hincrby("hash1", "a", 5), 6)
+        self.assertEqual(self.h.hget("hash1", "a"), "6")
+        with self.assertRaises(ValueError):
+            self.h.hincrby("hash1", "a", 2**63)
+
+    def test_field_lookup_ignores_values(self):
+        self.h.hset("hash1", "a", "b")
+        self.assertIsNone(self.h.hget("hash1", "b"))
+        self.assertEqual(self.h.hset("hash1", "b", "c"), 1)
+        self.assertEqual(self.h.hdel("hash1", "c"), 0)
+        self.assertEqual(self.h.hgetall("hash1"), ["a", "b", "b", "c"])
+
+    def test_encoding_converts_when_limits_are_exceeded(self):
+        ks = self.h.keyspace
+        self.h.hset("small", "f", "v")
+        self.assertEqual(encoding_of(ks.lookup("small")), "listpack")
+        self.h.hset("small", "big", "x" * (config.HASH_MAX_LISTPACK_VALUE + 1))
+        self.assertEqual(encoding_of(ks.lookup("small")), "hashtable")
+        self.assertEqual(self.h.hget("small", "f"), "v")
+
+        for i in range(config.HASH_MAX_LISTPACK_ENTRIES):
+            self.h.hset("many", f"f{i}", "v")
+        self.assertEqual(encoding_of(ks.lookup("many")), "listpack")
+        self.h.hset("many", "one-more", "v")
+        self.assertEqual(encoding_of(ks.lookup("many")), "hashtable")
+        self.assertEqual(len(self.h.hgetall("many")), 2 * (config.HASH_MAX_LISTPACK_ENTRIES + 1))
+
+    def test_memory_stays_in_sync(self):
+        self.h.hset("small", "a", "1")
+        self.h.hset("small", "a", "22")
+        self.h.hset("small", "b", "3")
+        self.h.hdel("small", "b")
+        self.h.hset("big", "a", "1")
+        self.h.hset("big", "b", "x" * 100)
+        self.h.hdel("big", "a")
+        ks = self.h.keyspace
+        self.assertEqual(ks.recount_memory(list(ks.data)), 0)
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,33 @@
+# tests/test_intset.py
+
+import unittest
+from datastore.intset import IntSet
+
+class TestIntSet(unittest.TestCase):
+    def test_members_stay_sorted(self):
+        s = IntSet(["3", "-1", "2"])
+        self.assertTrue(s.add("10"))
+        self.assertFalse(s.add("2"))
+        self.assertEqual(list(s), ["-1", "2", "3", "10"])
+        self.assertEqual(len(s), 4)
+
+    def test_contains_and_remove(self):
+        s = IntSet(["1", "2"])
+        self.assertIn("1", s)
+        self.assertNotIn("01", s)
+        self.assertNotIn("a", s)
+        self.assertTrue(s.remove("1"))
+        self.assertFalse(s.remove("1"))
+        self.assertFalse(s.remove("x"))
+        self.assertEqual(list(s), ["2"])
+
+    def test_accepts_only_canonical_integers(self):
+        s = IntSet(["1"])
+        self.assertTrue(s.accepts("-42", 10))
+        self.assertFalse(s.accepts("1.5", 10))
+        self.assertFalse(s.accepts("007", 10))
+        self.assertFalse(s.accepts("99999999999999999999", 10))
+        self.assertFalse(s.accepts("2", 1))
+
+if __name__ == "__main__":
+    unittest.main()
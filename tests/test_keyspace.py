@@ -0,0 +1,96 @@
+# tests/test_keyspace.py
+
+import unittest
+from datastore.quicklist import QuickList
+from datastore.keyspace import Keyspace, WrongTypeError, STRING, LIST
+
+class TestKeyspace(unittest.TestCase):
+    def setUp(self):
+        self.ks = Keyspace()
+
+    def test_set_and_get(self):
+        self.ks.set("foo", STRING, "bar")
+        self.assertEqual(self.ks.get("foo", STRING), "bar")
+        self.assertIsNone(self.ks.get("missing", STRING))
+
+    def test_wrong_type(self):
+        self.ks.set("foo", STRING, "bar")
+        with self.assertRaises(WrongTypeError):
+            self.ks.get("foo", LIST)
+        with self.assertRaises(WrongTypeError):
+            self.ks.get_or_create("foo", LIST, QuickList)
+
+    def test_get_or_create(self):
+        obj = self.ks.get_or_create("l", LIST, QuickList)
+        obj.value.push_tail("x")
+        self.assertIs(self.ks.get_or_create("l", LIST, QuickList), obj)
+        self.assertEqual(self.ks.type_of("l"), LIST)
+        self.assertEqual(self.ks.type_of("missing"), "none")
+
+    def test_set_replaces_type_and_ttl(self):
+        self.ks.get_or_create("k", LIST, QuickList)
+        self.ks.data["k"].expire_at = 2 ** 40
+        self.ks.set("k", STRING, "v")
+        self.assertEqual(self.ks.type_of("k"), STRING)
+        self.assertIsNone(self.ks.data["k"].expire_at)
+
+    def test_lookup_expires_lazily(self):
+        self.ks.set("k", STRING, "v")
+        self.ks.data["k"].expire_at = 1
+        self.assertNotIn("k", self.ks)
+        self.assertEqual(len(self.ks), 0)
+
+    def test_lookup_records_access(self):
+        obj = self.ks.set("k", STRING, "v")
+        obj.lru = 0
+        self.ks.lookup("k", touch=False)
+        self.assertEqual(obj.lru, 0)
+        self.ks.lookup("k")
+        self.assertGreater(obj.lru, 0)
+
+    def test_dense_key_index(self):
+        for i in range(5):
+            self.ks.set(f"k{i}", STRING, "v")
+        self.ks.set("k2", STRING, "replaced")
+        self.ks.delete("k1")
+        self.ks.delete("k4")
+        self.assertEqual(sorted(self.ks.keys), ["k0", "k2", "k3"])
+        for key, obj in self.ks.data.items():
+            self.assertEqual(self.ks.keys[obj.index], key)
+
+    def test_scan_returns_keys_present_throughout(self):
+        for i in range(100):
+            self.ks.set(f"k{i}", STRING, "v")
+        seen = set()
+        cursor, keys = self.ks.scan(0, 7)
+        seen.update(keys)
+        deleted = 0
+        while cursor:
+            # Deleting keys moves the last key into the freed slot.
+            self.ks.delete(f"k{deleted}")
+            self.ks.set(f"new{deleted}", STRING, "v")
+            deleted += 1
+            cursor, keys = self.ks.scan(cursor, 7)
+            seen.update(keys)
+        survivors = {f"k{i}" for i in range(deleted, 100)}
+        self.assertLessEqual(survivors, seen)
+
+    def test_scan_skips_expired_keys(self):
+        self.ks.set("live", STRING, "v")
+        obj = self.ks.set("dead", STRING, "v")
+        obj.expire_at = 1
+        self.assertEqual(self.ks.scan(0, 10), (0, ["live"]))
+
+    def test_sample_keys(self):
+        self.assertEqual(self.ks.sample_keys(5), [])
+        for i in range(3):
+            self.ks.set(f"k{i}", STRING, "v")
+        self.assertEqual(sorted(self.ks.sample_keys(5)), ["k0", "k1", "k2"])
+        for i in range(3, 100):
+            self.ks.set(f"k{i}", STRING, "v")
+        sample = self.ks.sample_keys(5)
+        self.assertEqual(len(sample), 5)
+        self.assertTrue(all(key in self.ks.data for key in sample))
+
+if __name__ == "__main__":
+    unittest.main()
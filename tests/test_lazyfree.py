@@ -0,0 +1,72 @@
+# tests/test_lazyfree.py
+
+import asyncio
+import unittest
+from datastore.keyspace import Keyspace, STRING
+from datastore.lazyfree import LazyFree, dismantle, free_effort
+from datastore.quicklist import QuickList
+from datastore.zset_store import ZSetStore
+
+class TestLazyFree(unittest.TestCase):
+    def test_small_values_are_freed_on_the_spot(self):
+        lazy = LazyFree()
+        self.assertFalse(lazy.free({"a": 1}))
+        self.assertFalse(lazy.free("string"))
+        self.assertEqual(lazy.pending_objects, 0)
+
+    def test_big_values_are_released_in_chunks(self):
+        lazy = LazyFree()
+        value = {i: i for i in range(1000)}
+        self.assertTrue(lazy.free(value))
+        self.assertEqual(lazy.pending_objects, 1)
+        self.assertEqual(lazy.release(300), 300)
+        self.assertEqual(len(value), 700)
+        while lazy.jobs:
+            lazy.release(300)
+        self.assertEqual(value, {})
+        self.assertEqual((lazy.pending_objects, lazy.freed_objects), (0, 1))
+
+    def test_quicklist_and_zset_dismantle(self):
+        lst = QuickList()
+        lst.push_tail(*(str(i) for i in range(5000)))
+        # A list frees a packed chunk at a time, not an entry at a time.
+        effort = free_effort(lst)
+        self.assertEqual(effort, len(lst.chunks))
+        self.assertEqual(sum(1 for _ in dismantle(lst)), effort)
+        self.assertEqual(len(lst), 0)
+        zsets = ZSetStore()
+        zsets.zadd("z", *(x for i in range(200) for x in (str(i), f"m{i}")))
+        zset = zsets.keyspace.get("z", "zset")
+        lazy = LazyFree()
+        self.assertTrue(lazy.free(zset))
+        while lazy.jobs:
+            lazy.release()
+        self.assertEqual(len(zset.scores), 0)
+        self.assertIsNone(zset.zsl.tail)
+
+    def test_flush_keyspace_lazily(self):
+        ks = Keyspace()
+        for i in range(100):
+            ks.set(f"k{i}", STRING, "v")
+        old = ks.data
+        ks.flush(lazy=True)
+        self.assertEqual((len(ks), ks.used_memory), (0, 0))
+        self.assertEqual(len(old), 100)
+        while ks.lazyfree.jobs:
+            ks.lazyfree.release(10)
+        self.assertEqual(old, {})
+
+class TestLazyFreeTask(unittest.IsolatedAsyncioTestCase):
+    async def test_run_drains_jobs_in_background(self):
+        lazy = LazyFree()
+        task = asyncio.create_task(lazy.run())
+        value = set(range(5000))
+        lazy.free(value)
+        for _ in range(20):
+            await asyncio.sleep(0)
+        task.cancel()
+        self.assertEqual(value, set())
+        self.assertEqual(lazy.freed_objects, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -20,3 +20,37 @@ class TestListStore(unittest.TestCase):
     def test_llen(self):
         self.ls.lpush("mylist", "a", "b", "c")
         self.assertEqual(self.ls.llen("mylist"), 3)
+
+    def test_lindex_lset(self):
+        self.ls.rpush("mylist", "a", "b", "c")
+        self.assertEqual(self.ls.lindex("mylist", -1), "c")
+        self.assertIsNone(self.ls.lindex("mylist", 3))
+        self.ls.lset("mylist", -2, "B")
+        self.assertEqual(self.ls.lrange("mylist", 0, -1), ["a", "B", "c"])
+        with self.assertRaises(ValueError):
+            self.ls.lset("mylist", 5, "x")
+        with self.assertRaises(ValueError):
+            self.ls.lset("missing", 0, "x")
+
+    def test_ltrim_linsert_lrem(self):
+        self.ls.rpush("mylist", "a", "b", "a", "c", "a")
+        self.assertEqual(self.ls.lrem("mylist", -2, "a"), 2)
+        self.assertEqual(self.ls.lrange("mylist", 0, -1), ["a", "b", "c"])
+        self.assertEqual(self.ls.linsert("mylist", "b", "x", after=True), 4)
+        self.assertEqual(self.ls.linsert("mylist", "zz", "x"), -1)
+        self.assertEqual(self.ls.linsert("missing", "b", "x"), 0)
+        self.ls.ltrim("mylist", 1, 2)
+        self.assertEqual(self.ls.lrange("mylist", 0, -1), ["b", "x"])
+        self.ls.ltrim("mylist", 5, 10)
+        self.assertEqual(self.ls.llen("mylist"), 0)
+        self.assertNotIn("mylist", self.ls.keyspace)
+
+    def test_memory_stays_in_sync(self):
+        self.ls.rpush("mylist", *[str(i) for i in range(1000)])
+        self.ls.lpop("mylist")
+        self.ls.lset("mylist", 10, "longer value")
+        self.ls.linsert("mylist", "500", "y")
+        self.ls.lrem("mylist", 0, "7")
+        self.ls.ltrim("mylist", 3, -3)
+        ks = self.ls.keyspace
+        self.assertEqual(ks.recount_memory(list(ks.data)), 0)
@@ -0,0 +1,42 @@
+# tests/test_listpack.py
+
+import unittest
+from datastore.listpack import Listpack
+
+class TestListpack(unittest.TestCase):
+    def test_append_insert_get(self):
+        lp = Listpack(["b", "d"])
+        lp.insert(0, "a")
+        lp.insert(2, "c")
+        lp.append("e")
+        self.assertEqual(list(lp), ["a", "b", "c", "d", "e"])
+        self.assertEqual(lp.get(3), "d")
+        self.assertEqual(lp.range(1, 2), ["b", "c"])
+        self.assertEqual(lp.range(4, 10), ["e"])
+
+    def test_replace_and_delete_track_nbytes(self):
+        lp = Listpack(["one", "two", "three"])
+        self.assertEqual(lp.nbytes, 11 + 12)
+        self.assertEqual(lp.replace(1, "twenty"), 3)
+        self.assertEqual(lp.delete(0, 2), 9 + 8)
+        self.assertEqual(list(lp), ["three"])
+        self.assertEqual(lp.nbytes, 5 + 4)
+
+    def test_find(self):
+        lp = Listpack(["x", "y", "x"])
+        self.assertEqual(lp.find("x"), 0)
+        self.assertEqual(lp.find("x", 1), 2)
+        self.assertEqual(lp.find("z"), -1)
+
+    def test_split(self):
+        lp = Listpack("abcde")
+        tail = lp.split(2)
+        self.assertEqual(list(lp), ["a", "b"])
+        self.assertEqual(list(tail), ["c", "d", "e"])
+
+    def test_binary_and_unicode_round_trip(self):
+        values = ["café", "\udcff\udc80", ""]
+        self.assertEqual(list(Listpack(values)), values)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# tests/test_memory.py
+
+import unittest
+from datastore import Keyspace, BaseStore, ListStore, SetStore, HashStore, ZSetStore
+from datastore.memory import format_bytes
+
+class TestMemoryAccounting(unittest.TestCase):
+    def setUp(self):
+        self.ks = Keyspace()
+        self.strings = BaseStore(self.ks)
+        self.lists = ListStore(self.ks)
+        self.sets = SetStore(self.ks)
+        self.hashes = HashStore(self.ks)
+        self.zsets = ZSetStore(self.ks)
+
+    def assertNoDrift(self):
+        self.assertEqual(self.ks.recount_memory(list(self.ks.data)), 0)
+
+    def test_starts_empty(self):
+        self.assertEqual(self.ks.used_memory, 0)
+
+    def test_every_type_matches_recount(self):
+        self.ks.set("s", "string", "value")
+        self.lists.rpush("l", "a", "bb", "ccc")
+        self.lists.lpush("l", "z")
+        self.lists.lpop("l")
+        self.sets.sadd("set", "a", "b", "c", "a")
+        self.sets.srem("set", "b", "missing")
+        self.hashes.hset("h", "f1", "v1")
+        self.hashes.hset("h", "f1", "a much longer value")
+        self.hashes.hset("h", "f2", "v2")
+        self.hashes.hdel("h", "f2")
+        self.zsets.zadd("z", 1.0, "one")
+        self.zsets.zadd("z", 2.0, "two")
+        self.zsets.zadd("z", 3.0, "one")
+        self.assertGreater(self.ks.used_memory, 0)
+        self.assertNoDrift()
+
+    def test_delete_releases_everything(self):
+        self.lists.rpush("l", "a", "b")
+        self.sets.sadd("set", "a")
+        self.ks.set("s", "string", "v")
+        for key in ("l", "set", "s"):
+            self.ks.delete(key)
+        self.assertEqual(self.ks.used_memory, 0)
+
+    def test_emptied_collection_releases_memory(self):
+        self.lists.rpush("l", "a")
+        self.lists.rpop("l")
+        self.hashes.hset("h", "f", "v")
+        self.hashes.hdel("h", "f")
+        self.assertEqual(self.ks.used_memory, 0)
+
+    def test_overwrite_replaces_size(self):
+        self.lists.rpush("k", *["x" * 100] * 10)
+        self.ks.set("k", "string", "v")
+        self.assertNoDrift()
+
+    def test_recount_corrects_drift(self):
+        self.lists.rpush("l", "a")
+        # Mutate behind the keyspace's back.
+        self.ks.data["l"].value.push_tail("b" * 100)
+        drift = self.ks.recount_memory(["l"])
+        self.assertGreater(drift, 100)
+        self.assertNoDrift()
+
+    def test_peak_memory(self):
+        self.lists.rpush("l", *["x"] * 100)
+        peak = self.ks.used_memory
+        self.ks.delete("l")
+        self.assertEqual(self.ks.peak_memory, peak)
+
+    def test_memory_usage(self):
+        self.strings.set("k", "v")
+        self.assertEqual(self.strings.memory_usage("k"), self.ks.used_memory)
+        self.assertIsNone(self.strings.memory_usage("missing"))
+
+class TestFormatBytes(unittest.TestCase):
+    def test_units(self):
+        self.assertEqual(format_bytes(512), "512B")
+        self.assertEqual(format_bytes(1536), "1.50K")
+        self.assertEqual(format_bytes(3 * 1024 * 1024), "3.00M")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 # tests/test_parser.py
 import unittest
-from protocol.parser import RESPParser
+from protocol.parser import RESPParser, NEED_MORE, ProtocolError, RESPError, MAX_BULK_LENGTH
 
 class TestRESPParser(unittest.TestCase):
     def test_simple_set_command(self):
@@ -21,5 +21,76 @@ class TestRESPParser(unittest.TestCase):
         result = parser.parse()
         self.assertEqual(result, ['GET', None])
 
+    def test_partial_input_resumes(self):
+        raw = b'*3\r\n$3\r\nSET\r\n$3\r\nfoo\r\n$3\r\nbar\r\n'
+        parser = RESPParser()
+        for i in range(len(raw) - 1):
+            parser.feed(raw[i:i + 1])
+            self.assertIs(parser.parse(), NEED_MORE)
+        parser.feed(raw[-1:])
+        self.assertEqual(parser.parse(), ['SET', 'foo', 'bar'])
+        self.assertIs(parser.parse(), NEED_MORE)
+
+    def test_pipelined_commands(self):
+        raw = b'*1\r\n$4\r\nPING\r\n' * 3 + b'*2\r\n$3\r\nGET\r\n$1'
+        parser = RESPParser(raw)
+        self.assertEqual(list(parser), [['PING'], ['PING'], ['PING']])
+        parser.feed(b'\r\nk\r\n')
+        self.assertEqual(parser.parse(), ['GET', 'k'])
+
+    def test_bulk_length_is_trusted(self):
+        raw = b'*3\r\n$3\r\nSET\r\n$1\r\nk\r\n$9\r\nline\r\nend\r\n'
+        self.assertEqual(RESPParser(raw).parse(), ['SET', 'k', 'line\r\nend'])
+
+    def test_binary_values_round_trip(self):
+        payload = b'\xff\x00\xfe'
+        raw = b'*1\r\n$3\r\n' + payload + b'\r\n'
+        value = RESPParser(raw).parse()[0]
+        self.assertEqual(value.encode('utf-8', 'surrogateescape'), payload)
+        self.assertEqual(RESPParser(raw, decode=False).parse(), [payload])
+
+    def test_inline_command(self):
+        parser = RESPParser(b'SET  foo bar\r\n\r\nPING\r\n')
+        self.assertEqual(list(parser), [['SET', 'foo', 'bar'], ['PING']])
+
+    def test_inline_command_with_bare_lf(self):
+        parser = RESPParser(b'PING\nSET k v\r\n\n')
+        self.assertEqual(list(parser), [['PING'], ['SET', 'k', 'v']])
+        self.assertIs(parser.parse(), NEED_MORE)
+
+    def test_inline_rejected_when_disabled(self):
+        with self.assertRaises(ProtocolError):
+            RESPParser(b'PING\r\n', inline=False).parse()
+
+    def test_resp2_reply_types(self):
+        raw = b'*4\r\n+OK\r\n-ERR boom\r\n:42\r\n*-1\r\n'
+        value = RESPParser(raw).parse()
+        self.assertEqual(value, ['OK', 'ERR boom', 42, None])
+        self.assertIsInstance(value[1], RESPError)
+
+    def test_resp3_types(self):
+        raw = (b'%2\r\n+a\r\n#t\r\n+b\r\n,1.5\r\n'
+               b'~2\r\n:1\r\n:2\r\n'
+               b'_\r\n'
+               b'(12345678901234567890\r\n'
+               b'=8\r\ntxt:some\r\n'
+               b'|1\r\n+ttl\r\n:3\r\n>2\r\n+message\r\n$2\r\nhi\r\n')
+        parser = RESPParser(raw)
+        self.assertEqual(parser.parse(), {'a': True, 'b': 1.5})
+        self.assertEqual(parser.parse(), {1, 2})
+        self.assertIsNone(parser.parse())
+        self.assertEqual(parser.parse(), 12345678901234567890)
+        self.assertEqual(parser.parse(), 'some')
+        self.assertEqual(parser.parse(), ['message', 'hi'])
+
+    def test_invalid_length(self):
+        with self.assertRaises(ProtocolError):
+            RESPParser(b'*x\r\n').parse()
+
+    def test_negative_or_huge_blob_lengths(self):
+        for raw in (b'=-1\r\n', b'!-1\r\n', b'=%d\r\n' % (MAX_BULK_LENGTH + 1)):
+            with self.assertRaises(ProtocolError):
+                RESPParser(raw).parse()
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,104 @@
+# tests/test_quicklist.py
+
+import random
+import sys
+import unittest
+from collections import deque
+from unittest import mock
+from datastore.quicklist import QuickList
+
+class TestQuickList(unittest.TestCase):
+    def setUp(self):
+        # Small chunks so every test crosses chunk boundaries.
+        patcher = mock.patch("config.LIST_MAX_LISTPACK_SIZE", 32)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_push_pop_and_chunking(self):
+        ql = QuickList()
+        ql.push_tail(*[str(i) for i in range(50)])
+        ql.push_head("a", "b")
+        self.assertGreater(len(ql.chunks), 3)
+        self.assertEqual(len(ql), 52)
+        self.assertEqual(ql.pop_head(), "b")
+        self.assertEqual(ql.pop_tail(), "49")
+        self.assertEqual(list(ql)[:3], ["a", "0", "1"])
+
+    def test_index_range_and_negative_indexes(self):
+        model = [str(i) for i in range(100)]
+        ql = QuickList(model)
+        for i in (0, 1, 37, 99, -1, -50, -100):
+            self.assertEqual(ql.index(i), model[i])
+        self.assertIsNone(ql.index(100))
+        self.assertIsNone(ql.index(-101))
+        self.assertEqual(ql.range(10, 20), model[10:21])
+        self.assertEqual(ql.range(-5, -1), model[-5:])
+        self.assertEqual(ql.range(-500, 2), model[:3])
+        self.assertEqual(ql.range(90, 500), model[90:])
+        self.assertEqual(ql.range(5, 2), [])
+
+    def test_edits_match_model(self):
+        rng = random.Random(3)
+        model = [str(rng.randrange(10)) for _ in range(200)]
+        ql = QuickList(model)
+        for _ in range(300):
+            op = rng.randrange(4)
+            if op == 0 and model:
+                i = rng.randrange(len(model))
+                value = "x" * rng.randrange(20)
+                ql.set(i, value)
+                model[i] = value
+            elif op == 1:
+                pivot, value = str(rng.randrange(10)), str(rng.randrange(10))
+                after = rng.random() < 0.5
+                found = ql.insert(pivot, value, after)
+                self.assertEqual(found, pivot in model)
+                if found:
+                    i = model.index(pivot)
+                    model.insert(i + 1 if after else i, value)
+            elif op == 2:
+                value, count = str(rng.randrange(10)), rng.randrange(-2, 3)
+                removed = ql.remove(value, count)
+                indexes = [i for i, v in enumerate(model) if v == value]
+                if count < 0:
+                    indexes = indexes[::-1]
+                if count:
+                    indexes = indexes[:abs(count)]
+                self.assertEqual(removed, len(indexes))
+                for i in sorted(indexes, reverse=True):
+                    del model[i]
+            else:
+                model.append(str(rng.randrange(10)))
+                ql.push_tail(model[-1])
+            self.assertEqual(list(ql), model)
+            self.assertEqual(len(ql), len(model))
+        self.assertEqual(ql.nbytes, sum(c.nbytes for c in ql.chunks))
+
+    def test_trim(self):
+        model = [str(i) for i in range(100)]
+        ql = QuickList(model)
+        ql.trim(10, -11)
+        self.assertEqual(list(ql), model[10:90])
+        ql.trim(5, 1)
+        self.assertEqual(len(ql), 0)
+        self.assertEqual(ql.chunks, [])
+
+    def test_positions(self):
+        ql = QuickList(["a", "b", "c", "b", "a", "b"])
+        self.assertEqual(ql.positions("b"), [1])
+        self.assertEqual(ql.positions("b", rank=2), [3])
+        self.assertEqual(ql.positions("b", rank=-1), [5])
+        self.assertEqual(ql.positions("b", count=0), [1, 3, 5])
+        self.assertEqual(ql.positions("b", rank=-2, count=0), [3, 1])
+        self.assertEqual(ql.positions("b", count=0, maxlen=4), [1, 3])
+        self.assertEqual(ql.positions("z"), [])
+
+    def test_uses_less_memory_than_deque_of_str(self):
+        values = [f"user:{i}" for i in range(10_000)]
+        with mock.patch("config.LIST_MAX_LISTPACK_SIZE", 8192):
+            ql = QuickList(values)
+        as_deque = sys.getsizeof(deque(values)) + sum(sys.getsizeof(v) for v in values)
+        self.assertLess(ql.memory_usage(), as_deque / 2)
+
+if __name__ == "__main__":
+    unittest.main()
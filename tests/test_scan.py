@@ -0,0 +1,64 @@
+# tests/test_scan.py
+
+import unittest
+from datastore.scan import compile_glob, scan_slots
+from datastore.set_store import HashSet
+
+class TestGlob(unittest.TestCase):
+    def test_wildcards(self):
+        match = compile_glob("user:*:name")
+        self.assertTrue(match("user:42:name"))
+        self.assertTrue(match("user::name"))
+        self.assertFalse(match("user:42:email"))
+        self.assertTrue(compile_glob("h?llo")("hello"))
+        self.assertFalse(compile_glob("h?llo")("hllo"))
+        self.assertTrue(compile_glob("*")("anything\nat all"))
+
+    def test_classes_and_escapes(self):
+        self.assertTrue(compile_glob("h[ae]llo")("hallo"))
+        self.assertFalse(compile_glob("h[ae]llo")("hillo"))
+        self.assertTrue(compile_glob("h[^e]llo")("hallo"))
+        self.assertFalse(compile_glob("h[^e]llo")("hello"))
+        self.assertTrue(compile_glob("k[0-9]")("k7"))
+        self.assertTrue(compile_glob("k[9-0]")("k7"))
+        self.assertTrue(compile_glob("a\\*b")("a*b"))
+        self.assertFalse(compile_glob("a\\*b")("axb"))
+        self.assertTrue(compile_glob("a[\\]]")("a]"))
+        self.assertTrue(compile_glob("a.b")("a.b"))
+        self.assertFalse(compile_glob("a.b")("axb"))
+        self.assertTrue(compile_glob("[abc")("[abc"))
+
+class TestScanSlots(unittest.TestCase):
+    def test_walks_down_from_the_end(self):
+        slots = list(range(10))
+        self.assertEqual(scan_slots(slots, 0, 4), (6, [9, 8, 7, 6]))
+        self.assertEqual(scan_slots(slots, 6, 4), (2, [5, 4, 3, 2]))
+        self.assertEqual(scan_slots(slots, 2, 4), (0, [1, 0]))
+        self.assertEqual(scan_slots(slots, 0, 20), (0, slots[::-1]))
+        self.assertEqual(scan_slots([], 0, 10), (0, []))
+        # A cursor past the end (the collection shrank) starts at the end.
+        self.assertEqual(scan_slots(slots, 1000, 2), (8, [9, 8]))
+
+    def test_members_present_throughout_are_returned(self):
+        members = HashSet(str(i) for i in range(100))
+        seen = []
+        cursor, batch = members.scan(0, 10)
+        seen += batch
+        removed = set(sorted(set(members) - set(batch))[:10])
+        for member in removed:
+            members.remove(member)
+        members.add("new")
+        while cursor:
+            step = members.scan(cursor, 10)
+            # Nothing is kept between calls, so a cursor can be retried.
+            self.assertEqual(members.scan(cursor, 10), step)
+            cursor, batch = step
+            seen += batch
+            # Deletes mid-scan move members below the cursor too.
+            if batch:
+                members.remove(batch[0])
+                removed.add(batch[0])
+        self.assertLessEqual({str(i) for i in range(100)} - removed, set(seen))
+
+if __name__ == "__main__":
+    unittest.main()
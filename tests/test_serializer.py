@@ -5,21 +5,53 @@ from protocol import serializer as s
 
 class TestSerializer(unittest.TestCase):
     def test_simple_string(self):
-        self.assertEqual(s.simple_string("PONG"), "+PONG\r\n")
+        self.assertEqual(s.simple_string("PONG"), b"+PONG\r\n")
 
     def test_error(self):
-        self.assertEqual(s.error("Invalid command"), "-ERR Invalid command\r\n")
+        self.assertEqual(s.error("Invalid command"), b"-ERR Invalid command\r\n")
 
     def test_integer(self):
-        self.assertEqual(s.integer(5), ":5\r\n")
+        self.assertEqual(s.integer(5), b":5\r\n")
 
     def test_bulk_string(self):
-        self.assertEqual(s.bulk_string("hello"), "$5\r\nhello\r\n")
-        self.assertEqual(s.bulk_string(None), "$-1\r\n")
+        self.assertEqual(s.bulk_string("hello"), b"$5\r\nhello\r\n")
+        self.assertEqual(s.bulk_string(None), b"$-1\r\n")
 
     def test_array(self):
         arr = s.array(["foo", "bar"])
-        self.assertEqual(arr, "*2\r\n$3\r\nfoo\r\n$3\r\nbar\r\n")
+        self.assertEqual(arr, b"*2\r\n$3\r\nfoo\r\n$3\r\nbar\r\n")
+
+    def test_shared_replies(self):
+        self.assertIs(s.simple_string("OK"), s.OK)
+        self.assertIs(s.integer(0), s.ZERO)
+        self.assertIs(s.integer(1), s.ONE)
+        self.assertIs(s.bulk_string(None), s.NULL)
+        self.assertEqual(s.integer(-2), b":-2\r\n")
+        self.assertEqual(s.integer(10**6), b":1000000\r\n")
+
+    def test_bulk_string_uses_byte_length(self):
+        self.assertEqual(s.bulk_string("caf\u00e9"), b"$5\r\ncaf\xc3\xa9\r\n")
+        self.assertEqual(s.bulk_string(b"\xff"), b"$1\r\n\xff\r\n")
+        self.assertEqual(s.bulk_string("\udcff"), b"$1\r\n\xff\r\n")
+
+    def test_large_array(self):
+        items = [str(i) for i in range(1000)]
+        expected = b"*1000\r\n" + b"".join(b"$%d\r\n%d\r\n" % (len(str(i)), i) for i in range(1000))
+        self.assertEqual(s.array(items), expected)
+        self.assertEqual(s.array([]), b"*0\r\n")
+
+    def test_nested_array(self):
+        self.assertEqual(s.array(["get", 2, [None, b"x"]]),
+                         b"*3\r\n$3\r\nget\r\n:2\r\n*2\r\n$-1\r\n$1\r\nx\r\n")
+
+    def test_response_builder(self):
+        out = s.ResponseBuilder()
+        out.write(s.OK)
+        out.integer(7)
+        out.bulk_string("hi")
+        out.array(["a"])
+        self.assertEqual(out.take(), b"+OK\r\n:7\r\n$2\r\nhi\r\n*1\r\n$1\r\na\r\n")
+        self.assertEqual(len(out), 0)
 
 if __name__ == "__main__":
     unittest.main()
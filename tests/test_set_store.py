@@ -1,6 +1,8 @@
 # tests/test_set_store.py
 
 import unittest
+import config
+from datastore.keyspace import encoding_of
 from datastore.set_store import SetStore
 
 class TestSetStore(unittest.TestCase):
@@ -22,3 +24,142 @@ class TestSetStore(unittest.TestCase):
         self.ss.sadd("myset", "a")
         self.assertTrue(self.ss.sismember("myset", "a"))
         self.assertFalse(self.ss.sismember("myset", "b"))
+
+    def test_encoding_follows_members(self):
+        ks = self.ss.keyspace
+        self.ss.sadd("ints", "1", "2", "3")
+        self.assertEqual(encoding_of(ks.lookup("ints")), "intset")
+        self.ss.sadd("ints", "a")
+        self.assertEqual(encoding_of(ks.lookup("ints")), "listpack")
+        self.assertEqual(set(self.ss.smembers("ints")), {"1", "2", "3", "a"})
+        self.ss.sadd("ints", "x" * (config.SET_MAX_LISTPACK_VALUE + 1))
+        self.assertEqual(encoding_of(ks.lookup("ints")), "hashtable")
+        self.assertEqual(len(self.ss.smembers("ints")), 5)
+
+    def test_full_intset_converts_by_size(self):
+        old = config.SET_MAX_INTSET_ENTRIES, config.SET_MAX_LISTPACK_ENTRIES
+        config.SET_MAX_INTSET_ENTRIES, config.SET_MAX_LISTPACK_ENTRIES = 4, 8
+        try:
+            self.ss.sadd("ints", *map(str, range(6)))
+            self.assertEqual(encoding_of(self.ss.keyspace.lookup("ints")), "listpack")
+            self.ss.sadd("ints", *map(str, range(6, 10)))
+            self.assertEqual(encoding_of(self.ss.keyspace.lookup("ints")), "hashtable")
+            self.assertEqual(len(self.ss.smembers("ints")), 10)
+        finally:
+            config.SET_MAX_INTSET_ENTRIES, config.SET_MAX_LISTPACK_ENTRIES = old
+
+    def test_memory_stays_in_sync(self):
+        self.ss.sadd("ints", "1", "2", "3")
+        self.ss.sadd("words", "a", "b")
+        self.ss.srem("words", "a")
+        self.ss.sadd("mixed", "1", "2")
+        self.ss.sadd("mixed", "3", "x" * 100, "4")
+        self.ss.srem("mixed", "1")
+        ks = self.ss.keyspace
+        self.assertEqual(ks.recount_memory(list(ks.data)), 0)
+
+    def test_set_algebra(self):
+        self.ss.sadd("a", "1", "2", "3", "x")
+        self.ss.sadd("b", "2", "3", "4")
+        self.ss.sadd("c", "3", "x", "2")
+        self.assertEqual(sorted(self.ss.sinter("a", "b", "c")), ["2", "3"])
+        self.assertEqual(self.ss.sinter("a", "missing"), [])
+        self.assertEqual(sorted(self.ss.sunion("a", "b", "missing")), ["1", "2", "3", "4", "x"])
+        self.assertEqual(sorted(self.ss.sdiff("a", "b")), ["1", "x"])
+        self.assertEqual(self.ss.sdiff("missing", "a"), [])
+        self.assertEqual(self.ss.sintercard("a", "b"), 2)
+        self.assertEqual(self.ss.sintercard("a", "b", limit=1), 1)
+
+    def test_intersection_walks_smallest_set(self):
+        self.ss.sadd("big", *map(str, range(1000)))
+        self.ss.sadd("small", "5", "7")
+        probed = []
+        big = self.ss.keyspace.lookup("big").value
+
+        class Spy:
+            def __len__(self):
+                return len(big)
+            def __iter__(self):
+                raise AssertionError("largest set was iterated")
+            def __contains__(self, member):
+                probed.append(member)
+                return member in big
+
+        self.ss.keyspace.lookup("big").value = Spy()
+        self.assertEqual(sorted(self.ss.sinter("big", "small")), ["5", "7"])
+        self.assertEqual(sorted(probed), ["5", "7"])
+
+    def test_store_replaces_destination(self):
+        self.ss.sadd("a", "1", "2")
+        self.ss.sadd("b", "2", "3")
+        self.ss.keyspace.set("dest", "string", "v")
+        self.assertEqual(self.ss.store("dest", self.ss.sunion("a", "b")), 3)
+        self.assertEqual(sorted(self.ss.smembers("dest")), ["1", "2", "3"])
+        self.assertEqual(self.ss.store("a", self.ss.sinter("a", "b")), 1)
+        self.assertEqual(self.ss.smembers("a"), ["2"])
+        self.assertEqual(self.ss.store("dest", []), 0)
+        self.assertNotIn("dest", self.ss.keyspace)
+        ks = self.ss.keyspace
+        self.assertEqual(ks.recount_memory(list(ks.data)), 0)
+
+    def test_random_members_and_pop(self):
+        self.ss.sadd("s", "a", "b", "c")
+        self.assertIn(self.ss.srandmember("s"), {"a", "b", "c"})
+        self.assertEqual(sorted(self.ss.srandmember("s", 5)), ["a", "b", "c"])
+        self.assertEqual(len(set(self.ss.srandmember("s", 2))), 2)
+        self.assertEqual(len(self.ss.srandmember("s", -5)), 5)
+        self.assertIsNone(self.ss.srandmember("missing"))
+        popped = self.ss.spop("s", 2)
+        self.assertEqual(self.ss.scard("s"), 1)
+        self.assertEqual(len(set(popped)), 2)
+        self.ss.spop("s")
+        self.assertNotIn("s", self.ss.keyspace)
+        self.assertIsNone(self.ss.spop("s"))
+        self.assertEqual(self.ss.smismember("s", "a"), [0])
+
+    def test_random_members_in_every_encoding(self):
+        ks = self.ss.keyspace
+        sets = {
+            "intset": [str(i) for i in range(20)],
+            "listpack": [f"m{i}" for i in range(20)],
+            "hashtable": [f"m{i}" for i in range(200)] + ["x" * (config.SET_MAX_LISTPACK_VALUE + 1)],
+        }
+        for encoding, members in sets.items():
+            with self.subTest(encoding=encoding):
+                self.ss.sadd(encoding, *members)
+                self.assertEqual(encoding_of(ks.lookup(encoding)), encoding)
+                everything = set(members)
+                self.assertIn(self.ss.srandmember(encoding), everything)
+                for count in (1, 3, len(members) // 2, len(members) - 1):
+                    picked = self.ss.srandmember(encoding, count)
+                    self.assertEqual(len(set(picked)), count)
+                    self.assertLessEqual(set(picked), everything)
+                repeated = self.ss.srandmember(encoding, -50)
+                self.assertEqual(len(repeated), 50)
+                self.assertLessEqual(set(repeated), everything)
+                # Every member can come up, not just the first few.
+                seen = set()
+                for _ in range(50):
+                    seen.update(self.ss.srandmember(encoding, -len(members)))
+                self.assertEqual(seen, everything)
+
+                popped = self.ss.spop(encoding, 5) + [self.ss.spop(encoding)]
+                self.assertEqual(len(set(popped)), 6)
+                self.assertEqual(self.ss.scard(encoding), len(members) - 6)
+                self.assertFalse(any(self.ss.smismember(encoding, *popped)))
+                self.assertEqual(ks.recount_memory([encoding]), 0)
+                rest = self.ss.spop(encoding, len(members))
+                self.assertEqual(set(popped + rest), everything)
+                self.assertNotIn(encoding, ks)
+        self.assertEqual(ks.recount_memory(list(ks.data)), 0)
+        self.assertEqual(ks.used_memory, 0)
+
+    def test_spop_is_random_on_a_fresh_hashtable_set(self):
+        members = [f"m{i}" for i in range(200)] + ["x" * (config.SET_MAX_LISTPACK_VALUE + 1)]
+        first = set()
+        for _ in range(20):
+            self.ss.sadd("s", *members)
+            self.assertEqual(encoding_of(self.ss.keyspace.lookup("s")), "hashtable")
+            first.add(self.ss.spop("s"))
+            self.ss.keyspace.delete("s")
+        self.assertGreater(len(first), 1)
@@ -0,0 +1,96 @@
+# tests/test_sharding.py
+
+import os
+import tempfile
+import unittest
+from server.command_router import CommandHandler
+from server.sharding import ShardMap, key_hash_slot, shard_aof_path, HASH_SLOTS
+
+
+class TestKeyHashSlot(unittest.TestCase):
+    def test_matches_redis_cluster(self):
+        self.assertEqual(key_hash_slot("foo"), 12182)
+        self.assertEqual(key_hash_slot("123456789"), 0x31C3)
+
+    def test_hash_tags(self):
+        self.assertEqual(key_hash_slot("{user1000}.following"), key_hash_slot("{user1000}.followers"))
+        self.assertEqual(key_hash_slot("{user1000}.x"), key_hash_slot("user1000"))
+        # Empty tags are ignored and the whole key is hashed.
+        self.assertEqual(key_hash_slot("{}foo"), key_hash_slot("{}foo"))
+        self.assertNotEqual(key_hash_slot("{}foo"), key_hash_slot("foo"))
+
+
+class TestShardMap(unittest.TestCase):
+    def test_slot_ranges_cover_every_slot_once(self):
+        for count in (1, 3, 7):
+            shard = ShardMap(0, count, "127.0.0.1", 6379)
+            ranges = shard.slot_ranges()
+            self.assertEqual(ranges[0][0], 0)
+            self.assertEqual(ranges[-1][1], HASH_SLOTS - 1)
+            for first, last, index in ranges:
+                self.assertEqual(shard.shard_for_slot(first), index)
+                self.assertEqual(shard.shard_for_slot(last), index)
+
+    def test_shard_aof_path(self):
+        self.assertEqual(shard_aof_path("data/aof.log", 2), "data/aof.shard2.log")
+
+
+class _Connection:
+    """Stands in for a client transport connected to a given port."""
+
+    def __init__(self, port):
+        self.port = port
+
+    def get_extra_info(self, name):
+        return ("127.0.0.1", self.port) if name == "sockname" else None
+
+    def write(self, data):
+        pass
+
+
+class TestShardedHandler(unittest.TestCase):
+    def setUp(self):
+        fd, self.aof_path = tempfile.mkstemp(suffix=".aof")
+        os.close(fd)
+        # "foo" hashes to slot 12182, which is shard 1 of 2.
+        self.handler = CommandHandler(aof_path=self.aof_path, shard=ShardMap(0, 2, "127.0.0.1", 7000))
+
+    def tearDown(self):
+        self.handler.aof.close()
+        os.remove(self.aof_path)
+
+    def test_redirects_foreign_keys(self):
+        self.assertEqual(self.handler.handle(["GET", "foo"]), b"-MOVED 12182 127.0.0.1:7002\r\n")
+
+    def test_serves_owned_keys(self):
+        self.assertEqual(self.handler.handle(["SET", "bar", "1"]), b"+OK\r\n")
+
+    def test_movable_keys_are_all_checked(self):
+        self.assertIn(b"CROSSSLOT", self.handler.handle(["SINTERCARD", "2", "bar", "foo"]))
+        self.assertEqual(self.handler.handle(["SINTERCARD", "2", "{bar}a", "{bar}b"]), b":0\r\n")
+
+    def test_keyless_commands_are_local(self):
+        self.assertEqual(self.handler.handle(["PING"]), b"+PONG\r\n")
+        self.assertEqual(self.handler.handle(["CLUSTER", "KEYSLOT", "foo"]), b":12182\r\n")
+
+    def test_whole_keyspace_commands_only_on_own_port(self):
+        shared, own = _Connection(7000), _Connection(7001)
+        self.handler.handle(["SET", "bar", "1"], own)
+        for tokens in (["DBSIZE"], ["KEYS", "*"], ["SCAN", "0"], ["INFO"], ["FLUSHALL"]):
+            self.assertIn(b"only sees one shard", self.handler.handle(tokens, shared))
+        self.assertEqual(self.handler.handle(["DBSIZE"], own), b":1\r\n")
+        self.assertIn(b"not supported in sharded mode", self.handler.handle(["PUBLISH", "c", "m"], own))
+        self.assertIn(b"not supported in sharded mode", self.handler.handle(["SUBSCRIBE", "c"], shared))
+
+    def test_cluster_slots(self):
+        res = self.handler.handle(["CLUSTER", "SLOTS"])
+        self.assertTrue(res.startswith(b"*2\r\n*3\r\n:0\r\n:8191\r\n"))
+
+    def test_cluster_disabled_without_shard(self):
+        handler = CommandHandler(aof_path=self.aof_path)
+        self.assertIn(b"cluster support disabled", handler.handle(["CLUSTER", "SLOTS"]))
+        handler.aof.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+# tests/test_skiplist.py
+
+import random
+import unittest
+from datastore.skiplist import SkipList, ScoreRange
+
+class TestSkipList(unittest.TestCase):
+    def setUp(self):
+        self.zsl = SkipList()
+
+    def assertMatches(self, model):
+        """Check order, ranks and back links against a sorted model list."""
+        expected = sorted(model.items(), key=lambda x: (x[1], x[0]))
+        self.assertEqual([(n.member, n.score) for n in self.zsl], expected)
+        self.assertEqual(len(self.zsl), len(expected))
+        for rank, (member, score) in enumerate(expected, 1):
+            self.assertEqual(self.zsl.rank(score, member), rank)
+            self.assertEqual(self.zsl.by_rank(rank).member, member)
+        backwards = []
+        node = self.zsl.tail
+        while node is not None:
+            backwards.append((node.member, node.score))
+            node = node.backward
+        self.assertEqual(backwards, expected[::-1])
+
+    def test_random_operations_match_sorted_model(self):
+        rng = random.Random(7)
+        model = {}
+        for _ in range(2000):
+            member = f"m{rng.randrange(200)}"
+            score = float(rng.randrange(50))
+            op = rng.random()
+            if member not in model:
+                self.zsl.insert(score, member)
+                model[member] = score
+            elif op < 0.5:
+                self.zsl.update_score(model[member], member, score)
+                model[member] = score
+            else:
+                self.assertTrue(self.zsl.delete(model.pop(member), member))
+        self.assertMatches(model)
+
+    def test_ties_order_by_member(self):
+        for member in ("c", "a", "b"):
+            self.zsl.insert(1.0, member)
+        self.assertEqual([n.member for n in self.zsl], ["a", "b", "c"])
+
+    def test_delete_missing(self):
+        self.zsl.insert(1.0, "a")
+        self.assertFalse(self.zsl.delete(2.0, "a"))
+        self.assertFalse(self.zsl.delete(1.0, "b"))
+        self.assertEqual(self.zsl.rank(1.0, "b"), 0)
+
+    def test_score_ranges(self):
+        for i in range(10):
+            self.zsl.insert(float(i), f"m{i}")
+        self.assertEqual(self.zsl.first_in_range(ScoreRange(2.5, 7)).member, "m3")
+        self.assertEqual(self.zsl.last_in_range(ScoreRange(2.5, 7)).member, "m7")
+        self.assertEqual(self.zsl.first_in_range(ScoreRange(3, 7, minex=True)).member, "m4")
+        self.assertEqual(self.zsl.last_in_range(ScoreRange(3, 7, maxex=True)).member, "m6")
+        self.assertIsNone(self.zsl.first_in_range(ScoreRange(20, 30)))
+        self.assertIsNone(self.zsl.last_in_range(ScoreRange(-5, -1)))
+        self.assertIsNone(self.zsl.first_in_range(ScoreRange(5, 5, minex=True)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,147 @@
+# tests/test_tcp_server.py
+
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+from server.command_router import CommandHandler
+from server.tcp_server import create_server
+
+
+class TestTCPServer(unittest.IsolatedAsyncioTestCase):
+    transport = "protocol"
+
+    async def asyncSetUp(self):
+        fd, self.aof_path = tempfile.mkstemp(suffix=".aof")
+        os.close(fd)
+        self.handler = CommandHandler(aof_path=self.aof_path)
+        self.server = await create_server(self.handler, "127.0.0.1", 0, self.transport)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.handler.aof.close()
+        os.remove(self.aof_path)
+
+    async def connect(self):
+        reader, writer = await asyncio.open_connection("127.0.0.1", self.port)
+        self.addAsyncCleanup(self._close, writer)
+        return reader, writer
+
+    async def _close(self, writer):
+        writer.close()
+        await writer.wait_closed()
+
+    async def test_pipelined_batch(self):
+        reader, writer = await self.connect()
+        writer.write(b"*3\r\n$3\r\nSET\r\n$1\r\nk\r\n$4\r\na\r\nb\r\n"
+                     b"*2\r\n$3\r\nGET\r\n$1\r\nk\r\n"
+                     b"PING\r\n")
+        expected = b"+OK\r\n$4\r\na\r\nb\r\n+PONG\r\n"
+        self.assertEqual(await reader.readexactly(len(expected)), expected)
+
+    async def test_command_split_across_writes(self):
+        reader, writer = await self.connect()
+        raw = b"*3\r\n$3\r\nSET\r\n$3\r\nfoo\r\n$3\r\nbar\r\n"
+        for i in range(0, len(raw), 5):
+            writer.write(raw[i:i + 5])
+            await writer.drain()
+            await asyncio.sleep(0)
+        self.assertEqual(await reader.readexactly(5), b"+OK\r\n")
+
+    async def test_publish_reaches_subscriber(self):
+        sub_reader, sub_writer = await self.connect()
+        sub_writer.write(b"SUBSCRIBE news\r\n")
+        confirm = b"*3\r\n$9\r\nsubscribe\r\n$4\r\nnews\r\n$1\r\n1\r\n"
+        self.assertEqual(await sub_reader.readexactly(len(confirm)), confirm)
+
+        pub_reader, pub_writer = await self.connect()
+        pub_writer.write(b"PUBLISH news hi\r\n")
+        self.assertEqual(await pub_reader.readexactly(4), b":1\r\n")
+        message = b"*3\r\n$7\r\nmessage\r\n$4\r\nnews\r\n$2\r\nhi\r\n"
+        self.assertEqual(await sub_reader.readexactly(len(message)), message)
+
+    async def test_blpop_waits_for_push_and_holds_pipeline(self):
+        reader, writer = await self.connect()
+        writer.write(b"BLPOP jobs 0\r\nPING\r\n")
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.handler.blocking.blocked_clients, 1)
+
+        push_reader, push_writer = await self.connect()
+        push_writer.write(b"RPUSH jobs j1\r\n")
+        self.assertEqual(await push_reader.readexactly(4), b":1\r\n")
+        expected = b"*2\r\n$4\r\njobs\r\n$2\r\nj1\r\n+PONG\r\n"
+        self.assertEqual(await asyncio.wait_for(reader.readexactly(len(expected)), 1), expected)
+
+    async def test_blpop_times_out(self):
+        reader, writer = await self.connect()
+        writer.write(b"BLPOP jobs 0.05\r\n")
+        self.assertEqual(await asyncio.wait_for(reader.readexactly(5), 1), b"*-1\r\n")
+
+    async def test_blocked_client_that_disconnects_gets_nothing(self):
+        reader, writer = await self.connect()
+        writer.write(b"BLPOP q 0\r\n")
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.handler.blocking.blocked_clients, 1)
+        writer.close()
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.handler.blocking.blocked_clients, 0)
+
+        push_reader, push_writer = await self.connect()
+        push_writer.write(b"RPUSH q job\r\nLLEN q\r\n")
+        self.assertEqual(await asyncio.wait_for(push_reader.readexactly(8), 1), b":1\r\n:1\r\n")
+
+    async def test_pipeline_sent_while_blocked_runs_after(self):
+        reader, writer = await self.connect()
+        writer.write(b"BLPOP q 0\r\n")
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        writer.write(b"PING\r\n")
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        push_reader, push_writer = await self.connect()
+        push_writer.write(b"RPUSH q job\r\n")
+        expected = b"*2\r\n$1\r\nq\r\n$3\r\njob\r\n+PONG\r\n"
+        self.assertEqual(await asyncio.wait_for(reader.readexactly(len(expected)), 1), expected)
+
+    async def test_backlog_behind_blocked_command_is_capped(self):
+        patcher = mock.patch("server.tcp_server.MAX_BLOCKED_BUFFER", 64)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        reader, writer = await self.connect()
+        writer.write(b"BLPOP q 0\r\n")
+        await writer.drain()
+        await asyncio.sleep(0.05)
+        writer.write(b"PING\r\n" * 1000)
+        await asyncio.sleep(0.05)
+        push_reader, push_writer = await self.connect()
+        push_writer.write(b"RPUSH q job\r\n")
+        expected = b"*2\r\n$1\r\nq\r\n$3\r\njob\r\n" + b"+PONG\r\n" * 1000
+        self.assertEqual(await asyncio.wait_for(reader.readexactly(len(expected)), 1), expected)
+
+    async def test_transactions_are_per_connection(self):
+        reader, writer = await self.connect()
+        other_reader, other_writer = await self.connect()
+        writer.write(b"MULTI\r\nSET k 1\r\n")
+        self.assertEqual(await reader.readexactly(14), b"+OK\r\n+QUEUED\r\n")
+        other_writer.write(b"GET k\r\n")
+        self.assertEqual(await other_reader.readexactly(5), b"$-1\r\n")
+        writer.write(b"EXEC\r\n")
+        self.assertEqual(await reader.readexactly(9), b"*1\r\n+OK\r\n")
+        writer.write(b"MULTI\r\n")
+        await reader.readexactly(5)
+        writer.close()
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.handler.transactions.clients, {})
+
+
+class TestStreamsTCPServer(TestTCPServer):
+    transport = "streams"
+
+
+if __name__ == "__main__":
+    unittest.main()
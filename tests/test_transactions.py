@@ -0,0 +1,179 @@
+# tests/test_transactions.py
+
+import os
+import tempfile
+import unittest
+from datastore.keyspace import Keyspace
+from datastore.transactions import Transactions
+from persistence.aof_replayer import replay_aof
+from server.command_router import CommandHandler
+
+class TestTransactions(unittest.TestCase):
+    def test_watch_detects_writes(self):
+        ks = Keyspace()
+        txs = Transactions(ks)
+        txs.watch("c1", ["a", "b"])
+        self.assertFalse(txs.changed(txs.get("c1")))
+        ks.touch("b")
+        self.assertTrue(txs.changed(txs.get("c1")))
+        ks.touch("unwatched")
+        self.assertNotIn("unwatched", ks.versions)
+
+    def test_versions_are_dropped_with_the_last_watcher(self):
+        ks = Keyspace()
+        txs = Transactions(ks)
+        txs.watch("c1", ["a"])
+        txs.watch("c2", ["a"])
+        txs.reset("c1")
+        self.assertIn("a", ks.versions)
+        txs.reset("c2")
+        self.assertEqual((ks.versions, txs.watchers, txs.clients), ({}, {}, {}))
+
+    def test_nested_multi(self):
+        txs = Transactions(Keyspace())
+        txs.multi("c1")
+        with self.assertRaises(ValueError):
+            txs.multi("c1")
+
+
+class TestTransactionCommands(unittest.TestCase):
+    def setUp(self):
+        fd, self.aof_path = tempfile.mkstemp(suffix=".aof")
+        os.close(fd)
+        self.handler = CommandHandler(aof_path=self.aof_path)
+        self.client = object()
+
+    def tearDown(self):
+        self.handler.aof.close()
+        os.remove(self.aof_path)
+
+    def run_command(self, *tokens, client=None):
+        return self.handler.handle(list(tokens), client or self.client)
+
+    def test_exec_runs_queue_and_logs_one_record(self):
+        self.assertEqual(self.run_command("MULTI"), b"+OK\r\n")
+        self.assertEqual(self.run_command("SET", "a", "1"), b"+QUEUED\r\n")
+        self.assertEqual(self.run_command("INCR", "a"), b"+QUEUED\r\n")
+        self.assertEqual(self.run_command("GET", "a"), b"+QUEUED\r\n")
+        self.assertEqual(self.run_command("EXEC"), b"*3\r\n+OK\r\n:2\r\n$1\r\n2\r\n")
+        with open(self.aof_path, "rb") as f:
+            log = f.read()
+        self.assertTrue(log.startswith(b"*1\r\n$5\r\nMULTI\r\n"))
+        self.assertTrue(log.endswith(b"*1\r\n$4\r\nEXEC\r\n"))
+
+        # The grouped record replays as a transaction.
+        replayed = CommandHandler(aof_path=self.aof_path)
+        replayed.loading = True
+        replay_aof(self.aof_path, replayed)
+        replayed.aof.close()
+        self.assertEqual(replayed.handle(["GET", "a"]), b"$1\r\n2\r\n")
+
+    def test_runtime_errors_do_not_stop_the_transaction(self):
+        self.run_command("SET", "s", "x")
+        self.run_command("MULTI")
+        self.run_command("LPUSH", "s", "v")
+        self.run_command("SET", "b", "2")
+        reply = self.run_command("EXEC")
+        self.assertTrue(reply.startswith(b"*2\r\n-WRONGTYPE"))
+        self.assertEqual(self.run_command("GET", "b"), b"$1\r\n2\r\n")
+
+    def test_queueing_errors_abort_exec(self):
+        self.run_command("MULTI")
+        self.assertIn(b"Unknown command", self.run_command("NOPE"))
+        self.run_command("SET", "a", "1")
+        self.assertIn(b"EXECABORT", self.run_command("EXEC"))
+        self.assertEqual(self.run_command("GET", "a"), b"$-1\r\n")
+
+    def test_discard_and_misuse(self):
+        self.assertIn(b"EXEC without MULTI", self.run_command("EXEC"))
+        self.assertIn(b"DISCARD without MULTI", self.run_command("DISCARD"))
+        self.run_command("MULTI")
+        self.assertIn(b"nested", self.run_command("MULTI"))
+        self.assertIn(b"WATCH inside MULTI", self.run_command("WATCH", "a"))
+        self.run_command("SET", "a", "1")
+        self.assertEqual(self.run_command("DISCARD"), b"+OK\r\n")
+        self.assertEqual(self.run_command("GET", "a"), b"$-1\r\n")
+
+    def test_watch_aborts_exec_after_another_client_writes(self):
+        self.run_command("SET", "balance", "10")
+        self.run_command("WATCH", "balance")
+        self.run_command("INCRBY", "balance", "5", client="other")
+        self.run_command("MULTI")
+        self.run_command("INCRBY", "balance", "-10")
+        self.assertEqual(self.run_command("EXEC"), b"*-1\r\n")
+        self.assertEqual(self.run_command("GET", "balance"), b"$2\r\n15\r\n")
+        self.assertEqual(self.handler.keyspace.versions, {})
+
+    def test_watch_passes_when_untouched_and_sees_expiry(self):
+        self.run_command("SET", "k", "v")
+        self.run_command("WATCH", "k")
+        self.run_command("GET", "k", client="other")
+        self.run_command("MULTI")
+        self.run_command("SET", "k", "w")
+        self.assertEqual(self.run_command("EXEC"), b"*1\r\n+OK\r\n")
+
+        self.run_command("WATCH", "k")
+        self.handler.keyspace.delete("k")  # as expiry or eviction would
+        self.run_command("MULTI")
+        self.assertEqual(self.run_command("EXEC"), b"*-1\r\n")
+
+        self.run_command("WATCH", "k")
+        self.run_command("FLUSHALL", client="other")
+        self.run_command("MULTI")
+        self.assertEqual(self.run_command("EXEC"), b"*-1\r\n")
+
+    def test_writes_that_change_nothing_keep_exec_running(self):
+        self.run_command("SET", "k", "v")
+        self.run_command("SADD", "s", "a")
+        self.run_command("RPUSH", "l", "x")
+        self.run_command("WATCH", "k", "s", "l", "missing")
+        for tokens in (["DEL", "missing"], ["SET", "k", "w", "NX"], ["EXPIRE", "missing", "10"],
+                       ["SREM", "s", "b"], ["SADD", "s", "a"], ["LREM", "l", "0", "y"],
+                       ["LTRIM", "l", "0", "-1"], ["HDEL", "missing", "f"], ["PERSIST", "k"]):
+            self.run_command(*tokens, client="other")
+        self.run_command("MULTI")
+        self.assertEqual(self.run_command("EXEC"), b"*0\r\n")
+
+        self.run_command("WATCH", "s")
+        self.run_command("SREM", "s", "a", client="other")
+        self.run_command("MULTI")
+        self.assertEqual(self.run_command("EXEC"), b"*-1\r\n")
+
+    def test_watched_key_expiring_unseen_aborts_exec(self):
+        self.run_command("SET", "k", "v")
+        self.run_command("WATCH", "k")
+        # The deadline passes without anything looking at the key.
+        self.handler.keyspace.data["k"].expire_at = 1
+        self.run_command("MULTI")
+        self.assertEqual(self.run_command("EXEC"), b"*-1\r\n")
+
+        # A key that had already expired when watched doesn't count.
+        self.run_command("SET", "k", "v")
+        self.handler.keyspace.data["k"].expire_at = 1
+        self.run_command("WATCH", "k")
+        self.run_command("MULTI")
+        self.assertEqual(self.run_command("EXEC"), b"*0\r\n")
+
+    def test_unwatch(self):
+        self.run_command("WATCH", "k")
+        self.run_command("UNWATCH")
+        self.run_command("SET", "k", "v", client="other")
+        self.run_command("MULTI")
+        self.assertEqual(self.run_command("EXEC"), b"*0\r\n")
+
+    def test_blocking_pop_inside_exec_does_not_block(self):
+        self.run_command("MULTI")
+        self.run_command("BLPOP", "empty", "0")
+        self.run_command("BLMOVE", "empty", "dst", "LEFT", "RIGHT", "0")
+        self.assertEqual(self.run_command("EXEC"), b"*2\r\n*-1\r\n$-1\r\n")
+        self.assertEqual(self.handler.blocking.blocked_clients, 0)
+
+    def test_client_closed_drops_state(self):
+        self.run_command("WATCH", "k")
+        self.run_command("MULTI")
+        self.handler.client_closed(self.client)
+        self.assertEqual(self.handler.transactions.clients, {})
+        self.assertEqual(self.handler.keyspace.versions, {})
+
+if __name__ == "__main__":
+    unittest.main()
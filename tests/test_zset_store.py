@@ -1,5 +1,6 @@
 import unittest
 from datastore.zset_store import ZSetStore
+from datastore.skiplist import ScoreRange
 
 class TestZSetStore(unittest.TestCase):
     def setUp(self):
@@ -18,3 +19,57 @@ class TestZSetStore(unittest.TestCase):
         self.z.zadd("myz", 3, "c")
         self.assertEqual(self.z.zrange("myz", 0, 1), ["a", "b"])
         self.assertEqual(self.z.zrange("myz", 0, 10), ["a", "b", "c"])
+
+    def test_zadd_multiple_and_flags(self):
+        self.assertEqual(self.z.zadd("myz", 1.0, "a", 2.0, "b"), 2)
+        self.assertEqual(self.z.zadd("myz", 5.0, "a", 3.0, "c", nx=True), 1)
+        self.assertEqual(self.z.zscore("myz", "a"), "1.0")
+        self.assertEqual(self.z.zadd("myz", 5.0, "a", 9.0, "d", xx=True, ch=True), 1)
+        self.assertIsNone(self.z.zscore("myz", "d"))
+        self.assertEqual(self.z.zadd("myz", 4.0, "a", gt=True, ch=True), 0)
+        self.assertEqual(self.z.zadd("myz", 4.0, "a", lt=True, ch=True), 1)
+        self.assertEqual(self.z.zscore("myz", "a"), "4.0")
+        self.assertEqual(self.z.zadd("nokey", 1.0, "a", xx=True), 0)
+        self.assertNotIn("nokey", self.z.keyspace)
+
+    def test_zincrby(self):
+        self.assertEqual(self.z.zincrby("myz", 2.5, "a"), 2.5)
+        self.assertEqual(self.z.zincrby("myz", -1, "a"), 1.5)
+        self.assertIsNone(self.z.zincrby("myz", 1, "b", xx=True))
+        self.assertIsNone(self.z.zincrby("myz", -1, "a", gt=True))
+
+    def test_zrem_and_zcard(self):
+        self.z.zadd("myz", 1, "a", 2, "b")
+        self.assertEqual(self.z.zcard("myz"), 2)
+        self.assertEqual(self.z.zrem("myz", "a", "x"), 1)
+        self.assertEqual(self.z.zrange("myz", 0, -1), ["b"])
+        self.z.zrem("myz", "b")
+        self.assertNotIn("myz", self.z.keyspace)
+        self.assertEqual(self.z.zcard("myz"), 0)
+
+    def test_rank_and_reverse(self):
+        self.z.zadd("myz", 10, "a", 20, "b", 30, "c")
+        self.assertEqual(self.z.zrank("myz", "a"), 0)
+        self.assertEqual(self.z.zrank("myz", "a", reverse=True), 2)
+        self.assertIsNone(self.z.zrank("myz", "x"))
+        self.assertEqual(self.z.zrange("myz", -2, -1), ["b", "c"])
+        self.assertEqual(self.z.zrange("myz", 0, 0, reverse=True), ["c"])
+        self.assertEqual(self.z.zrange("myz", 0, 1, withscores=True), ["a", "10", "b", "20"])
+        self.assertEqual(self.z.zrange("myz", 5, 10), [])
+
+    def test_score_queries(self):
+        for i in range(10):
+            self.z.zadd("myz", i, f"m{i}")
+        spec = ScoreRange(2, 5, maxex=True)
+        self.assertEqual(self.z.zrangebyscore("myz", spec), ["m2", "m3", "m4"])
+        self.assertEqual(self.z.zrangebyscore("myz", spec, reverse=True, offset=1, count=1), ["m3"])
+        self.assertEqual(self.z.zcount("myz", spec), 3)
+        self.assertEqual(self.z.zcount("myz", ScoreRange(float("-inf"), float("inf"))), 10)
+        self.assertEqual(self.z.zcount("missing", spec), 0)
+
+    def test_memory_stays_in_sync(self):
+        self.z.zadd("myz", 1, "a", 2, "b", 3, "c")
+        self.z.zadd("myz", 5, "a")
+        self.z.zrem("myz", "b")
+        ks = self.z.keyspace
+        self.assertEqual(ks.recount_memory(list(ks.data)), 0)